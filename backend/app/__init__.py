@@ -1,12 +1,19 @@
-from flask import Flask
-from flask_cors import CORS
-app = Flask(__name__)
+"""
+FeedFinder backend.
+
+create_app(config) builds an app; `from app import app` returns a default
+instance, created on first access. Importing a submodule such as app.db no
+longer builds an app, pulls in the routes or sets up mail.
+"""
+
+from app.config import load_env, flask_settings
+
+# Read .env before any module reads its settings from the environment
+load_env()
 
 # Configure CORS to allow credentials (cookies) for session management
 # When using supports_credentials=True, we need to explicitly allow origins
-# Using resource specific CORS for better control
-allowed_origins = []
-allowed_origins.extend([
+ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://localhost:5173",
     "http://localhost:8080",
@@ -15,45 +22,96 @@ allowed_origins.extend([
     "http://127.0.0.1:8080",
     "https://3.150.122.114",
     "http://3.150.122.114"
-])
-
-CORS(app, 
-     resources={
-         r"/api/*": {
-             "origins": allowed_origins,  # Allow all origins for API endpoints
-             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-             "allow_headers": ["Content-Type", "Authorization", "X-CSRF-Token", "X-Requested-With"],
-             "expose_headers": ["X-CSRF-Token"],
-             "supports_credentials": True,
-             "max_age": 3600
-         }
-     })
-from flask_mail import Mail
-from dotenv import load_dotenv
-import os
-from itsdangerous import URLSafeTimedSerializer
-
-# Load .env file from specific path FIRST
-dotenv_path = '/home/student3/email.env'
-load_dotenv(dotenv_path)
-
-# Update Flask config from environment variables
-app.config.update(
-    MAIL_SERVER=os.getenv('MAIL_SERVER'),
-    MAIL_PORT=int(os.getenv('MAIL_PORT') or '587'),
-    MAIL_USE_TLS=os.getenv('MAIL_USE_TLS') == 'True',
-    MAIL_USERNAME=os.getenv('MAIL_USERNAME'),
-    MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
-    SECRET_KEY=os.getenv('SECRET_KEY') or os.environ.get('SECRET_KEY'),
-    BASE_URL=os.getenv('BASE_URL'),
-    # Session configuration for security
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SECURE=os.getenv('FLASK_ENV') == 'production',
-    SESSION_COOKIE_SAMESITE='Lax',
-    PERMANENT_SESSION_LIFETIME=86400  # 24 hours
-)
-
-# Initialize Flask-Mail
-mail = Mail(app)
-
-from app import routes
+]
+
+_default_app = None
+_mail = None
+
+
+def create_app(config=None):
+    """
+    Build and configure a Flask app. `config` (a dict) overrides values read
+    from the environment. Each call returns an independent app; process-wide
+    state (metrics, caches, background threads) is shared.
+    """
+    from flask import Flask
+    from flask_cors import CORS
+
+    app = Flask(__name__)
+    app.config.update(flask_settings())
+    if config:
+        app.config.update(config)
+
+    # orjson-backed jsonify() that serializes datetime, Decimal and bytes from DB rows directly
+    from app import json_provider
+    json_provider.init_app(app)
+
+    # JSON logs written from a background thread, with per-request correlation ids
+    from app import logging_setup
+    logging_setup.init_app(app)
+
+    # Per-request span tracing, kept for slow requests (see TRACE_SLOW_MS); registered early so it encloses the other hooks
+    from app import tracing
+    tracing.init_app(app)
+
+    # gzip/br/zstd response compression negotiated from Accept-Encoding (see COMPRESS_MIN_SIZE)
+    from app import compression
+    compression.init_app(app)
+
+    CORS(app,
+         resources={
+             r"/api/*": {
+                 "origins": ALLOWED_ORIGINS,
+                 "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+                 "allow_headers": ["Content-Type", "Authorization", "X-CSRF-Token", "X-Requested-With", "X-Request-ID", "X-Profile"],
+                 "expose_headers": ["X-CSRF-Token", "X-DB-Queries", "Server-Timing", "X-Request-ID", "X-Profile-Id", "X-Trace-Id"],
+                 "supports_credentials": True,
+                 "max_age": 3600
+             }
+         })
+
+    # Flask-Mail keeps its settings per app; the Mail object itself is shared
+    _get_mail().init_app(app)
+
+    # Request counts and latency histograms for /api/metrics
+    from app import metrics
+    metrics.init_app(app)
+
+    from app.routes import bp
+    app.register_blueprint(bp)
+
+    # Per-request query counts, DB time and N+1 warnings (headers only outside production)
+    from app import query_stats
+    query_stats.init_app(app)
+
+    # Background stack sampler for request threads (on by default in production, see SAMPLER_HZ)
+    from app import sampler
+    sampler.init_app(app)
+
+    # Admin-only X-Profile request profiling; registered last so it wraps the handler as tightly as possible
+    from app import profiler
+    profiler.init_app(app)
+
+    # The maintenance scheduler is started per worker by app.serve, not here:
+    # test apps, benchmarks and a --preload master must not run jobs
+    return app
+
+
+def _get_mail():
+    global _mail
+    if _mail is None:
+        from flask_mail import Mail
+        _mail = Mail()
+    return _mail
+
+
+def __getattr__(name):
+    # `from app import app` / `from app import mail` keep working, built on first use
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    if name == 'mail':
+        return _get_mail()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,9 +6,12 @@ Provides decorators and middleware for protecting routes with session validation
 from functools import wraps
 from flask import request, jsonify, make_response
 from app.session_manager import verify_session_token
-from app.db import get_db_connection
+from app import user_directory
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 def get_token_from_request():
     """
@@ -30,37 +33,27 @@ def get_token_from_request():
 
 def get_user_role_from_db(user_id):
     """
-    Get user role from database.
+    Get user role from the user directory (a short-lived per-worker cache
+    of the user table, see app/user_directory.py).
     Returns the user_role string or None if user not found.
     """
     if not user_id:
         return None
     
-    connection = get_db_connection()
-    if not connection:
-        return None
-    
     try:
-        db_query = connection.cursor(dictionary=True)
-        db_query.execute("SELECT user_role FROM user WHERE user_id = %s", (user_id,))
-        user = db_query.fetchone()
-        db_query.close()
-        connection.close()
-        
+        user = user_directory.get_user(user_id)
         if user:
             return user.get('user_role')
         return None
     except Exception as e:
-        print(f"Error fetching user role from database: {e}")
-        if connection:
-            connection.close()
+        logger.error("Error fetching user role: %s", e)
         return None
 
 
 def require_auth(f):
     """
     Decorator to require authentication for a route.
-    Fetches user role from database to ensure it's always up-to-date.
+    Reads the user role from the user directory, not the token, so role changes apply within seconds.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -85,13 +78,13 @@ def require_auth(f):
         # Get user_id from token
         user_id = payload.get('user_id')
         
-        # Fetch user role from database (always up-to-date)
+        # Fetch user role from the user directory (changes apply within seconds)
         user_role = get_user_role_from_db(user_id)
         
         # Add user info to request context
         request.user_id = user_id
         request.username = payload.get('username')
-        request.user_role = user_role  # From database, not token
+        request.user_role = user_role  # From the user table, not token
         request.session_id = payload.get('session_id')
         
         return f(*args, **kwargs)
@@ -103,7 +96,7 @@ def optional_auth(f):
     """
     Decorator that allows optional authentication.
     If token is present and valid, sets user info in request context.
-    Fetches user role from database to ensure it's always up-to-date.
+    Reads the user role from the user directory, not the token, so role changes apply within seconds.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -113,12 +106,12 @@ def optional_auth(f):
             is_valid, payload, error = verify_session_token(token)
             if is_valid:
                 user_id = payload.get('user_id')
-                # Fetch user role from database (always up-to-date)
+                # Fetch user role from the user directory (changes apply within seconds)
                 user_role = get_user_role_from_db(user_id)
                 
                 request.user_id = user_id
                 request.username = payload.get('username')
-                request.user_role = user_role  # From database, not token
+                request.user_role = user_role  # From the user table, not token
                 request.session_id = payload.get('session_id')
             else:
                 # Token invalid but route allows unauthenticated access
@@ -181,7 +174,7 @@ def require_admin(f):
     """
     Decorator to require admin role for a route.
     Must be used after require_auth or will fail.
-    Verifies admin role from database to ensure it's always up-to-date.
+    Verifies admin role from the user directory, not the token.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -193,10 +186,10 @@ def require_admin(f):
                 'error': 'NO_AUTH'
             }), 401
         
-        # Get user role from database (always up-to-date, even if require_auth already set it)
+        # Get user role from the user directory (even if require_auth already set it)
         user_role = get_user_role_from_db(request.user_id)
         
-        # Update request.user_role with fresh database value
+        # Update request.user_role with the directory value
         request.user_role = user_role
         
         # Check if user has admin role
@@ -0,0 +1,290 @@
+"""
+Compression Module
+Compresses API responses according to the request's Accept-Encoding.
+
+gzip is always available. br (brotli) and zstd are used when the optional
+brotli / zstandard packages are installed. When the client accepts several
+with the same q-value, the server prefers zstd, then br, then gzip.
+
+Only text-like bodies (JSON, text/*, JavaScript, SVG, XML) of at least
+COMPRESS_MIN_SIZE bytes are compressed. File downloads are left alone.
+Streamed responses are compressed chunk by chunk, with a flush after each
+chunk so that clients still receive data as it is produced.
+
+Identical bodies are compressed once. The output is kept in a bounded LRU
+keyed by encoding and a digest of the body, so a feed page served to many
+clients is compressed once per worker.
+
+CPU time and bytes in/out are recorded in /api/metrics. Outside production
+a compress entry is also added to Server-Timing.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from flask import current_app, request
+from app.metrics import CACHE_REQUESTS, COMPRESS_SECONDS, COMPRESS_BYTES_IN, COMPRESS_BYTES_OUT
+from app.tracing import span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Configuration
+COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', '1') != '0'
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE') or 1024)  # Smaller bodies are sent as-is
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL') or 6)  # gzip level, 1-9
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY') or 4)  # 0-11
+COMPRESS_ZSTD_LEVEL = int(os.getenv('COMPRESS_ZSTD_LEVEL') or 3)  # 1-22
+COMPRESS_CACHE_BYTES = int(os.getenv('COMPRESS_CACHE_BYTES') or 16 * 1024 * 1024)  # 0 disables the cache
+COMPRESS_TIMING_HEADER = os.getenv('FLASK_ENV') != 'production'  # Add compress to Server-Timing
+
+COMPRESSIBLE_TYPES = frozenset((
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+))
+
+# Server preference when the client accepts several encodings equally
+PREFERENCE = ('zstd', 'br', 'gzip')
+
+logger = logging.getLogger(__name__)
+
+# (encoding, level, body digest) -> compressed bytes, least recently used first
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def _gzip_compress(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _gzip_stream(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return (lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+
+
+def _brotli_stream(quality):
+    compressor = brotli.Compressor(quality=quality)
+    return (lambda data: compressor.process(data) + compressor.flush()), compressor.finish
+
+
+def _zstd_stream(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return (lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)), compressor.flush
+
+
+def available_encodings():
+    """
+    Encodings this process can produce, in server preference order.
+    """
+    installed = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return tuple(encoding for encoding in PREFERENCE if installed[encoding])
+
+
+def _level(encoding):
+    return {'gzip': COMPRESS_LEVEL, 'br': COMPRESS_BROTLI_QUALITY, 'zstd': COMPRESS_ZSTD_LEVEL}[encoding]
+
+
+def compress(data, encoding, level=None):
+    """
+    Compress a whole body in one call.
+    """
+    level = _level(encoding) if level is None else level
+    if encoding == 'gzip':
+        return _gzip_compress(data, level)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def stream_compressor(encoding, level=None):
+    """
+    Return (feed, finish): feed(chunk) returns the compressed bytes flushed so
+    far, finish() returns the trailer.
+    """
+    level = _level(encoding) if level is None else level
+    if encoding == 'gzip':
+        return _gzip_stream(level)
+    if encoding == 'br':
+        return _brotli_stream(level)
+    if encoding == 'zstd':
+        return _zstd_stream(level)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def negotiate(accept_encoding, available=None):
+    """
+    Pick the encoding for an Accept-Encoding header value, or None for
+    identity. Honours q-values (q=0 refuses) and the * wildcard.
+    """
+    available = available_encodings() if available is None else available
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    wildcard = weights.get('*')
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _cached_compress(data, encoding):
+    """
+    Compress through the LRU. Returns (compressed bytes, cache hit).
+    """
+    global _cache_bytes
+    level = _level(encoding)
+    if COMPRESS_CACHE_BYTES <= 0:
+        return compress(data, encoding, level), False
+
+    key = (encoding, level, hashlib.blake2b(data, digest_size=16).digest())
+    with _cache_lock:
+        compressed = _cache.get(key)
+        if compressed is not None:
+            _cache.move_to_end(key)
+            return compressed, True
+
+    compressed = compress(data, encoding, level)
+    if len(compressed) <= COMPRESS_CACHE_BYTES // 16:
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = compressed
+                _cache_bytes += len(compressed)
+                while _cache_bytes > COMPRESS_CACHE_BYTES:
+                    _, evicted = _cache.popitem(last=False)
+                    _cache_bytes -= len(evicted)
+    return compressed, False
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def _record(encoding, cpu_seconds, bytes_in, bytes_out):
+    COMPRESS_SECONDS.observe(cpu_seconds, encoding)
+    COMPRESS_BYTES_IN.inc(encoding, amount=bytes_in)
+    COMPRESS_BYTES_OUT.inc(encoding, amount=bytes_out)
+
+
+def _compress_stream(chunks, encoding):
+    """
+    Compress a streamed body, flushing after every chunk.
+    """
+    feed, finish = stream_compressor(encoding)
+    cpu = 0.0
+    bytes_in = bytes_out = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            started = time.thread_time()
+            out = feed(chunk)
+            cpu += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(out)
+            if out:
+                yield out
+        started = time.thread_time()
+        out = finish()
+        cpu += time.thread_time() - started
+        bytes_out += len(out)
+        yield out
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        _record(encoding, cpu, bytes_in, bytes_out)
+
+
+def _is_compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+def _compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not _is_compressible(response)
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+
+    # Caches must key on Accept-Encoding whether or not this response is compressed
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    with span('http.compress', encoding=encoding, **{'http.response_size': len(data)}):
+        started = time.thread_time()
+        compressed, hit = _cached_compress(data, encoding)
+        cpu = time.thread_time() - started
+    CACHE_REQUESTS.inc('compressed_body', 'hit' if hit else 'miss')
+    if not hit:
+        _record(encoding, cpu, len(data), len(compressed))
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if current_app.config.get('COMPRESS_TIMING_HEADER', COMPRESS_TIMING_HEADER):
+        timing = f'compress;dur={cpu * 1000:.2f};desc="{encoding} {len(data)}->{len(compressed)}{" cached" if hit else ""}"'
+        existing = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+    return response
+
+
+def init_app(app):
+    """
+    Register the compression hook. Register it right after tracing so it runs
+    after the other after_request hooks have finished the body and headers.
+    """
+    if not COMPRESS_ENABLED:
+        return
+    app.after_request(_compress_response)
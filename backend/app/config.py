@@ -0,0 +1,51 @@
+"""
+Config Module
+Loads the .env file once per process and builds the Flask settings from the
+environment.
+
+The .env file is read when the app package is first imported, before any
+module reads its settings, so module-level constants (DB_*, SAMPLER_HZ, ...)
+see its values too. Set DOTENV_PATH to use a different file.
+"""
+
+import os
+from dotenv import load_dotenv
+
+
+DOTENV_PATH = os.getenv('DOTENV_PATH') or '/home/student3/email.env'
+UPLOAD_FOLDER = '/var/www/feedfinder/uploads'
+
+_env_loaded = False
+
+
+def load_env(path=None):
+    """
+    Load the .env file into os.environ (existing variables win). Later calls
+    do nothing.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    load_dotenv(path or DOTENV_PATH)
+    _env_loaded = True
+
+
+def flask_settings():
+    """
+    Flask config values taken from the environment.
+    """
+    return dict(
+        MAIL_SERVER=os.getenv('MAIL_SERVER'),
+        MAIL_PORT=int(os.getenv('MAIL_PORT') or '587'),
+        MAIL_USE_TLS=os.getenv('MAIL_USE_TLS') == 'True',
+        MAIL_USERNAME=os.getenv('MAIL_USERNAME'),
+        MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
+        SECRET_KEY=os.getenv('SECRET_KEY'),
+        BASE_URL=os.getenv('BASE_URL'),
+        UPLOAD_FOLDER=os.getenv('UPLOAD_FOLDER') or UPLOAD_FOLDER,
+        # Session configuration for security
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SECURE=os.getenv('FLASK_ENV') == 'production',
+        SESSION_COOKIE_SAMESITE='Lax',
+        PERMANENT_SESSION_LIFETIME=86400  # 24 hours
+    )
@@ -1,72 +1,115 @@
 """
 CSRF Protection Module
-Implements CSRF token generation and validation.
+Implements stateless double-submit CSRF tokens.
+
+A token is "<expires>.<signature>", where the signature is an HMAC-SHA256,
+under SECRET_KEY, of the client's csrf_id cookie and the expiry timestamp.
+The csrf_id cookie is a random id set once by /api/csrf-token. Validation
+recomputes the HMAC and does one constant-time comparison. Nothing is kept
+on the server, and validating never rewrites a cookie.
+
+A cross-site page can neither read the csrf_id cookie nor compute the HMAC
+without the key, so it cannot produce a token that matches the cookie the
+browser sends.
 """
 
-import secrets
+import base64
 import hashlib
-from flask import session, request
-from datetime import datetime, timedelta
+import hmac
+import secrets
+import time
+from functools import wraps
+from flask import after_this_request, g, jsonify, request
+from app.session_manager import SECRET_KEY
+
+
+# Configuration
+CSRF_COOKIE = 'csrf_id'
+CSRF_TOKEN_LIFETIME = 24 * 3600  # Seconds a token is accepted
+CSRF_COOKIE_MAX_AGE = 7 * 24 * 3600  # Matches the refresh token lifetime
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_KEY = hashlib.sha256(b'feedfinder-csrf:' + SECRET_KEY.encode()).digest()
 
 
-def generate_csrf_token():
+def _sign(csrf_id, expires):
+    digest = hmac.new(_KEY, f"{csrf_id}:{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def get_csrf_id():
     """
-    Generate a CSRF token and store it in the session.
+    The client's CSRF id from its cookie. A new id is created when the
+    cookie is missing, and set on this request's response.
     """
-    if 'csrf_token' not in session:
-        session['csrf_token'] = secrets.token_urlsafe(32)
-        session['csrf_token_expiry'] = (datetime.utcnow() + timedelta(hours=24)).isoformat()
-    return session['csrf_token']
+    csrf_id = request.cookies.get(CSRF_COOKIE) or g.get('csrf_id')
+    if csrf_id:
+        return csrf_id
+
+    csrf_id = g.csrf_id = secrets.token_urlsafe(32)
 
+    @after_this_request
+    def set_csrf_cookie(response):
+        response.set_cookie(
+            CSRF_COOKIE,
+            csrf_id,
+            httponly=True,
+            secure=True,
+            samesite='Lax',
+            max_age=CSRF_COOKIE_MAX_AGE,
+            path='/'
+        )
+        return response
 
-def validate_csrf_token(token):
+    return csrf_id
+
+
+def generate_csrf_token(now=None):
     """
-    Validate a CSRF token.
+    Generate a CSRF token bound to the client's csrf_id cookie.
     """
-    if 'csrf_token' not in session:
+    expires = int(now if now is not None else time.time()) + CSRF_TOKEN_LIFETIME
+    return f"{expires}.{_sign(get_csrf_id(), expires)}"
+
+
+def validate_csrf_token(token, csrf_id=None, now=None):
+    """
+    Validate a CSRF token against the request's csrf_id cookie.
+    """
+    csrf_id = csrf_id or request.cookies.get(CSRF_COOKIE)
+    if not token or not csrf_id:
         return False
-    
-    # Check if token expired
-    expiry_str = session.get('csrf_token_expiry')
-    if expiry_str:
-        expiry = datetime.fromisoformat(expiry_str)
-        if datetime.utcnow() > expiry:
-            session.pop('csrf_token', None)
-            session.pop('csrf_token_expiry', None)
-            return False
-    
-    # Constant-time comparison to prevent timing attacks
-    stored_token = session.get('csrf_token')
-    if not stored_token or not token:
+
+    expires, _, signature = token.partition('.')
+    if not (expires.isascii() and expires.isdigit()) or int(expires) < (now if now is not None else time.time()):
         return False
-    
-    return secrets.compare_digest(stored_token, token)
+
+    # Constant-time comparison to prevent timing attacks
+    return hmac.compare_digest(_sign(csrf_id, expires).encode(), signature.encode())
 
 
 def require_csrf(f):
     """
     Decorator to require CSRF token validation for a route.
     """
-    from functools import wraps
-    from flask import jsonify
-    
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # Skip CSRF for GET requests
-        if request.method == 'GET':
+        # Skip CSRF for safe methods
+        if request.method in SAFE_METHODS:
             return f(*args, **kwargs)
-        
+
         # Get token from header or form data
-        token = request.headers.get('X-CSRF-Token') or request.form.get('csrf_token') or request.json.get('csrf_token') if request.is_json else None
-        
+        token = request.headers.get('X-CSRF-Token') or request.form.get('csrf_token')
+        if not token and request.is_json:
+            token = (request.get_json(silent=True) or {}).get('csrf_token')
+
         if not token or not validate_csrf_token(token):
             return jsonify({
                 'success': False,
                 'message': 'Invalid or missing CSRF token',
                 'error': 'CSRF_TOKEN_INVALID'
             }), 403
-        
+
         return f(*args, **kwargs)
-    
-    return decorated_function
 
+    return decorated_function
@@ -1,21 +1,28 @@
 import mysql.connector
 from mysql.connector import Error
-from dotenv import load_dotenv
 import os
+import time
+from app.query_stats import instrument_connection
+from app.metrics import DB_CONNECT_SECONDS, DB_CONNECT_ERRORS
+from app.tracing import span, KIND_CLIENT
+import logging
 
-# Load .env file from a specific path
-load_dotenv("/home/student3/email.env")
+logger = logging.getLogger(__name__)
 
 def get_db_connection():
+    started = time.perf_counter()
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            port=int(os.getenv("DB_PORT")),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-        return connection
+        with span('db.connect', KIND_CLIENT, **{'db.system': 'mysql'}):
+            connection = mysql.connector.connect(
+                host=os.getenv("DB_HOST"),
+                port=int(os.getenv("DB_PORT")),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                database=os.getenv("DB_NAME")
+            )
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - started)
+        return instrument_connection(connection)
     except Error as e:
-        print(f"Error: {e}")
+        DB_CONNECT_ERRORS.inc()
+        logger.error("Database connection error: %s", e)
         return None
\ No newline at end of file
@@ -1,4 +1,6 @@
+import time
 from argon2 import PasswordHasher
+from app.metrics import ARGON2_IN_FLIGHT, ARGON2_SECONDS
 
 
 # Initialize Argon2id hasher (you can adjust parameters for stronger hashing if needed)
@@ -8,15 +10,26 @@ def hash_password(password: str) -> str:
     """
     Takes a plain text password and returns a secure Argon2id hash.
     """
-    return ph.hash(password)
+    ARGON2_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        return ph.hash(password)
+    finally:
+        ARGON2_SECONDS.observe(time.perf_counter() - started, 'hash')
+        ARGON2_IN_FLIGHT.dec()
 
 def verify_password(hashed_password: str, plain_password: str) -> bool:
     """
     Verifies if the plain password matches the stored hashed password.
     Returns True if valid, False otherwise.
     """
+    ARGON2_IN_FLIGHT.inc()
+    started = time.perf_counter()
     try:
         ph.verify(hashed_password, plain_password)
         return True
     except Exception:
-        return False
\ No newline at end of file
+        return False
+    finally:
+        ARGON2_SECONDS.observe(time.perf_counter() - started, 'verify')
+        ARGON2_IN_FLIGHT.dec()
\ No newline at end of file
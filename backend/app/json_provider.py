@@ -0,0 +1,114 @@
+"""
+JSON Provider Module
+Flask JSON provider backed by orjson, with a stdlib json fallback when orjson
+is not installed.
+
+Rows from mysql-connector can be passed to jsonify() as they are:
+- datetime, date and time become ISO 8601 strings; naive datetimes are UTC
+  (as stored by the app) and get a "+00:00" offset, so browsers do not
+  read them as local time
+- Decimal becomes a number
+- bytes/bytearray are decoded as UTF-8
+- timedelta (TIME columns) becomes "HH:MM:SS"
+
+Keys are sorted, matching Flask's default provider.
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+
+def _format_timedelta(value):
+    total = int(value.total_seconds())
+    sign = '-' if total < 0 else ''
+    hours, remainder = divmod(abs(total), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{sign}{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def default(value):
+    """
+    Serialize the types orjson/json do not handle natively.
+    """
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode('utf-8', errors='replace')
+    if isinstance(value, timedelta):
+        return _format_timedelta(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        # Same output as orjson.OPT_NAIVE_UTC
+        return value.replace(tzinfo=timezone.utc).isoformat()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(JSONProvider):
+    """orjson-backed provider; falls back to the stdlib when orjson is missing."""
+
+    sort_keys = True
+    compact = None  # None: indent in debug mode, like Flask's default provider
+    mimetype = 'application/json'
+
+    def _indent(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumps_bytes(self, obj, indent=False):
+        """
+        Serialize to UTF-8 bytes without an intermediate str where possible.
+        """
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=default, option=option)
+        return json.dumps(
+            obj, default=default, sort_keys=self.sort_keys, ensure_ascii=False,
+            indent=2 if indent else None, separators=None if indent else (',', ':')
+        ).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Callers asking for specific json.dumps options get the stdlib
+            kwargs.setdefault('default', default)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self._indent()
+        body = self.dumps_bytes(obj, indent=indent)
+        return self._app.response_class(body + b'\n' if indent else body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    """
+    Use the fast provider for jsonify() and request.get_json().
+    """
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,187 @@
+"""
+Logging Setup Module
+Structured JSON logging that never blocks a request on stdout/stderr.
+
+Records are handed to a QueueHandler on the root logger and written by a
+QueueListener thread, so a full journald/Gunicorn pipe stalls the writer
+thread instead of the worker. Each line is one JSON object:
+
+    {"ts": "...", "level": "ERROR", "logger": "app.routes", "msg": "...",
+     "request_id": "5f0c...", "method": "GET", "path": "/api/login"}
+
+Every request gets a correlation id, taken from an incoming X-Request-ID
+header or generated, and returned in the X-Request-ID response header.
+DEBUG lines are sampled per request (LOG_DEBUG_SAMPLE_RATE) so a sampled
+request keeps its full debug trail and the rest cost almost nothing.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+
+# Configuration
+LOG_LEVEL = os.getenv('LOG_LEVEL') or 'INFO'
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE') or 0.01)  # Share of requests that log DEBUG lines
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE') or 10000)  # Records beyond this are dropped, not waited on
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a single JSON line."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Attach the request id, method and path, and let DEBUG records below the
+    configured level through only for sampled requests. Runs on the calling
+    thread, before the record is queued, while the request context is still
+    available.
+    """
+
+    def __init__(self, level=logging.INFO):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            if record.levelno < logging.DEBUG or not _debug_sampled():
+                return False
+        if has_request_context():
+            record.request_id = request_id()
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that renders the message and traceback on the caller's
+    thread (args may be mutated later) but leaves JSON formatting to the
+    listener, and drops records rather than blocking when the queue is full.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def request_id():
+    """
+    Correlation id of the current request, or None outside a request.
+    """
+    if not has_request_context():
+        return None
+    if 'request_id' not in g:
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+    return g.request_id
+
+
+def _debug_sampled():
+    if not has_request_context():
+        return random.random() < LOG_DEBUG_SAMPLE_RATE
+    if 'log_debug_sampled' not in g:
+        g.log_debug_sampled = random.random() < LOG_DEBUG_SAMPLE_RATE
+    return g.log_debug_sampled
+
+
+def configure_logging(level=None, stream=None):
+    """
+    Route the root logger through the background writer. Safe to call more
+    than once; later calls replace the previous handler and listener.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    level = level or LOG_LEVEL
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(level))
+
+    stream_handler = logging.StreamHandler(stream or sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # Our own loggers pass DEBUG on to the filter, which keeps it for sampled requests only
+    logging.getLogger('app').setLevel(min(level, logging.DEBUG) if LOG_DEBUG_SAMPLE_RATE > 0 else level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """
+    Flush queued records and stop the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _set_request_id_header(response):
+    response.headers[REQUEST_ID_HEADER] = request_id()
+    return response
+
+
+def init_app(app):
+    """
+    Configure logging and return the correlation id on every response.
+    """
+    configure_logging()
+    atexit.register(shutdown_logging)
+    app.after_request(_set_request_id_header)
@@ -0,0 +1,362 @@
+"""
+Mail Queue Module
+Outbound mail through an on-disk spool, so requests never wait on SMTP.
+
+enqueue(msg) writes the message to the spool and returns. A sender
+thread in each worker sends due messages in batches of up to
+MAIL_BATCH_SIZE over one SMTP connection (the login happens once per
+batch, not once per message), and checks the spool again every
+MAIL_QUEUE_POLL_INTERVAL seconds or as soon as a message is enqueued.
+
+Spool layout, one JSON file per message:
+
+    queue/<due ms>-<id>.json    waiting; sent once <due ms> has passed
+    sending/<due ms>-<id>.json  claimed by a sender
+    failed/<due ms>-<id>.json   gave up (MAIL_MAX_ATTEMPTS, or rejected)
+
+Files are written under a temporary name and renamed into place. A sender
+claims a message by renaming it into sending/, so workers sharing the
+spool never send a message twice. A claim older than MAIL_CLAIM_TIMEOUT
+(its worker died mid-send) goes back to queue/. Messages survive restarts.
+
+A failed send is retried after MAIL_RETRY_DELAY seconds, doubling per
+attempt up to MAIL_RETRY_MAX_DELAY. A message enqueued with expires_in
+(a 2FA code) is dropped rather than sent once it has expired. When the
+SMTP server cannot be reached at all, the sender backs off the same way.
+
+The spool is MAIL_SPOOL_DIR, or mail/ in the Flask instance folder when
+that is unset. MAIL_QUEUE=0 sends synchronously as before; so does a spool
+that cannot be written, after one warning per process.
+"""
+
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from flask import current_app
+from app.metrics import MAIL_MESSAGES
+from app.tracing import span, KIND_CLIENT
+
+
+# Configuration
+MAIL_QUEUE = os.getenv('MAIL_QUEUE', '1') != '0'
+MAIL_SPOOL_DIR = os.getenv('MAIL_SPOOL_DIR')  # Default: <instance folder>/mail
+MAIL_QUEUE_POLL_INTERVAL = float(os.getenv('MAIL_QUEUE_POLL_INTERVAL') or 5)  # Seconds between spool checks
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE') or 50)  # Messages per SMTP connection
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS') or 8)
+MAIL_RETRY_DELAY = float(os.getenv('MAIL_RETRY_DELAY') or 30)  # Seconds before the first retry; doubles per attempt
+MAIL_RETRY_MAX_DELAY = float(os.getenv('MAIL_RETRY_MAX_DELAY') or 3600)
+MAIL_CLAIM_TIMEOUT = 600  # Seconds before a claimed message is assumed abandoned
+
+QUEUE, SENDING, FAILED = 'queue', 'sending', 'failed'
+
+logger = logging.getLogger(__name__)
+
+_wake = threading.Event()
+_sender_pid = None
+_sender_lock = threading.Lock()
+_ready_spools = set()
+_unusable_spools = set()
+
+
+def _path(spool_dir, state, name=''):
+    return os.path.join(spool_dir, state, name)
+
+
+def spool_path(app):
+    """
+    The spool directory for an app.
+    """
+    return MAIL_SPOOL_DIR or os.path.join(app.instance_path, 'mail')
+
+
+def _ensure_spool(spool_dir):
+    if spool_dir in _ready_spools:
+        return
+    # Messages hold 2FA codes: keep them private to the app's user
+    for state in (QUEUE, SENDING, FAILED):
+        os.makedirs(_path(spool_dir, state), mode=0o700, exist_ok=True)
+    _ready_spools.add(spool_dir)
+
+
+def _spool_unusable(spool_dir, error):
+    # Warn once; after that mail is sent synchronously without more noise
+    _ready_spools.discard(spool_dir)
+    if spool_dir not in _unusable_spools:
+        _unusable_spools.add(spool_dir)
+        logger.warning("Mail spool %s is not writable, sending synchronously: %s", spool_dir, error)
+
+
+def _write(spool_dir, state, name, message):
+    """
+    Write a message file atomically.
+    """
+    path = _path(spool_dir, state, name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(message, f)
+    os.replace(tmp_path, path)
+
+
+def _name(due, message_id):
+    return f"{int(due * 1000):015d}-{message_id}.json"
+
+
+def _due_at(name):
+    return int(name.split('-', 1)[0]) / 1000
+
+
+def retry_delay(attempts):
+    """
+    Seconds to wait after the given number of failed attempts.
+    """
+    return min(MAIL_RETRY_DELAY * 2 ** (attempts - 1), MAIL_RETRY_MAX_DELAY)
+
+
+def serialize(msg):
+    return {
+        'subject': msg.subject,
+        'recipients': list(msg.recipients),
+        'body': msg.body,
+        'html': msg.html,
+        'sender': msg.sender,
+    }
+
+
+def deserialize(message):
+    from flask_mail import Message
+    return Message(
+        subject=message['subject'],
+        recipients=message['recipients'],
+        body=message['body'],
+        html=message['html'],
+        sender=message['sender'],
+    )
+
+
+def send_now(msg):
+    """
+    Send a message synchronously, in the request.
+    """
+    from app import mail
+    with span('mail.send', KIND_CLIENT, **{'mail.recipients': len(msg.recipients)}):
+        mail.send(msg)
+
+
+def enqueue(msg, expires_in=None, spool_dir=None, now=None):
+    """
+    Queue a flask_mail Message for the sender thread and return its id.
+    With expires_in (seconds), the message is dropped instead of sent once
+    it is that old. Falls back to sending now if the spool is unusable.
+    """
+    if not MAIL_QUEUE:
+        send_now(msg)
+        return None
+    spool_dir = spool_dir or spool_path(current_app)
+    if spool_dir in _unusable_spools:
+        send_now(msg)
+        return None
+    now = time.time() if now is None else now
+    message = serialize(msg)
+    message.update({
+        # Starts with the clock, so messages due in the same ms go out in order
+        'id': f"{time.time_ns():x}{uuid.uuid4().hex[:16]}",
+        'created_at': now,
+        'expires_at': now + expires_in if expires_in else None,
+        'attempts': 0,
+    })
+    try:
+        with span('mail.enqueue', **{'mail.recipients': len(msg.recipients)}):
+            _ensure_spool(spool_dir)
+            _write(spool_dir, QUEUE, _name(now, message['id']), message)
+    except OSError as e:
+        _spool_unusable(spool_dir, e)
+        send_now(msg)
+        return None
+    MAIL_MESSAGES.inc('queued')
+    start_sender(current_app._get_current_object(), spool_dir)
+    _wake.set()
+    return message['id']
+
+
+def due_messages(spool_dir, now=None):
+    """
+    Names of queued messages that are due, oldest first.
+    """
+    now = time.time() if now is None else now
+    try:
+        names = os.listdir(_path(spool_dir, QUEUE))
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if name.endswith('.json') and _due_at(name) <= now)
+
+
+def _claim(spool_dir, name):
+    """
+    Take a queued message for sending. None if another sender got it first,
+    or if the file is unreadable (it is moved to failed/).
+    """
+    claimed = _path(spool_dir, SENDING, name)
+    try:
+        os.rename(_path(spool_dir, QUEUE, name), claimed)
+    except FileNotFoundError:
+        return None
+    # The claim's age is measured from now, not from the enqueue
+    os.utime(claimed)
+    with open(claimed, encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            error = e
+    # Out of queue/ for good, so this is logged once rather than every pass
+    os.rename(claimed, _path(spool_dir, FAILED, name))
+    MAIL_MESSAGES.inc('failed')
+    logger.error("Unreadable mail %s moved to %s: %s", name, FAILED, error)
+    return None
+
+
+def _release_stale_claims(spool_dir, now):
+    try:
+        names = os.listdir(_path(spool_dir, SENDING))
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = _path(spool_dir, SENDING, name)
+        try:
+            if now - os.path.getmtime(path) > MAIL_CLAIM_TIMEOUT:
+                os.rename(path, _path(spool_dir, QUEUE, name))
+                logger.warning("Requeued abandoned mail %s", name)
+        except FileNotFoundError:
+            continue
+
+
+def _permanent(error):
+    # 5xx replies: sending the same message again cannot succeed
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _connection_lost(error):
+    # SMTPException is an OSError too, but most of them are replies
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def _retry(spool_dir, name, message, error, now):
+    """
+    Put a message back with backoff, or move it to failed/.
+    """
+    message['attempts'] += 1
+    message['last_error'] = str(error)
+    if _permanent(error) or message['attempts'] >= MAIL_MAX_ATTEMPTS:
+        _write(spool_dir, FAILED, name, message)
+        MAIL_MESSAGES.inc('failed')
+        logger.error("Giving up on mail %s after %d attempts: %s", message['id'], message['attempts'], error)
+    else:
+        _write(spool_dir, QUEUE, _name(now + retry_delay(message['attempts']), message['id']), message)
+        MAIL_MESSAGES.inc('retried')
+        logger.warning("Mail %s failed, attempt %d: %s", message['id'], message['attempts'], error)
+    os.unlink(_path(spool_dir, SENDING, name))
+
+
+def send_pending(app, spool_dir=None, now=None):
+    """
+    Send up to MAIL_BATCH_SIZE due messages over one SMTP connection.
+    Returns the number of messages claimed, or None if the SMTP server
+    could not be reached (the messages stay queued).
+    """
+    from app import mail
+    spool_dir = spool_dir or spool_path(app)
+    now = time.time() if now is None else now
+    _release_stale_claims(spool_dir, now)
+    names = due_messages(spool_dir, now)[:MAIL_BATCH_SIZE]
+    if not names:
+        return 0
+
+    claimed = 0
+    with app.app_context():
+        connection = mail.connect()
+        try:
+            connection.__enter__()
+        except OSError as e:
+            logger.error("Cannot connect to the mail server: %s", e)
+            return None
+        try:
+            for name in names:
+                message = _claim(spool_dir, name)
+                if message is None:
+                    continue
+                claimed += 1
+                if message['expires_at'] and message['expires_at'] <= now:
+                    os.unlink(_path(spool_dir, SENDING, name))
+                    MAIL_MESSAGES.inc('expired')
+                    continue
+                try:
+                    connection.send(deserialize(message))
+                except Exception as e:
+                    _retry(spool_dir, name, message, e, now)
+                    # The connection is gone; the rest waits for the next batch
+                    if _connection_lost(e):
+                        break
+                    continue
+                os.unlink(_path(spool_dir, SENDING, name))
+                MAIL_MESSAGES.inc('sent')
+        finally:
+            try:
+                connection.__exit__(None, None, None)
+            except OSError:
+                pass
+    return claimed
+
+
+def _send_loop(app, spool_dir):
+    failures = 0
+    while True:
+        _wake.clear()
+        try:
+            claimed = send_pending(app, spool_dir)
+        except Exception as e:
+            logger.error("Error in mail sender: %s", e)
+            claimed = None
+        if claimed is None:
+            # SMTP outage: back off instead of reconnecting on every enqueue
+            failures += 1
+            time.sleep(retry_delay(failures))
+            continue
+        failures = 0
+        if claimed < MAIL_BATCH_SIZE:
+            _wake.wait(MAIL_QUEUE_POLL_INTERVAL)
+
+
+def start_sender(app, spool_dir=None):
+    """
+    Start the sender once per process. Checked by pid so each forked
+    worker gets its own thread. Creates the spool first; if it cannot be
+    created, mail is sent synchronously and no thread is started.
+    """
+    global _sender_pid
+    if not MAIL_QUEUE or _sender_pid == os.getpid():
+        return
+    spool_dir = spool_dir or spool_path(app)
+    with _sender_lock:
+        if _sender_pid == os.getpid() or spool_dir in _unusable_spools:
+            return
+        try:
+            _ensure_spool(spool_dir)
+        except OSError as e:
+            _spool_unusable(spool_dir, e)
+            return
+        thread = threading.Thread(
+            target=_send_loop,
+            args=(app, spool_dir),
+            name='mail-sender',
+            daemon=True
+        )
+        thread.start()
+        _sender_pid = os.getpid()
@@ -0,0 +1,439 @@
+"""
+Maintenance Module
+Periodic database jobs run by a background scheduler in each worker, or
+once from the command line.
+
+Jobs:
+- purge_sessions: delete expired sessions in batches of
+  SESSION_PURGE_BATCH_SIZE rows, sleeping SESSION_PURGE_SLEEP seconds
+  between batches. Each batch is
+      DELETE FROM sessions WHERE expires_at < NOW() LIMIT n
+  which is served by idx_expires_at and keeps each transaction short.
+  Logged-out sessions (is_active = 0) go once they expire too. Skipped
+  when the sessions table is partitioned.
+- session_partitions: on a sessions table partitioned by expiry day
+  (migration 0005), keep SESSION_PARTITION_DAYS_AHEAD daily partitions
+  ahead of today and drop the ones whose day has passed. Dropping a
+  partition removes a day of expired sessions at once, without row deletes.
+- purge_revocations: delete session_revocation rows no token can still need.
+- sweep_subscriptions: deactivate expired subscriptions and memberships.
+
+Every Gunicorn worker runs the scheduler, started by app.serve once the
+worker has booted; create_app() does not start it. Elsewhere, run jobs
+from the command line. Each job run takes a MySQL advisory lock
+(GET_LOCK) named after the job. When another worker holds the lock,
+the run is skipped, so a job never runs twice at once. Under the lock,
+the start of each run is stored in the maintenance_run table (migration
+0009), and a scheduled run is skipped when the job already started less
+than its interval ago, so with N workers a job still runs once per
+interval, not N times. First runs are spread over the first interval, so
+workers do not all start together. Command-line runs are never skipped
+as not due.
+
+Usage:
+    python -m app.maintenance --list
+    python -m app.maintenance purge_sessions --batch-size 5000
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from app.db import get_db_connection
+from app.metrics import MAINTENANCE_ROWS, MAINTENANCE_RUNS
+
+
+# Configuration
+SESSION_PURGE_INTERVAL = float(os.getenv('SESSION_PURGE_INTERVAL') or 300)  # Seconds between runs; 0 disables
+SESSION_PURGE_BATCH_SIZE = int(os.getenv('SESSION_PURGE_BATCH_SIZE') or 1000)  # Rows per DELETE
+SESSION_PURGE_SLEEP = float(os.getenv('SESSION_PURGE_SLEEP') or 0.05)  # Seconds between batches
+SESSION_PURGE_MAX_SECONDS = float(os.getenv('SESSION_PURGE_MAX_SECONDS') or 60)  # Stop a run after this long
+SESSION_PARTITION_INTERVAL = float(os.getenv('SESSION_PARTITION_INTERVAL') or 3600)  # Seconds between runs; 0 disables
+SESSION_PARTITION_DAYS_AHEAD = int(os.getenv('SESSION_PARTITION_DAYS_AHEAD') or 8)  # Daily partitions kept ahead of today
+SWEEP_SUBSCRIPTIONS_INTERVAL = float(os.getenv('SWEEP_SUBSCRIPTIONS_INTERVAL') or 3600)  # Seconds between runs; 0 disables
+FUTURE_PARTITION = 'p_future'  # Catch-all partition created by migration 0005
+MAINTENANCE_TICK = 1.0  # Scheduler resolution in seconds
+LOCK_PREFIX = 'feedfinder:'
+
+PURGE_SESSIONS_SQL = "DELETE FROM sessions WHERE expires_at < NOW() LIMIT %s"
+PURGE_REVOCATIONS_SQL = "DELETE FROM session_revocation WHERE expires_at < UTC_TIMESTAMP() LIMIT %s"
+# 1 when the job started less than %s seconds ago
+RAN_RECENTLY_SQL = "SELECT last_run_at > UTC_TIMESTAMP(3) - INTERVAL %s SECOND FROM maintenance_run WHERE job_name = %s"
+RECORD_RUN_SQL = (
+    "INSERT INTO maintenance_run (job_name, last_run_at) VALUES (%s, UTC_TIMESTAMP(3)) "
+    "ON DUPLICATE KEY UPDATE last_run_at = VALUES(last_run_at)"
+)
+
+logger = logging.getLogger(__name__)
+
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+class Job:
+    """A named periodic job."""
+
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+
+
+_jobs = {}
+
+
+def register_job(name, func, interval):
+    """
+    Add a job to the scheduler. Jobs with an interval of 0 can still be run
+    from the command line.
+    """
+    _jobs[name] = Job(name, func, interval)
+
+
+@contextmanager
+def advisory_lock(name):
+    """
+    Hold the MySQL advisory lock for `name` while the block runs. Yields
+    the connection holding the lock, or None, without waiting, when another
+    connection holds it or the database is unreachable.
+    """
+    connection = get_db_connection()
+    if connection is None:
+        yield None
+        return
+    db_query = connection.cursor()
+    try:
+        db_query.execute("SELECT GET_LOCK(%s, 0)", (LOCK_PREFIX + name,))
+        row = db_query.fetchone()
+        acquired = bool(row and row[0] == 1)
+        try:
+            yield connection if acquired else None
+        finally:
+            if acquired:
+                db_query.execute("SELECT RELEASE_LOCK(%s)", (LOCK_PREFIX + name,))
+                db_query.fetchone()
+    finally:
+        db_query.close()
+        connection.close()
+
+
+def delete_in_batches(sql, params=(), batch_size=None, sleep=None, max_seconds=None):
+    """
+    Run a DELETE ... LIMIT %s repeatedly until it deletes fewer than
+    batch_size rows or max_seconds pass. Commits after every batch.
+    Returns {'rows', 'batches', 'seconds', 'rows_per_second'}.
+    """
+    batch_size = batch_size or SESSION_PURGE_BATCH_SIZE
+    sleep = SESSION_PURGE_SLEEP if sleep is None else sleep
+    max_seconds = SESSION_PURGE_MAX_SECONDS if max_seconds is None else max_seconds
+
+    started = time.monotonic()
+    rows = batches = 0
+    connection = get_db_connection()
+    if connection is None:
+        return None
+    try:
+        db_query = connection.cursor()
+        while True:
+            db_query.execute(sql, tuple(params) + (batch_size,))
+            connection.commit()
+            rows += db_query.rowcount
+            batches += 1
+            if db_query.rowcount < batch_size or time.monotonic() - started >= max_seconds:
+                break
+            if sleep:
+                time.sleep(sleep)
+        db_query.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    seconds = time.monotonic() - started
+    return {
+        'rows': rows,
+        'batches': batches,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds > 0 else rows,
+    }
+
+
+def purge_expired_sessions(batch_size=None, sleep=None, max_seconds=None):
+    """
+    Delete expired sessions in bounded batches.
+    """
+    return delete_in_batches(
+        PURGE_SESSIONS_SQL,
+        batch_size=batch_size, sleep=sleep, max_seconds=max_seconds
+    )
+
+
+def to_days(day):
+    """
+    MySQL TO_DAYS() of a date.
+    """
+    return day.toordinal() + 365
+
+
+def from_days(days):
+    return date.fromordinal(days - 365)
+
+
+def get_session_partitions(db_query):
+    """
+    Return [(name, bound, rows)] for the sessions table in partition order.
+    bound is the TO_DAYS() value in VALUES LESS THAN, or None for MAXVALUE;
+    rows is InnoDB's estimate. Empty if the table is not partitioned.
+    """
+    db_query.execute(
+        """
+        SELECT partition_name, partition_description, table_rows
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'sessions' AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+        """
+    )
+    return [
+        (name, None if bound == 'MAXVALUE' else int(bound), rows or 0)
+        for name, bound, rows in db_query.fetchall()
+    ]
+
+
+def plan_session_partitions(partitions, today, days_ahead=None):
+    """
+    Decide which daily partitions to add and drop.
+    Returns (days to add, names of partitions to drop).
+
+    Partition pYYYYMMDD holds sessions expiring on that day, so it can be
+    dropped once the day is over. Daily partitions are added up to
+    today + days_ahead.
+    """
+    days_ahead = SESSION_PARTITION_DAYS_AHEAD if days_ahead is None else days_ahead
+    bounds = [bound for _, bound, _ in partitions if bound is not None]
+    first = max(from_days(max(bounds)), today) if bounds else today
+    add = [first + timedelta(days=n) for n in range((today + timedelta(days=days_ahead) - first).days + 1)]
+    drop = [name for name, bound, _ in partitions if bound is not None and bound <= to_days(today)]
+    return add, drop
+
+
+def _partition_sql(day):
+    return f"PARTITION p{day:%Y%m%d} VALUES LESS THAN ({to_days(day + timedelta(days=1))})"
+
+
+def maintain_session_partitions(today=None, days_ahead=None, **_):
+    """
+    Add upcoming daily partitions to the sessions table and drop expired ones.
+    Returns {'rows', 'added', 'dropped'}, where rows estimates the sessions
+    dropped, or None if the database could not be reached.
+    """
+    today = today or datetime.utcnow().date()
+    connection = get_db_connection()
+    if connection is None:
+        return None
+    try:
+        db_query = connection.cursor()
+        partitions = get_session_partitions(db_query)
+        if not partitions:
+            db_query.close()
+            return {'rows': 0, 'added': 0, 'dropped': 0, 'partitioned': False}
+
+        add, drop = plan_session_partitions(partitions, today, days_ahead)
+        if add:
+            new_partitions = ', '.join(_partition_sql(day) for day in add)
+            if partitions[-1][1] is None:
+                # Split the new days off the catch-all partition
+                db_query.execute(
+                    f"ALTER TABLE sessions REORGANIZE PARTITION {partitions[-1][0]} INTO "
+                    f"({new_partitions}, PARTITION {partitions[-1][0]} VALUES LESS THAN MAXVALUE)"
+                )
+            else:
+                db_query.execute(f"ALTER TABLE sessions ADD PARTITION ({new_partitions})")
+        if drop:
+            db_query.execute(f"ALTER TABLE sessions DROP PARTITION {', '.join(drop)}")
+        db_query.close()
+    finally:
+        connection.close()
+
+    return {
+        'rows': sum(rows for name, _, rows in partitions if name in drop),
+        'added': len(add),
+        'dropped': len(drop),
+    }
+
+
+def sessions_partitioned():
+    """
+    Whether the sessions table is partitioned (migration 0005 applied).
+    """
+    connection = get_db_connection()
+    if connection is None:
+        return False
+    try:
+        db_query = connection.cursor()
+        partitioned = bool(get_session_partitions(db_query))
+        db_query.close()
+        return partitioned
+    finally:
+        connection.close()
+
+
+def _purge_sessions(**kwargs):
+    if sessions_partitioned():
+        # session_partitions drops whole days instead
+        return {'rows': 0, 'skipped': 'partitioned'}
+    return purge_expired_sessions(**kwargs)
+
+
+def purge_expired_revocations(batch_size=None, sleep=None, max_seconds=None):
+    """
+    Delete revocation rows that no access token can still need (see
+    app.revocation).
+    """
+    return delete_in_batches(
+        PURGE_REVOCATIONS_SQL,
+        batch_size=batch_size, sleep=sleep, max_seconds=max_seconds
+    )
+
+
+def _sweep_subscriptions(batch_size=None, **_):
+    from app.subscriptions import sweep_expired_subscriptions
+    flipped = sweep_expired_subscriptions(batch_size)
+    return {'rows': sum(flipped.values()), **flipped}
+
+
+def start_run(connection, name, interval=None):
+    """
+    Record that job `name` starts now, on the connection holding its lock.
+    With an interval, returns False instead when the job last started less
+    than interval seconds ago (another worker ran it).
+    """
+    db_query = connection.cursor()
+    try:
+        if interval:
+            # A tick of slack, so the worker that ran the job last is not
+            # turned away by a few ms of scheduling jitter
+            db_query.execute(RAN_RECENTLY_SQL, (max(interval - MAINTENANCE_TICK, 0), name))
+            row = db_query.fetchone()
+            if row and row[0]:
+                connection.rollback()
+                return False
+        db_query.execute(RECORD_RUN_SQL, (name,))
+        connection.commit()
+        return True
+    finally:
+        db_query.close()
+
+
+def run_job(name, scheduled=False, **kwargs):
+    """
+    Run a job once under its advisory lock. Returns the job's report, or
+    None if it was skipped because another worker is running it or, for a
+    scheduled run, already ran it within the job's interval.
+    """
+    job = _jobs[name]
+    with advisory_lock(name) as connection:
+        if connection is None:
+            MAINTENANCE_RUNS.inc(name, 'skipped')
+            return None
+        try:
+            if not start_run(connection, name, job.interval if scheduled else None):
+                MAINTENANCE_RUNS.inc(name, 'not_due')
+                return None
+            report = job.func(**kwargs)
+        except Exception as e:
+            MAINTENANCE_RUNS.inc(name, 'error')
+            logger.error("Maintenance job %s failed: %s", name, e)
+            return None
+    MAINTENANCE_RUNS.inc(name, 'ok')
+    if report:
+        MAINTENANCE_ROWS.inc(name, amount=report.get('rows', 0))
+        logger.info("Maintenance job %s: %s", name, report)
+    return report
+
+
+def _scheduler_loop():
+    now = time.monotonic()
+    # Spread first runs over the first interval so workers don't start together
+    next_run = {job.name: now + job.interval * random.uniform(0.5, 1.0)
+                for job in _jobs.values() if job.interval > 0}
+    while True:
+        time.sleep(MAINTENANCE_TICK)
+        now = time.monotonic()
+        for name, due in list(next_run.items()):
+            if now >= due:
+                next_run[name] = now + _jobs[name].interval
+                try:
+                    run_job(name, scheduled=True)
+                except Exception as e:
+                    logger.error("Error running maintenance job %s: %s", name, e)
+
+
+def start_scheduler():
+    """
+    Start the scheduler once per process (checked by pid, so each forked
+    worker gets its own thread). Returns True if any job is scheduled.
+    """
+    global _scheduler_pid
+    if not any(job.interval > 0 for job in _jobs.values()):
+        return False
+    if _scheduler_pid == os.getpid():
+        return True
+    with _scheduler_lock:
+        if _scheduler_pid != os.getpid():
+            thread = threading.Thread(target=_scheduler_loop, name='maintenance-scheduler', daemon=True)
+            thread.start()
+            _scheduler_pid = os.getpid()
+    return True
+
+
+def _register_default_jobs():
+    register_job('purge_sessions', _purge_sessions, SESSION_PURGE_INTERVAL)
+    register_job('session_partitions', maintain_session_partitions, SESSION_PARTITION_INTERVAL)
+    register_job('purge_revocations', purge_expired_revocations, SESSION_PURGE_INTERVAL)
+    register_job('sweep_subscriptions', _sweep_subscriptions, SWEEP_SUBSCRIPTIONS_INTERVAL)
+
+
+_register_default_jobs()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run FeedFinder maintenance jobs once.")
+    parser.add_argument('jobs', nargs='*', help="jobs to run (default: all)")
+    parser.add_argument('--list', action='store_true', help="list jobs and their intervals")
+    parser.add_argument('--batch-size', type=int, help="rows per batch")
+    parser.add_argument('--sleep', type=float, help="seconds between batches")
+    parser.add_argument('--max-seconds', type=float, help="stop a job after this long")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for job in _jobs.values():
+            print(f"{job.name}\tevery {job.interval:g}s" if job.interval > 0 else f"{job.name}\tmanual")
+        return 0
+
+    unknown = [name for name in args.jobs if name not in _jobs]
+    if unknown:
+        print(f"Unknown job(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    kwargs = {key: value for key, value in (
+        ('batch_size', args.batch_size), ('sleep', args.sleep), ('max_seconds', args.max_seconds)
+    ) if value is not None}
+    status = 0
+    for name in args.jobs or list(_jobs):
+        report = run_job(name, **kwargs)
+        if report is None:
+            print(f"{name}: skipped (locked by another process or failed)")
+            status = 1
+        else:
+            print(f"{name}: {report}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+Metrics Module
+In-process counters, gauges and histograms rendered in the Prometheus text
+exposition format on the admin-only /api/metrics route.
+
+Recording is a dict update under a lock, so the per-request cost stays at a
+few microseconds. With several Gunicorn workers set METRICS_MULTIPROC_DIR to
+a directory shared by the workers: each process writes a snapshot file there
+every METRICS_FLUSH_INTERVAL seconds and a scrape merges all of them, so any
+worker can answer for the whole server. Counters and histograms from workers
+that have exited are kept; gauges only count live processes.
+
+When a worker exits, Gunicorn's child_exit hook (see app.serve) folds its
+counters and histograms into one metrics_dead.json and deletes its file, so
+files do not pile up. A worker that finds a file with its own pid (left by
+an earlier process that was never folded) folds it before its first write,
+so a reused pid does not overwrite another process's totals.
+"""
+
+import bisect
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+
+
+# Configuration
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR') or None  # Shared by all workers of one server
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL') or 5)  # Seconds between snapshot writes
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SNAPSHOT_PREFIX = 'metrics_'
+DEAD_SNAPSHOT = f"{SNAPSHOT_PREFIX}dead.json"  # Totals of exited workers
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+_snapshot_pid = None  # Process that has claimed its snapshot file
+
+
+class _Metric:
+    """Base class: a named family of values keyed by label values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'type': self.kind,
+                'help': self.documentation,
+                'labelnames': list(self.labelnames),
+                'values': [[list(labels), value] for labels, value in self._values.items()],
+            }
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing total."""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. work in flight."""
+
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed bucket bounds."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # [count per bucket..., +Inf bucket, sum]
+            slots = self._values.get(labels)
+            if slots is None:
+                slots = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            slots[index] += 1
+            slots[-1] += value
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        data['values'] = [[labels, list(slots)] for labels, slots in data['values']]
+        return data
+
+
+# Metrics recorded by the app
+HTTP_REQUESTS = Counter(
+    'feedfinder_http_requests_total', 'HTTP requests by route and status.',
+    ('method', 'route', 'status')
+)
+HTTP_LATENCY = Histogram(
+    'feedfinder_http_request_duration_seconds', 'HTTP request latency by route.',
+    ('method', 'route')
+)
+DB_CONNECT_SECONDS = Histogram(
+    'feedfinder_db_connect_seconds', 'Time spent waiting for a database connection.',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+DB_CONNECT_ERRORS = Counter('feedfinder_db_connect_errors_total', 'Failed database connection attempts.')
+ARGON2_IN_FLIGHT = Gauge('feedfinder_argon2_in_flight', 'Argon2 hash/verify calls currently running.')
+ARGON2_SECONDS = Histogram(
+    'feedfinder_argon2_duration_seconds', 'Argon2 hash/verify duration.', ('operation',)
+)
+UPLOAD_BYTES = Counter('feedfinder_upload_bytes_total', 'Bytes accepted by /api/upload.', ('media_type',))
+UPLOADS = Counter('feedfinder_uploads_total', 'Files accepted by /api/upload.', ('media_type',))
+CACHE_REQUESTS = Counter('feedfinder_cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+COMPRESS_SECONDS = Histogram(
+    'feedfinder_compress_cpu_seconds', 'CPU time spent compressing response bodies.', ('encoding',),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+COMPRESS_BYTES_IN = Counter('feedfinder_compress_bytes_in_total', 'Response bytes before compression.', ('encoding',))
+COMPRESS_BYTES_OUT = Counter('feedfinder_compress_bytes_out_total', 'Response bytes after compression.', ('encoding',))
+MAINTENANCE_RUNS = Counter('feedfinder_maintenance_runs_total', 'Maintenance job runs by result.', ('job', 'result'))
+MAINTENANCE_ROWS = Counter('feedfinder_maintenance_rows_total', 'Rows deleted or updated by maintenance jobs.', ('job',))
+MAIL_MESSAGES = Counter('feedfinder_mail_messages_total', 'Outbound mail by outcome.', ('result',))
+
+
+def collect():
+    """
+    Snapshot every registered metric in this process.
+    """
+    return {name: metric.snapshot() for name, metric in _registry.items()}
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f"{SNAPSHOT_PREFIX}{pid}.json")
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def write_snapshot(directory=None):
+    """
+    Write this process's metrics to the shared directory, atomically.
+    """
+    global _snapshot_pid
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    if _snapshot_pid != os.getpid():
+        # A file under our pid belongs to an earlier process
+        mark_process_dead(os.getpid(), directory)
+        _snapshot_pid = os.getpid()
+    _write_json(_snapshot_path(directory, os.getpid()), collect())
+
+
+@contextmanager
+def _directory_lock(directory):
+    # Serializes folds by the master and by starting workers
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def mark_process_dead(pid, directory=None):
+    """
+    Fold an exited process's counters and histograms into DEAD_SNAPSHOT
+    and delete its snapshot file. Its gauges are dropped.
+    """
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    path = _snapshot_path(directory, pid)
+    if not os.path.exists(path):
+        return
+    dead_path = os.path.join(directory, DEAD_SNAPSHOT)
+    with _directory_lock(directory):
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            # Died mid-write before os.replace: nothing to keep
+            snapshot = {}
+        snapshots = [(snapshot, False)]
+        try:
+            with open(dead_path, encoding='utf-8') as f:
+                snapshots.append((json.load(f), False))
+        except FileNotFoundError:
+            pass
+        _write_json(dead_path, merge(snapshots))
+        os.unlink(path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshots(directory):
+    """
+    Yield (pid, snapshot) for every other process's snapshot file, and
+    (None, snapshot) for the exited workers' totals.
+    """
+    own_pid = os.getpid()
+    for filename in os.listdir(directory):
+        if not (filename.startswith(SNAPSHOT_PREFIX) and filename.endswith('.json')):
+            continue
+        if filename == DEAD_SNAPSHOT:
+            pid = None
+        else:
+            try:
+                pid = int(filename[len(SNAPSHOT_PREFIX):-len('.json')])
+            except ValueError:
+                continue
+        if pid == own_pid:
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                yield pid, json.load(f)
+        except (OSError, ValueError):
+            # Half-written or removed between listdir and open
+            continue
+
+
+def merge(snapshots):
+    """
+    Merge (snapshot, alive) pairs into one snapshot. Counters and histograms
+    are summed; gauges are summed over live processes only.
+    """
+    merged = {}
+    for snapshot, alive in snapshots:
+        for name, data in snapshot.items():
+            if data['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, {**data, 'values': {}})
+            for labels, value in data['values']:
+                key = tuple(labels)
+                current = target['values'].get(key)
+                if current is None:
+                    target['values'][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target['values'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['values'][key] = current + value
+    for data in merged.values():
+        data['values'] = sorted(data['values'].items())
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else f"{value:.1f}"
+    return str(value)
+
+
+def render(merged):
+    """
+    Render a merged snapshot in the Prometheus text exposition format.
+    """
+    lines = []
+    for name in sorted(merged):
+        data = merged[name]
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        names = data['labelnames']
+        for labels, value in data['values']:
+            if data['type'] != 'histogram':
+                lines.append(f"{name}{_format_labels(names, labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            bounds = [str(bound) for bound in data['buckets']] + ['+Inf']
+            for bound, count in zip(bounds, value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(names, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(names, labels)} {_format_number(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(names, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_text(directory=None):
+    """
+    Text for a scrape: this process plus, in multiprocess mode, every
+    snapshot in the shared directory.
+    """
+    directory = directory or METRICS_MULTIPROC_DIR
+    snapshots = [(collect(), True)]
+    if directory:
+        write_snapshot(directory)
+        snapshots.extend(
+            (snapshot, pid is not None and _pid_alive(pid)) for pid, snapshot in _read_snapshots(directory)
+        )
+    return render(merge(snapshots))
+
+
+def _flush_loop(directory, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_snapshot(directory)
+        except OSError as e:
+            logger.error("Error writing metrics snapshot: %s", e)
+
+
+def _ensure_flusher():
+    """
+    Start the snapshot writer once per process. Checked by pid so each
+    forked worker gets its own thread.
+    """
+    global _flusher_pid
+    if not METRICS_MULTIPROC_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        thread = threading.Thread(
+            target=_flush_loop,
+            args=(METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL),
+            name='metrics-flusher',
+            daemon=True
+        )
+        thread.start()
+        _flusher_pid = os.getpid()
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else '<unmatched>'
+    HTTP_REQUESTS.inc(request.method, route, str(response.status_code))
+    HTTP_LATENCY.observe(elapsed, request.method, route)
+    _ensure_flusher()
+    return response
+
+
+def init_app(app):
+    """
+    Register the request timing hooks on a Flask app.
+    """
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
@@ -0,0 +1,319 @@
+"""
+Schema Migration Module
+Applies the ordered SQL files in backend/migrations/ and records each one in a
+schema_version table together with a checksum of its contents.
+
+Usage:
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations --dry-run  # print the plan without changing anything
+    python -m app.migrations --offline  # also apply offline migrations
+
+Migration files are named NNNN_description.sql and contain plain
+semicolon-terminated statements. CREATE INDEX statements are run online
+(ALGORITHM=INPLACE, LOCK=NONE) and skipped when the index already exists,
+so indexes added by hand before the runner existed are adopted as-is.
+
+MySQL commits DDL implicitly, so a file cannot be applied in one
+transaction. Instead, the number of statements done is committed to
+schema_version_progress after each statement, and a run that failed
+partway resumes after the last one that succeeded. A DDL statement that
+succeeded just before the process died, without its progress being
+recorded, is run again and needs fixing by hand.
+
+SET @var, PREPARE and EXECUTE leave state in the connection that a
+resumed run would not have, so progress is recorded only after the
+statement that ends such a sequence; a resumed run starts the sequence
+again.
+
+A migration with a "-- offline: <reason>" comment line locks or rebuilds
+tables for a long time. It is applied only with --offline, in a
+maintenance window; otherwise the run stops before it.
+
+A dry run only reads: it creates neither bookkeeping table, and a
+database without schema_version has nothing applied.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from app.db import get_db_connection
+
+
+MIGRATIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_([A-Za-z0-9_]+)\.sql$')
+CREATE_INDEX_RE = re.compile(
+    r'^CREATE\s+(?:UNIQUE\s+)?INDEX\s+`?(\w+)`?\s+ON\s+`?(\w+)`?',
+    re.IGNORECASE
+)
+ONLINE_DDL_CLAUSE = 'ALGORITHM=INPLACE LOCK=NONE'
+OFFLINE_RE = re.compile(r'^\s*--\s*offline:', re.IGNORECASE | re.MULTILINE)
+# Statements whose effect lives in the connection, not the database
+SESSION_STATE_RE = re.compile(r'^(?:SET\s+@|PREPARE\s|EXECUTE\s)', re.IGNORECASE)
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    execution_ms INT NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+SCHEMA_PROGRESS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version_progress (
+    version INT PRIMARY KEY,
+    checksum CHAR(64) NOT NULL,
+    statements_done INT NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
+class MigrationError(Exception):
+    """Raised when migrations cannot be applied safely."""
+
+
+class Migration:
+    """A single migration file."""
+
+    def __init__(self, version, name, path, sql):
+        self.version = version
+        self.name = name
+        self.path = path
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        self.offline = bool(OFFLINE_RE.search(sql))
+
+    @property
+    def statements(self):
+        """
+        Split the file into statements, dropping comment lines.
+        """
+        lines = [line for line in self.sql.splitlines() if not line.lstrip().startswith('--')]
+        statements = [stmt.strip() for stmt in '\n'.join(lines).split(';')]
+        return [stmt for stmt in statements if stmt]
+
+    def __repr__(self):
+        return f"<Migration {self.version:04d}_{self.name}>"
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """
+    Load migration files from a directory, ordered by version.
+    """
+    migrations = []
+    seen = set()
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in seen:
+            raise MigrationError(f"Duplicate migration version {version:04d}")
+        seen.add(version)
+        path = os.path.join(directory, filename)
+        with open(path, encoding='utf-8') as f:
+            migrations.append(Migration(version, match.group(2), path, f.read()))
+    return migrations
+
+
+def table_exists(db_query, table):
+    """
+    Check information_schema for a table in the current database.
+    """
+    db_query.execute(
+        """
+        SELECT 1 FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+        LIMIT 1
+        """,
+        (table,)
+    )
+    return db_query.fetchone() is not None
+
+
+def get_applied_migrations(db_query, dry_run=False):
+    """
+    Return {version: checksum} for migrations recorded in schema_version.
+    Creates the bookkeeping tables first, except in a dry run.
+    """
+    if dry_run:
+        if not table_exists(db_query, 'schema_version'):
+            return {}
+    else:
+        db_query.execute(SCHEMA_VERSION_DDL)
+        db_query.execute(SCHEMA_PROGRESS_DDL)
+    db_query.execute("SELECT version, checksum FROM schema_version ORDER BY version")
+    return {row[0]: row[1] for row in db_query.fetchall()}
+
+
+def get_progress(db_query, migration, dry_run=False):
+    """
+    Return how many statements of a migration an interrupted run applied.
+    """
+    if dry_run and not table_exists(db_query, 'schema_version_progress'):
+        return 0
+    db_query.execute(
+        "SELECT checksum, statements_done FROM schema_version_progress WHERE version = %s",
+        (migration.version,)
+    )
+    row = db_query.fetchone()
+    if row is None:
+        return 0
+    if row[0] != migration.checksum:
+        raise MigrationError(
+            f"{migration.version:04d}_{migration.name} was partly applied from a different "
+            f"version of the file: finish or revert it by hand, then delete its "
+            f"schema_version_progress row"
+        )
+    return row[1]
+
+
+def index_exists(db_query, table, index_name):
+    """
+    Check information_schema for an index on a table in the current database.
+    """
+    db_query.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (table, index_name)
+    )
+    return db_query.fetchone() is not None
+
+
+def plan_statement(db_query, statement):
+    """
+    Decide how to run a statement.
+    Returns (sql, note); sql is None when the statement should be skipped.
+    """
+    match = CREATE_INDEX_RE.match(statement)
+    if not match:
+        return statement, None
+
+    index_name, table = match.group(1), match.group(2)
+    if index_exists(db_query, table, index_name):
+        return None, f"index {index_name} on {table} already exists"
+
+    if 'ALGORITHM' in statement.upper():
+        return statement, None
+    return f"{statement} {ONLINE_DDL_CLAUSE}", "online"
+
+
+def get_pending_migrations(migrations, applied):
+    """
+    Verify checksums of applied migrations and return the ones still pending.
+    """
+    known = {m.version: m for m in migrations}
+    for version, checksum in applied.items():
+        migration = known.get(version)
+        if migration is None:
+            raise MigrationError(f"Database has migration {version:04d} which is missing on disk")
+        if migration.checksum != checksum:
+            raise MigrationError(
+                f"Checksum mismatch for {migration.version:04d}_{migration.name}: "
+                f"applied migrations must not be edited, add a new one instead"
+            )
+    return [m for m in migrations if m.version not in applied]
+
+
+def migrate(connection=None, directory=MIGRATIONS_DIR, dry_run=False, offline=False, out=print):
+    """
+    Apply pending migrations in order, or print the plan when dry_run is set.
+    Offline migrations are applied only when offline is set.
+    Returns the list of migrations that were (or would be) applied.
+    """
+    own_connection = connection is None
+    if own_connection:
+        connection = get_db_connection()
+        if not connection:
+            raise MigrationError("Database connection failed")
+
+    try:
+        db_query = connection.cursor()
+        migrations = load_migrations(directory)
+        applied = get_applied_migrations(db_query, dry_run)
+        pending = get_pending_migrations(migrations, applied)
+
+        if not pending:
+            out("Schema is up to date.")
+            return []
+
+        blocked = next((m for m in pending if m.offline), None) if not (dry_run or offline) else None
+        if blocked is not None:
+            pending = pending[:pending.index(blocked)]
+
+        for migration in pending:
+            out(f"{'Would apply' if dry_run else 'Applying'} {migration.version:04d}_{migration.name}"
+                f"{' (offline: needs a maintenance window)' if migration.offline else ''}")
+            started = time.monotonic()
+            done = get_progress(db_query, migration, dry_run)
+
+            for number, statement in enumerate(migration.statements, 1):
+                if number <= done:
+                    out(f"  skip: statement {number} applied by an interrupted run")
+                    continue
+                sql, note = plan_statement(db_query, statement)
+                if sql is None:
+                    out(f"  skip: {note}")
+                else:
+                    out(f"  {'plan' if dry_run else 'run'}{f' ({note})' if note else ''}: {' '.join(sql.split())}")
+                if dry_run:
+                    continue
+                if sql is not None:
+                    db_query.execute(sql)
+                if SESSION_STATE_RE.match(statement):
+                    continue
+                # Committed with the statement where it is not DDL
+                db_query.execute(
+                    "INSERT INTO schema_version_progress (version, checksum, statements_done) VALUES (%s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE statements_done = VALUES(statements_done)",
+                    (migration.version, migration.checksum, number)
+                )
+                connection.commit()
+
+            if not dry_run:
+                execution_ms = int((time.monotonic() - started) * 1000)
+                db_query.execute(
+                    "INSERT INTO schema_version (version, name, checksum, execution_ms) VALUES (%s, %s, %s, %s)",
+                    (migration.version, migration.name, migration.checksum, execution_ms)
+                )
+                db_query.execute("DELETE FROM schema_version_progress WHERE version = %s", (migration.version,))
+                connection.commit()
+
+        db_query.close()
+        if blocked is not None:
+            raise MigrationError(
+                f"{blocked.version:04d}_{blocked.name} is an offline migration: it locks tables "
+                f"while it runs. Apply it in a maintenance window with --offline"
+            )
+        return pending
+
+    finally:
+        if own_connection:
+            connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply FeedFinder schema migrations.")
+    parser.add_argument('--dry-run', action='store_true', help="print the migration plan without applying it")
+    parser.add_argument('--offline', action='store_true', help="also apply migrations that lock tables")
+    parser.add_argument('--dir', default=MIGRATIONS_DIR, help="directory containing NNNN_name.sql files")
+    args = parser.parse_args(argv)
+
+    try:
+        migrate(directory=args.dir, dry_run=args.dry_run, offline=args.offline)
+    except MigrationError as e:
+        print(f"Migration failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+Request Profiler Module
+Profiles a single request on demand so admins can see where a slow endpoint
+spends its time in production.
+
+Send the X-Profile: 1 header with an admin session. The request runs under a
+deterministic profiler (sys.setprofile on the request thread only), and the
+response carries X-Profile-Id plus a Server-Timing entry per category.
+Time is split into DB, JWT, Argon2, JSON and other. The profile is stored
+under PROFILE_DIR and can be downloaded from /api/admin/profiles/<id> as
+collapsed stacks (flamegraph.pl, speedscope) or speedscope JSON.
+
+Requests without the header pay for one header lookup.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from flask import g, request
+from app.auth_middleware import require_auth, require_admin
+
+
+# Configuration
+PROFILE_HEADER = 'X-Profile'
+PROFILE_DIR = os.getenv('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'feedfinder-profiles')
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES') or 50)  # Oldest profiles are deleted beyond this
+
+# Category -> module prefixes; the innermost matching frame decides
+CATEGORIES = (
+    ('db', ('mysql', '_mysql_connector', 'app.db')),
+    ('jwt', ('jwt',)),
+    ('argon2', ('argon2', '_argon2_cffi_bindings')),
+    ('json', ('json', 'flask.json', 'orjson')),
+)
+OTHER = 'other'
+
+_PROFILE_ID_LEN = 32
+
+
+def frame_label(frame):
+    """
+    Flamegraph label for a Python frame: module:function.
+    """
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def c_function_label(function):
+    module = getattr(function, '__module__', None) or 'builtins'
+    return f"{module}:{getattr(function, '__qualname__', repr(function))}"
+
+
+class RequestProfiler:
+    """
+    Deterministic profiler for the current thread. Self time is charged to
+    the full stack at every call/return event.
+    """
+
+    def __init__(self):
+        self.stacks = {}
+        self._stack = []
+        self._last = None
+        self.started = None
+        self.duration = 0.0
+
+    def _trace(self, frame, event, arg):
+        now = time.perf_counter()
+        if self._stack:
+            key = tuple(self._stack)
+            self.stacks[key] = self.stacks.get(key, 0.0) + (now - self._last)
+        if event in ('call', 'c_call'):
+            self._stack.append(c_function_label(arg) if event == 'c_call' else frame_label(frame))
+        elif self._stack:
+            self._stack.pop()
+        self._last = time.perf_counter()
+
+    def start(self):
+        self.started = self._last = time.perf_counter()
+        sys.setprofile(self._trace)
+
+    def stop(self):
+        sys.setprofile(None)
+        self.duration = time.perf_counter() - self.started
+
+    def collapsed(self):
+        """
+        Collapsed stacks, one 'frame;frame;frame microseconds' line each.
+        """
+        return [
+            f"{';'.join(stack)} {max(int(seconds * 1_000_000), 1)}"
+            for stack, seconds in sorted(self.stacks.items())
+        ]
+
+    def categories(self):
+        """
+        Seconds per category.
+        """
+        totals = {name: 0.0 for name, _ in CATEGORIES}
+        totals[OTHER] = 0.0
+        for stack, seconds in self.stacks.items():
+            totals[categorize(stack)] += seconds
+        return totals
+
+
+def categorize(stack):
+    """
+    Category of a stack, decided by its innermost frame from a known module.
+    """
+    for label in reversed(stack):
+        module = label.split(':', 1)[0]
+        for name, prefixes in CATEGORIES:
+            if any(module == prefix or module.startswith(prefix + '.') for prefix in prefixes):
+                return name
+    return OTHER
+
+
+def to_speedscope(profile):
+    """
+    Convert a stored profile to speedscope's sampled-profile JSON.
+    """
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for line in profile['collapsed']:
+        stack, weight = line.rsplit(' ', 1)
+        sample = []
+        for name in stack.split(';'):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({'name': name})
+            sample.append(index[name])
+        samples.append(sample)
+        weights.append(int(weight))
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': f"{profile['method']} {profile['path']}",
+            'unit': 'microseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+        'name': profile['id'],
+        'exporter': 'feedfinder',
+    }
+
+
+def _profile_path(profile_id, directory=None):
+    return os.path.join(directory or PROFILE_DIR, f"{profile_id}.json")
+
+
+def save_profile(profile, directory=None):
+    """
+    Write a profile and delete the oldest ones beyond PROFILE_MAX_FILES.
+    """
+    directory = directory or PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(_profile_path(profile['id'], directory), 'w', encoding='utf-8') as f:
+        json.dump(profile, f)
+
+    stored = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in stored[:-PROFILE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def load_profile(profile_id, directory=None):
+    """
+    Load a stored profile, or None if it does not exist.
+    """
+    if len(profile_id) != _PROFILE_ID_LEN or not profile_id.isalnum():
+        return None
+    try:
+        with open(_profile_path(profile_id, directory), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_profiles(directory=None):
+    """
+    Summaries of stored profiles, newest first.
+    """
+    directory = directory or PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    summaries = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith('.json'):
+            continue
+        profile = load_profile(entry.name[:-len('.json')], directory)
+        if profile:
+            profile.pop('collapsed', None)
+            summaries.append(profile)
+    return sorted(summaries, key=lambda p: p['created_at'], reverse=True)
+
+
+def _admin_allowed():
+    # The decorators return an error response when access is denied, None otherwise
+    return require_auth(require_admin(lambda: None))() is None
+
+
+def _start_profile():
+    if not request.headers.get(PROFILE_HEADER):
+        return
+    if not _admin_allowed():
+        return
+    profiler = RequestProfiler()
+    g.request_profiler = profiler
+    profiler.start()
+
+
+def _finish_profile(response):
+    profiler = g.pop('request_profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+
+    categories = profiler.categories()
+    profile = {
+        'id': uuid.uuid4().hex,
+        'created_at': time.time(),
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(profiler.duration * 1000, 3),
+        'categories_ms': {name: round(seconds * 1000, 3) for name, seconds in categories.items()},
+        'collapsed': profiler.collapsed(),
+    }
+    save_profile(profile)
+
+    response.headers['X-Profile-Id'] = profile['id']
+    timings = [f"prof-{name};dur={ms}" for name, ms in profile['categories_ms'].items()]
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = ', '.join(([existing] if existing else []) + timings)
+    return response
+
+
+def _abandon_profile(exc):
+    # Unhandled errors can skip after_request; never leave the tracer installed
+    if g.pop('request_profiler', None) is not None:
+        sys.setprofile(None)
+
+
+def init_app(app):
+    """
+    Register the profiling hooks on a Flask app.
+    """
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abandon_profile)
@@ -0,0 +1,152 @@
+"""
+Queries Module
+SQL for the hot route queries.
+
+Routes execute these constants rather than inline strings, and
+tests/test_query_plans.py runs EXPLAIN on the same constants, so a query
+changed here is plan-checked as it ships.
+"""
+
+# --- Users ---
+USER_BY_NAME = "SELECT * FROM user WHERE user_name=%s"
+
+USER_BY_NAME_OR_EMAIL = "SELECT * FROM user WHERE user_name=%s OR user_email=%s"
+
+USER_BY_ID = "SELECT * FROM user WHERE user_id=%s"
+
+USER_ROLE_BY_ID = "SELECT user_role FROM user WHERE user_id = %s"
+
+USER_ID_BY_EMAIL = "SELECT user_id FROM user WHERE user_email=%s"
+
+SET_USER_ROLE = "UPDATE user SET user_role = %s WHERE user_id = %s"
+
+# --- Profiles ---
+PROFILE_BY_ID = "SELECT user_id, user_name, user_email, bio, profile_picture, is_private FROM user WHERE user_id=%s"
+
+# user_email uses a case-insensitive collation, so a plain equality matches
+# regardless of case and can use the email_unique_user index
+PROFILE_BY_EMAIL = (
+    "SELECT user_id, user_name, user_email, bio, profile_picture, is_private "
+    "FROM `user` WHERE user_email=%s"
+)
+
+PROFILE_EMAIL_TAKEN = "SELECT user_id FROM user WHERE user_email=%s AND user_id != %s"
+
+# Locks the row, so a change can be compared against it until the commit
+PROFILE_PRIVACY_FOR_UPDATE = "SELECT is_private FROM user WHERE user_id = %s FOR UPDATE"
+
+# --- Profile stats ---
+STATS_POST_COUNT = "SELECT COUNT(*) as count FROM post WHERE user_id = %s"
+
+STATS_TOTAL_LIKES = """
+    SELECT COUNT(*) as count
+    FROM post_like pl
+    JOIN post p ON pl.post_id = p.post_id
+    WHERE p.user_id = %s
+"""
+
+STATS_TOTAL_COMMENTS = """
+    SELECT COUNT(*) as count
+    FROM comment c
+    JOIN post p ON c.post_id = p.post_id
+    WHERE p.user_id = %s
+"""
+
+STATS_RATINGS = """
+    SELECT
+        COUNT(*) as count,
+        AVG(rating_value) as average
+    FROM rating
+    WHERE user_id = %s
+"""
+
+# Users who have this user as a friend
+STATS_FOLLOWERS = "SELECT COUNT(*) as count FROM friends WHERE friend_user_id = %s"
+
+# Users this user has as friends
+STATS_FOLLOWING = "SELECT COUNT(*) as count FROM friends WHERE user_id = %s"
+
+# --- Posts ---
+_CREATOR_POST_COLUMNS = """
+    SELECT
+        p.post_id,
+        p.content_text,
+        p.media_url,
+        p.privacy,
+        p.created_at,
+        (SELECT COUNT(*) FROM post_like pl WHERE pl.post_id = p.post_id) as like_count
+    FROM post p
+"""
+
+# Params: (creator_id,)
+CREATOR_POSTS_OWN = _CREATOR_POST_COLUMNS + """
+    WHERE p.user_id = %s
+    ORDER BY p.created_at DESC
+"""
+
+# Params: (creator_id, viewer_id, creator_id, creator_id, viewer_id, is_subscriber)
+CREATOR_POSTS_VIEWER = _CREATOR_POST_COLUMNS + """
+    WHERE p.user_id = %s
+      AND (
+        p.privacy = 'public'
+        OR (p.privacy = 'friends' AND EXISTS (
+            SELECT 1 FROM friends f
+            WHERE (f.user_id = %s AND f.friend_user_id = %s)
+               OR (f.user_id = %s AND f.friend_user_id = %s)
+        ))
+        OR (p.privacy = 'exclusive' AND %s)
+      )
+    ORDER BY p.created_at DESC
+"""
+
+# Params: (creator_id,)
+CREATOR_POSTS_PUBLIC = _CREATOR_POST_COLUMNS + """
+    WHERE p.user_id = %s AND p.privacy = 'public'
+    ORDER BY p.created_at DESC
+"""
+
+USER_POSTS = "SELECT post_id, content_text, media_url, privacy, created_at FROM post WHERE user_id=%s ORDER BY created_at DESC"
+
+_FEED_COLUMNS = """
+    SELECT
+      p.post_id,
+      p.user_id,
+      p.content_text,
+      p.media_url,
+      p.media_type,
+      p.privacy,
+      p.created_at,
+      u.user_name,
+      u.user_email
+    FROM post p
+    JOIN user u ON u.user_id = p.user_id
+"""
+
+# Params: (limit,)
+PUBLIC_FEED = _FEED_COLUMNS + """
+    WHERE p.privacy = 'public'
+    ORDER BY p.created_at DESC, p.post_id DESC
+    LIMIT %s
+"""
+
+# Params: (pattern, limit)
+SEARCH_POSTS = _FEED_COLUMNS + """
+    WHERE p.privacy = 'public'
+      AND p.content_text LIKE %s
+    ORDER BY p.created_at DESC, p.post_id DESC
+    LIMIT %s
+"""
+
+# Params: (limit,)
+ADMIN_ALL_POSTS = _FEED_COLUMNS + """
+    ORDER BY p.created_at DESC, p.post_id DESC
+    LIMIT %s
+"""
+
+POST_OWNER = "SELECT post_id, user_id FROM post WHERE post_id = %s"
+
+# --- Ratings ---
+RATING_BY_EMAIL = (
+    "SELECT ROUND(AVG(rating_value),2) avg, COUNT(*) cnt FROM rating r "
+    "JOIN user u ON r.rated_user_id=u.user_id WHERE u.user_email=%s"
+)
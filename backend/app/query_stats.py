@@ -0,0 +1,232 @@
+"""
+Query Statistics Module
+Counts database connections, statements, time spent in the database and rows
+fetched for each request, by wrapping the connections handed out by
+get_db_connection.
+
+Outside production the totals are returned to the client:
+    Server-Timing: db;dur=12.4;desc="6 queries, 6 rows"
+    X-DB-Queries: 6
+
+A warning is logged when the same statement shape runs more than
+QUERY_REPEAT_THRESHOLD times in one request, which is usually an N+1 loop.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, has_request_context, current_app, request
+from app.tracing import start_span, KIND_CLIENT
+
+
+# Configuration
+QUERY_STATS_HEADERS = os.getenv('FLASK_ENV') != 'production'  # Emit Server-Timing/X-DB-Queries headers
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD') or 5)  # Same shape more than this many times warns
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s|\?')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+# Stats objects collecting outside a request, see track()
+_trackers = threading.local()
+
+
+class QueryStats:
+    """Totals for one request (or one track() block)."""
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.rows = 0
+        self.db_time = 0.0  # seconds
+        self.shapes = Counter()
+
+    def repeated_shapes(self, threshold=None):
+        """
+        Return [(shape, count)] for statements run more than threshold times.
+        """
+        threshold = QUERY_REPEAT_THRESHOLD if threshold is None else threshold
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+def statement_shape(sql):
+    """
+    Reduce a statement to its shape: literals and placeholders become ?,
+    IN lists collapse to a single entry and whitespace is normalised.
+    """
+    shape = _STRING_LITERAL_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _PLACEHOLDER_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('IN (?)', shape)
+    return ' '.join(shape.split())
+
+
+def _active_stats():
+    stats = []
+    if has_request_context():
+        # Created lazily so queries from before_request hooks registered earlier are counted too
+        if 'query_stats' not in g:
+            g.query_stats = QueryStats()
+        stats.append(g.query_stats)
+    stats.extend(getattr(_trackers, 'stack', ()))
+    return stats
+
+
+def record_connection():
+    for stats in _active_stats():
+        stats.connections += 1
+
+
+def record_query(sql, elapsed):
+    shape = statement_shape(sql) if isinstance(sql, str) else str(sql)
+    for stats in _active_stats():
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.shapes[shape] += 1
+    return shape
+
+
+def record_rows(count):
+    if count:
+        for stats in _active_stats():
+            stats.rows += count
+
+
+@contextmanager
+def track():
+    """
+    Collect query statistics for a block of code on the current thread,
+    e.g. a test or a CLI job:
+
+        with track() as stats:
+            client.get('/api/posts/public')
+        assert stats.queries <= 2
+    """
+    stats = QueryStats()
+    stack = getattr(_trackers, 'stack', None)
+    if stack is None:
+        stack = _trackers.stack = []
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times statements and counts fetched rows."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._span = None  # Span of the last statement, so fetched rows can be added to it
+
+    def _run(self, method, operation, *args, **kwargs):
+        span = start_span('db.query', KIND_CLIENT)
+        started = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        except Exception as e:
+            if span:
+                span.fail(e)
+            raise
+        finally:
+            shape = record_query(operation, time.perf_counter() - started)
+            if span:
+                span.set('db.system', 'mysql')
+                span.set('db.statement', shape)
+                rowcount = getattr(self._cursor, 'rowcount', -1)
+                if isinstance(rowcount, int) and rowcount >= 0:
+                    span.set('db.rows_affected', rowcount)
+                span.end()
+            self._span = span
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._run(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._run(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def _fetched(self, count):
+        record_rows(count)
+        if self._span and count:
+            self._span.add('db.rows', count)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._fetched(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(_row_count(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._fetched(_row_count(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._fetched(1)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection wrapper whose cursors are instrumented."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def _row_count(rows):
+    try:
+        return len(rows)
+    except TypeError:
+        return 0
+
+
+def instrument_connection(connection):
+    """
+    Wrap a new database connection and count it against the current request.
+    """
+    record_connection()
+    return InstrumentedConnection(connection)
+
+
+def _finish_request(response):
+    stats = g.pop('query_stats', None) or QueryStats()
+    threshold = current_app.config.get('QUERY_REPEAT_THRESHOLD', QUERY_REPEAT_THRESHOLD)
+    for shape, count in stats.repeated_shapes(threshold):
+        current_app.logger.warning(
+            "Possible N+1: statement ran %d times in %s %s: %s",
+            count, request.method, request.path, shape[:200]
+        )
+
+    if current_app.config.get('QUERY_STATS_HEADERS', QUERY_STATS_HEADERS):
+        timing = f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows"'
+        existing = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f"{existing}, {timing}" if existing else timing
+        response.headers['X-DB-Queries'] = str(stats.queries)
+    return response
+
+
+def init_app(app):
+    """
+    Register the per-request reporting hook on a Flask app.
+    """
+    app.after_request(_finish_request)
@@ -0,0 +1,167 @@
+"""
+RESP Client Module
+Minimal client for servers that speak the Redis protocol (RESP2): Redis,
+Valkey, KeyDB, Dragonfly.
+
+Commands are sent as arrays of bulk strings. Replies are decoded as UTF-8
+text, and integers and arrays come back as Python ints and lists. Each
+thread keeps its own connection, opened on first use and reopened after a
+network error.
+
+    client = RespClient.from_url('redis://localhost:6379/0')
+    client.execute('HSET', 'key', 'field', 'value')
+    client.pipeline([('HGET', 'key', 'field'), ('TTL', 'key')])
+    client.transaction([('DEL', 'a'), ('SREM', 'b', 'a')])
+"""
+
+import socket
+import threading
+from urllib.parse import unquote, urlparse
+
+
+class RespError(Exception):
+    """An error reply from the server."""
+
+
+class RespClient:
+    """Thread-safe RESP2 client with one connection per thread."""
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url, timeout=2.0):
+        """
+        Build a client from redis://[:password@]host[:port][/db].
+        """
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Unsupported URL scheme: {parsed.scheme!r}")
+        db = parsed.path.lstrip('/')
+        return cls(
+            host=parsed.hostname or 'localhost',
+            port=parsed.port or 6379,
+            db=int(db) if db else 0,
+            password=unquote(parsed.password) if parsed.password else None,
+            timeout=timeout
+        )
+
+    def execute(self, *args):
+        """
+        Run one command and return its reply. Raises RespError on an error reply.
+        """
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def pipeline(self, commands):
+        """
+        Send several commands in one round trip. Returns their replies in
+        order; error replies are returned as RespError instances.
+        """
+        if not commands:
+            return []
+        conn = self._connection()
+        try:
+            conn.sendall(b''.join(encode_command(command) for command in commands))
+            return [read_reply(self._local.reader) for _ in commands]
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+
+    def transaction(self, commands):
+        """
+        Run commands atomically with MULTI/EXEC and return their replies.
+        """
+        replies = self.pipeline([('MULTI',), *commands, ('EXEC',)])
+        for reply in replies[:-1]:
+            if isinstance(reply, RespError):
+                raise reply
+        result = replies[-1]
+        if isinstance(result, RespError):
+            raise result
+        return result
+
+    def close(self):
+        """
+        Close this thread's connection.
+        """
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        self._local.reader = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.conn = conn
+        self._local.reader = conn.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        for reply in self.pipeline(setup):
+            if isinstance(reply, RespError):
+                self.close()
+                raise reply
+        return conn
+
+
+def encode_command(args):
+    """
+    Encode a command as a RESP array of bulk strings.
+    """
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode('utf-8')
+        else:
+            data = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+def read_reply(reader):
+    """
+    Read one reply from a binary file object.
+    """
+    line = reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError("Connection closed by server")
+    kind, body = line[:1], line[1:-2]
+    if kind == b'+':
+        return body.decode('utf-8')
+    if kind == b'-':
+        return RespError(body.decode('utf-8'))
+    if kind == b':':
+        return int(body)
+    if kind == b'$':
+        length = int(body)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("Connection closed by server")
+        return data[:-2].decode('utf-8')
+    if kind == b'*':
+        count = int(body)
+        if count < 0:
+            return None
+        return [read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f"Unexpected reply type {kind!r}")
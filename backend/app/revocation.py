@@ -0,0 +1,238 @@
+"""
+Revocation Module
+In-memory set of revoked session ids, used to validate access tokens
+without a database read when STATELESS_ACCESS_TOKENS=1.
+
+invalidate_session() writes one session_revocation row per session it
+deactivates. A background thread in each worker loads the unexpired rows
+once, then polls every REVOCATION_POLL_INTERVAL seconds for rows above the
+highest revocation_id it has seen (the watermark). Each poll re-reads the
+last REVOCATION_POLL_OVERLAP ids, so rows committed out of id order are not
+missed. An access token can be issued until the session expires and lasts
+SESSION_TOKEN_EXPIRY, so a revocation is kept until that long after the
+session's expiry (the row's expires_at) and then dropped; the set holds
+only revocations that can still reject a token.
+
+expires_at holds naive UTC, like the sessions table, and is read as UTC
+both here and in the database (against 1970-01-01 and UTC_TIMESTAMP()),
+whatever the server's time zone.
+
+The set is exact (a dict), not a bloom filter: revocations are rare
+(logouts) and short-lived (tokens last SESSION_TOKEN_EXPIRY), so it stays
+small.
+
+If the set has not synced within REVOCATION_MAX_STALENESS seconds (at
+startup, or while the database is unreachable), is_revoked() returns None
+and callers fall back to the sessions table.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import timezone
+from app.db import get_db_connection
+
+
+# Configuration
+STATELESS_ACCESS_TOKENS = os.getenv('STATELESS_ACCESS_TOKENS') == '1'  # Trust access tokens until exp unless revoked
+REVOCATION_POLL_INTERVAL = float(os.getenv('REVOCATION_POLL_INTERVAL') or 2)  # Seconds between polls
+REVOCATION_MAX_STALENESS = float(os.getenv('REVOCATION_MAX_STALENESS') or 30)  # Older than this, check the DB instead
+REVOCATION_POLL_OVERLAP = 100  # Ids below the watermark re-read each poll
+REVOCATION_POLL_BATCH = 1000
+
+logger = logging.getLogger(__name__)
+
+_poller_pid = None
+_poller_lock = threading.Lock()
+
+# Naive UTC DATETIME -> epoch seconds, without the session time zone
+_EPOCH_SQL = "TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', expires_at)"
+
+# Unordered: apply() keeps the highest id and expiry whatever the order,
+# so the range on idx_revocation_expires needs no sort
+LOAD_SQL = (
+    f"SELECT revocation_id, session_id, {_EPOCH_SQL} FROM session_revocation "
+    "WHERE expires_at > UTC_TIMESTAMP()"
+)
+
+POLL_SQL = (
+    f"SELECT revocation_id, session_id, {_EPOCH_SQL} FROM session_revocation "
+    "WHERE revocation_id > %s ORDER BY revocation_id LIMIT %s"
+)
+
+
+class RevocationSet:
+    """Revoked session ids with their expiry, synced from session_revocation."""
+
+    def __init__(self):
+        self._revoked = {}  # session_id -> session expiry (unix time)
+        self._lock = threading.Lock()
+        self.watermark = None  # Highest revocation_id applied; None until the first load
+        self.synced_at = None  # time.monotonic() of the last successful sync
+
+    def add(self, session_id, expires_at):
+        with self._lock:
+            self._revoked[session_id] = max(expires_at, self._revoked.get(session_id, 0))
+
+    def __contains__(self, session_id):
+        return session_id in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def prune(self, now=None):
+        """
+        Forget revocations that no unexpired access token can be rejected by.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [session_id for session_id, expires_at in self._revoked.items() if expires_at <= now]
+            for session_id in expired:
+                del self._revoked[session_id]
+        return len(expired)
+
+    def apply(self, rows):
+        """
+        Add (revocation_id, session_id, expires_at) rows and advance the watermark.
+        """
+        for revocation_id, session_id, expires_at in rows:
+            self.add(session_id, float(expires_at))
+            if self.watermark is None or revocation_id > self.watermark:
+                self.watermark = revocation_id
+
+    def is_fresh(self, max_staleness=None):
+        max_staleness = REVOCATION_MAX_STALENESS if max_staleness is None else max_staleness
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= max_staleness
+
+    def sync(self):
+        """
+        Load or poll revocation rows. Returns the number of rows read, or
+        None if the database could not be reached.
+        """
+        connection = get_db_connection()
+        if connection is None:
+            return None
+        try:
+            db_query = connection.cursor()
+            read = 0
+            if self.watermark is None:
+                db_query.execute(LOAD_SQL)
+                rows = db_query.fetchall()
+                self.apply(rows)
+                self.watermark = self.watermark or 0
+                read = len(rows)
+            else:
+                after = max(0, self.watermark - REVOCATION_POLL_OVERLAP)
+                while True:
+                    db_query.execute(POLL_SQL, (after, REVOCATION_POLL_BATCH))
+                    rows = db_query.fetchall()
+                    self.apply(rows)
+                    read += len(rows)
+                    if len(rows) < REVOCATION_POLL_BATCH:
+                        break
+                    after = rows[-1][0]
+            db_query.close()
+            self.prune()
+            self.synced_at = time.monotonic()
+            return read
+        finally:
+            connection.close()
+
+
+# The worker's set
+revoked_sessions = RevocationSet()
+
+
+def retained_until(expires_at):
+    """
+    When a revocation of a session expiring at expires_at (naive UTC) can
+    be forgotten: once the last access token issued for it has expired.
+    """
+    from app.session_manager import SESSION_TOKEN_EXPIRY
+    return expires_at + SESSION_TOKEN_EXPIRY
+
+
+def record_revocations(db_query, sessions):
+    """
+    Insert revocation rows for [(session_id, expires_at)] using the caller's
+    cursor, so they commit together with the session update.
+    """
+    if not sessions:
+        return
+    db_query.executemany(
+        "INSERT INTO session_revocation (session_id, expires_at) VALUES (%s, %s)",
+        [(session_id, retained_until(expires_at)) for session_id, expires_at in sessions]
+    )
+
+
+def publish_revocations(sessions):
+    """
+    Insert revocation rows in their own transaction, for session stores
+    other than MySQL.
+    """
+    connection = get_db_connection()
+    if connection is None:
+        raise ConnectionError("Database connection failed")
+    try:
+        db_query = connection.cursor()
+        record_revocations(db_query, sessions)
+        connection.commit()
+        db_query.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def note_revoked(sessions):
+    """
+    Apply committed revocations to this worker's set right away, without
+    waiting for the next poll.
+    """
+    for session_id, expires_at in sessions:
+        # sessions.expires_at holds naive UTC datetimes
+        revoked_sessions.add(session_id, retained_until(expires_at).replace(tzinfo=timezone.utc).timestamp())
+
+
+def is_revoked(session_id):
+    """
+    True or False from the in-memory set, or None when the set is too
+    stale to trust and the caller should check the sessions table.
+    """
+    _ensure_poller()
+    if not revoked_sessions.is_fresh():
+        return None
+    return session_id in revoked_sessions
+
+
+def _poll_loop(interval):
+    while True:
+        try:
+            revoked_sessions.sync()
+        except Exception as e:
+            logger.error("Error polling session revocations: %s", e)
+        time.sleep(interval)
+
+
+def _ensure_poller():
+    """
+    Start the poller once per process. Checked by pid so each forked
+    worker gets its own thread.
+    """
+    global _poller_pid
+    if _poller_pid == os.getpid():
+        return
+    with _poller_lock:
+        if _poller_pid == os.getpid():
+            return
+        thread = threading.Thread(
+            target=_poll_loop,
+            args=(REVOCATION_POLL_INTERVAL,),
+            name='revocation-poller',
+            daemon=True
+        )
+        thread.start()
+        _poller_pid = os.getpid()
+
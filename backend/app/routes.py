@@ -1,10 +1,14 @@
-from app import app
-from flask import render_template, request, redirect, url_for, flash, session, jsonify, make_response, send_from_directory
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify, make_response, send_from_directory
 from app.hash import hash_password, verify_password
 from app.db import get_db_connection
 from app.session_manager import create_session, invalidate_session, refresh_access_token, verify_refresh_token, verify_session_token, cleanup_expired_sessions
 from app.auth_middleware import require_auth, optional_auth, set_auth_cookies, clear_auth_cookies, get_token_from_request, require_admin
 from app.csrf import generate_csrf_token, require_csrf
+from app.subscriptions import has_active_subscription
+from app import queries, user_directory
+from app.metrics import UPLOAD_BYTES, UPLOADS, CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics_text
+from app.profiler import list_profiles, load_profile, to_speedscope
+from app.sampler import recent_stacks, collapsed_text, SAMPLER_RETENTION_MINUTES
 import re, os
 from itsdangerous import URLSafeTimedSerializer
 from app.two_factor import initiate_2fa, verify_2fa_code
@@ -14,13 +18,17 @@ import uuid
 import logging
 import html
 
+logger = logging.getLogger(__name__)
 
-@app.route('/')
-@app.route('/index')
+bp = Blueprint('main', __name__)
+
+
+@bp.route('/')
+@bp.route('/index')
 def index():
     return "Hello, World!"
 
-@app.route('/api/health', methods=['GET'])
+@bp.route('/api/health', methods=['GET'])
 def api_health():
     """Health check endpoint to verify API is accessible"""
     return jsonify({
@@ -29,7 +37,7 @@ def api_health():
     }), 200
 
 # The new route for the page
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     result = None
     if request.method == 'POST':
@@ -61,7 +69,7 @@ def login():
         
         try:
             db_query = connection.cursor(dictionary=True)
-            db_query.execute("SELECT * FROM user WHERE user_name=%s", (username,))
+            db_query.execute(queries.USER_BY_NAME, (username,))
             user = db_query.fetchone()
 
             if user is None:
@@ -81,14 +89,14 @@ def login():
                 initiate_2fa(user['user_email'])
                 session['pending_user'] = user['user_name']
                 flash("A 2FA code has been sent to your email. Please enter it below.", "info")
-                return redirect(url_for('verify_2fa'))
+                return redirect(url_for('.verify_2fa'))
 
             else:
                 flash("Incorrect password.", "danger")
                 return render_template('login.html')
 
         except Exception as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             flash("An error occurred during login.", "danger")
             return render_template('login.html')
 
@@ -102,7 +110,7 @@ def login():
     # Render the template and pass the result (if any)
     return render_template('login.html', result=result)
 
-@app.route('/api/login', methods=['POST', 'OPTIONS'])
+@bp.route('/api/login', methods=['POST', 'OPTIONS'])
 def api_login():
     """
     Login endpoint with session token creation.
@@ -138,7 +146,7 @@ def api_login():
 
     try:
         db_query = connection.cursor(dictionary=True)
-        db_query.execute("SELECT * FROM user WHERE user_name=%s", (username,))
+        db_query.execute(queries.USER_BY_NAME, (username,))
         user = db_query.fetchone()
         db_query.close()
         connection.close()
@@ -210,7 +218,7 @@ def api_login():
         return response, 200
 
     except Exception as e:
-        print(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         if connection:
             connection.close()
         return jsonify({
@@ -279,7 +287,7 @@ def api_login():
 #     return render_template('verify_2fa.html')
 
 
-@app.route('/api/logout', methods=['POST', 'OPTIONS'])
+@bp.route('/api/logout', methods=['POST', 'OPTIONS'])
 def api_logout():
     """
     Logout endpoint that invalidates the current session.
@@ -322,14 +330,14 @@ def api_logout():
         return response, 200
         
     except Exception as e:
-        print(f"Logout error: {e}")
+        logger.error("Logout error: %s", e)
         return jsonify({
             "success": False,
             "message": "An error occurred during logout"
         }), 500
 
 
-@app.route('/api/refresh', methods=['POST'])
+@bp.route('/api/refresh', methods=['POST'])
 def api_refresh():
     """
     Refresh access token using refresh token.
@@ -343,7 +351,7 @@ def api_refresh():
             "error": "NO_REFRESH_TOKEN"
         }), 401
     
-    access_token, _, error = refresh_access_token(refresh_token)
+    access_token, new_refresh_token, error = refresh_access_token(refresh_token)
     
     if not access_token:
         response = make_response(jsonify({
@@ -360,6 +368,10 @@ def api_refresh():
         "message": "Token refreshed successfully"
     }))
     
+    if new_refresh_token:
+        # Rotation: the old refresh token is spent
+        return set_auth_cookies(response, access_token, new_refresh_token), 200
+    
     # Set new access token cookie (keep refresh token)
     response.set_cookie(
         'access_token',
@@ -374,7 +386,7 @@ def api_refresh():
     return response, 200
 
 
-@app.route('/api/csrf-token', methods=['GET', 'OPTIONS'])
+@bp.route('/api/csrf-token', methods=['GET', 'OPTIONS'])
 def api_csrf_token():
     """
     Get CSRF token for forms.
@@ -387,18 +399,18 @@ def api_csrf_token():
             "csrf_token": token
         }), 200
     except Exception as e:
-        print(f"Error generating CSRF token: {e}")
+        logger.error("Error generating CSRF token: %s", e)
         return jsonify({
             "success": False,
             "message": "Failed to generate CSRF token"
         }), 500
 
 
-@app.route('/api/verify-session', methods=['GET', 'OPTIONS'])
+@bp.route('/api/verify-session', methods=['GET', 'OPTIONS'])
 def api_verify_session():
     """
     Verify if current session is valid.
-    Returns user information with role fetched from database.
+    Returns user information with role from the user directory.
     """
     if request.method == 'OPTIONS':
         return '', 200
@@ -423,22 +435,9 @@ def api_verify_session():
     # Get user_id from token
     user_id = payload.get('user_id')
     
-    # Fetch user role from database (always up-to-date)
-    connection = get_db_connection()
-    if connection is None:
-        return jsonify({
-            'success': False,
-            'message': 'Database connection failed',
-            'error': 'DB_ERROR'
-        }), 500
-    
+    # Fetch user role from the user directory (not the token)
     try:
-        db_query = connection.cursor(dictionary=True)
-        db_query.execute("SELECT user_role FROM user WHERE user_id = %s", (user_id,))
-        user = db_query.fetchone()
-        db_query.close()
-        connection.close()
-        
+        user = user_directory.get_user(user_id)
         user_role = user.get('user_role') if user else None
         
         return jsonify({
@@ -446,13 +445,11 @@ def api_verify_session():
             "user": {
                 "id": user_id,
                 "username": payload.get('username'),
-                "role": user_role  # From database, not token
+                "role": user_role  # From the user table, not token
             }
         }), 200
     except Exception as e:
-        print(f"Error fetching user role in verify-session: {e}")
-        if connection:
-            connection.close()
+        logger.error("Error fetching user role in verify-session: %s", e)
         return jsonify({
             'success': False,
             'message': 'Error verifying session',
@@ -460,7 +457,7 @@ def api_verify_session():
         }), 500
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -505,7 +502,7 @@ def register():
             db_query = connection.cursor()
 
             # Check if username or email already exists
-            db_query.execute("SELECT * FROM user WHERE user_name=%s OR user_email=%s", (username, email))
+            db_query.execute(queries.USER_BY_NAME_OR_EMAIL, (username, email))
             existing_user = db_query.fetchone()
 
             if existing_user:
@@ -519,7 +516,7 @@ def register():
             flash("Account created successfully!", "success")
         
         except Exception as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             flash("An error occurred while creating the account.", "danger")
             return render_template('register.html')
         
@@ -531,11 +528,11 @@ def register():
                 connection.close()
 
         flash("Account created successfully!", "success")
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     return render_template('register.html')
 
-@app.route('/api/register', methods=['POST', 'OPTIONS'])
+@bp.route('/api/register', methods=['POST', 'OPTIONS'])
 def api_register():
     """
     Register endpoint with automatic login after registration.
@@ -611,10 +608,7 @@ def api_register():
         db_query = connection.cursor(dictionary=True)
 
         # Check if username or email exists
-        db_query.execute(
-            "SELECT * FROM user WHERE user_name=%s OR user_email=%s",
-            (username, email),
-        )
+        db_query.execute(queries.USER_BY_NAME_OR_EMAIL, (username, email))
         existing_user = db_query.fetchone()
 
         if existing_user:
@@ -633,7 +627,7 @@ def api_register():
 
         # Get the newly created user
         user_id = db_query.lastrowid
-        db_query.execute("SELECT * FROM user WHERE user_id=%s", (user_id,))
+        db_query.execute(queries.USER_BY_ID, (user_id,))
         new_user = db_query.fetchone()
 
         db_query.close()
@@ -676,7 +670,7 @@ def api_register():
         return response, 201
 
     except Exception as e:
-        print(f"Database error: {e}")
+        logger.error("Database error: %s", e)
         if connection:
             connection.rollback()
             connection.close()
@@ -687,7 +681,7 @@ def api_register():
     
 # --- Profile Management ---
 # can take from session value also
-@app.route("/api/profile/<int:user_id>", methods=["GET"])
+@bp.route("/api/profile/<int:user_id>", methods=["GET"])
 def get_profile(user_id):
 
     # Connect to DB
@@ -700,14 +694,14 @@ def get_profile(user_id):
 
     db_query = connection.cursor(dictionary=True)
     # view profile query with user_id
-    db_query.execute("SELECT user_id, user_name, user_email, bio, profile_picture, is_private FROM user WHERE user_id=%s", (user_id,))
+    db_query.execute(queries.PROFILE_BY_ID, (user_id,))
     profile = db_query.fetchone(); db_query.close(); connection.close()
 
     if profile:
         return jsonify(profile)
     return jsonify({"error": "User not found"}), 404
 
-@app.route("/api/profile/by-email", methods=["GET"])
+@bp.route("/api/profile/by-email", methods=["GET"])
 def get_profile_by_email():
     email = (request.args.get("email") or "").strip().lower()
     if not email:
@@ -723,11 +717,7 @@ def get_profile_by_email():
 
     try:
         db_query = connection.cursor(dictionary=True)
-        db_query.execute(
-            "SELECT user_id, user_name, user_email, bio, profile_picture, is_private "
-            "FROM `user` WHERE LOWER(user_email)=%s",
-            (email,)
-        )
+        db_query.execute(queries.PROFILE_BY_EMAIL, (email,))
         profile = db_query.fetchone()
     finally:
         db_query.close(); connection.close()
@@ -736,7 +726,7 @@ def get_profile_by_email():
         return jsonify(profile)
     return jsonify({"error": "User not found"}), 404
 
-@app.route("/api/profile/<int:user_id>/stats", methods=["GET"])
+@bp.route("/api/profile/<int:user_id>/stats", methods=["GET"])
 @optional_auth
 def get_profile_stats(user_id):
     """
@@ -755,54 +745,30 @@ def get_profile_stats(user_id):
         db_query = connection.cursor(dictionary=True)
         
         # Get post count
-        db_query.execute("SELECT COUNT(*) as count FROM post WHERE user_id = %s", (user_id,))
+        db_query.execute(queries.STATS_POST_COUNT, (user_id,))
         post_count = db_query.fetchone()['count'] or 0
         
         # Get total likes (sum of all likes on user's posts)
-        db_query.execute("""
-            SELECT COUNT(*) as count 
-            FROM post_like pl
-            JOIN post p ON pl.post_id = p.post_id
-            WHERE p.user_id = %s
-        """, (user_id,))
+        db_query.execute(queries.STATS_TOTAL_LIKES, (user_id,))
         total_likes = db_query.fetchone()['count'] or 0
         
         # Get total comments
-        db_query.execute("""
-            SELECT COUNT(*) as count 
-            FROM comment c
-            JOIN post p ON c.post_id = p.post_id
-            WHERE p.user_id = %s
-        """, (user_id,))
+        db_query.execute(queries.STATS_TOTAL_COMMENTS, (user_id,))
         total_comments = db_query.fetchone()['count'] or 0
         
         # Get rating stats (convert from 1-10 scale to 1-5 scale)
-        db_query.execute("""
-            SELECT 
-                COUNT(*) as count,
-                AVG(rating_value) as average
-            FROM rating
-            WHERE user_id = %s
-        """, (user_id,))
+        db_query.execute(queries.STATS_RATINGS, (user_id,))
         rating_result = db_query.fetchone()
         total_ratings = rating_result['count'] or 0
         avg_rating = float(rating_result['average']) if rating_result['average'] else 0
         avg_rating = round(avg_rating, 1) if avg_rating > 0 else 0
         
         # Get followers count (users who have this user as a friend)
-        db_query.execute("""
-            SELECT COUNT(*) as count 
-            FROM friends 
-            WHERE friend_user_id = %s
-        """, (user_id,))
+        db_query.execute(queries.STATS_FOLLOWERS, (user_id,))
         followers = db_query.fetchone()['count'] or 0
         
         # Get following count (users this user has as friends)
-        db_query.execute("""
-            SELECT COUNT(*) as count 
-            FROM friends 
-            WHERE user_id = %s
-        """, (user_id,))
+        db_query.execute(queries.STATS_FOLLOWING, (user_id,))
         following = db_query.fetchone()['count'] or 0
         
         stats = {
@@ -824,7 +790,7 @@ def get_profile_stats(user_id):
         }), 200
         
     except Exception as e:
-        print(f"Error fetching profile stats: {e}")
+        logger.error("Error fetching profile stats: %s", e)
         return jsonify({
             "success": False,
             "message": "Error fetching profile statistics"
@@ -833,7 +799,7 @@ def get_profile_stats(user_id):
         db_query.close()
         connection.close()
 
-@app.route("/api/profile/update", methods=["PUT", "OPTIONS"])
+@bp.route("/api/profile/update", methods=["PUT", "OPTIONS"])
 @require_auth
 def update_profile():
     """
@@ -927,10 +893,7 @@ def update_profile():
         
         # Check if email is being changed and if it's already taken
         if email is not None:
-            db_query.execute(
-                "SELECT user_id FROM user WHERE user_email=%s AND user_id != %s",
-                (email, user_id)
-            )
+            db_query.execute(queries.PROFILE_EMAIL_TAKEN, (email, user_id))
             existing_user = db_query.fetchone()
             if existing_user:
                 return jsonify({
@@ -965,16 +928,27 @@ def update_profile():
         update_values.append(user_id)
         
         # Execute update with prepared statement
+        private_changed = False
+        if is_private is not None:
+            db_query.execute(queries.PROFILE_PRIVACY_FOR_UPDATE, (user_id,))
+            current = db_query.fetchone()
+            private_changed = current is not None and int(current['is_private']) != is_private
+
         update_query = f"UPDATE user SET {', '.join(update_fields)} WHERE user_id = %s"
         db_query.execute(update_query, tuple(update_values))
+        updated = db_query.rowcount
+        if updated and private_changed:
+            # is_private is cached by every worker's user directory
+            user_directory.record_change(db_query)
         connection.commit()
-        
+
         # Verify update was successful
-        if db_query.rowcount == 0:
+        if updated == 0:
             return jsonify({
                 "success": False,
                 "message": "User not found or no changes made"
             }), 404
+        user_directory.invalidate(user_id)
         
         # Fetch updated profile
         db_query.execute(
@@ -983,9 +957,6 @@ def update_profile():
         )
         updated_profile = db_query.fetchone()
         
-        if updated_profile and updated_profile.get('created_at'):
-            updated_profile['created_at'] = updated_profile['created_at'].isoformat()
-        
         db_query.close()
         connection.close()
         
@@ -996,7 +967,7 @@ def update_profile():
         }), 200
         
     except Exception as e:
-        print(f"Error updating profile: {e}")
+        logger.error("Error updating profile: %s", e)
         if connection:
             connection.rollback()
             connection.close()
@@ -1006,7 +977,7 @@ def update_profile():
         }), 500
 
 # --- Post Management ---
-@app.route("/api/posts", methods=["POST"])
+@bp.route("/api/posts", methods=["POST"])
 def create_post():
     data = request.get_json()
     user_id, text, media, privacy, media_type = data.get("user_id"), data.get("content_text"), data.get("media_url"), data.get("privacy"), data.get("media_type")
@@ -1033,17 +1004,13 @@ def create_post():
     connection.commit(); db_query.close(); connection.close()
     return jsonify({"message": "Post created successfully."})
 
-# media upload directory
-UPLOAD_FOLDER = "/var/www/feedfinder/uploads"
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-
 MAX_FILE_SIZE_MB = 20
 
 # Import file validation utilities
 from app.file_validator import validate_uploaded_file, sanitize_filename, get_file_extension
 
 # --- upload media ---
-@app.route("/api/upload", methods=["POST", "OPTIONS"])
+@bp.route("/api/upload", methods=["POST", "OPTIONS"])
 @require_auth
 def upload_media():
     """
@@ -1060,7 +1027,7 @@ def upload_media():
     
     try:
         # ensure upload directory exists
-        os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+        os.makedirs(current_app.config["UPLOAD_FOLDER"], exist_ok=True)
 
         # check if file is in the request
         if "file" not in request.files:
@@ -1078,7 +1045,7 @@ def upload_media():
         # Comprehensive file validation (extension, MIME type, file signature)
         is_valid, error_message, detected_ext = validate_uploaded_file(file, original_filename, content_type)
         if not is_valid:
-            logging.warning(f"[UPLOAD SECURITY] File validation failed for user {getattr(request, 'user_id', 'unknown')}: {error_message}")
+            logger.warning(f"[UPLOAD SECURITY] File validation failed for user {getattr(request, 'user_id', 'unknown')}: {error_message}")
             return jsonify({
                 "success": False,
                 "message": error_message
@@ -1086,7 +1053,8 @@ def upload_media():
 
         # enforce file size limit
         file.seek(0, os.SEEK_END)
-        size_mb = file.tell() / (1024 * 1024)
+        size_bytes = file.tell()
+        size_mb = size_bytes / (1024 * 1024)
         file.seek(0)
         if size_mb > MAX_FILE_SIZE_MB:
             return jsonify({
@@ -1098,7 +1066,7 @@ def upload_media():
         try:
             sanitized_filename = sanitize_filename(original_filename)
         except ValueError as e:
-            logging.warning(f"[UPLOAD SECURITY] Filename sanitization failed: {e}")
+            logger.warning(f"[UPLOAD SECURITY] Filename sanitization failed: {e}")
             return jsonify({
                 "success": False,
                 "message": f"Invalid filename: {str(e)}"
@@ -1112,13 +1080,13 @@ def upload_media():
         unique_name = f"{uuid.uuid4().hex}.{detected_ext}"
         
         # Prevent path traversal in save path
-        save_path = os.path.join(app.config["UPLOAD_FOLDER"], unique_name)
+        save_path = os.path.join(current_app.config["UPLOAD_FOLDER"], unique_name)
         
         # Additional security: ensure the resolved path is within upload folder
-        upload_folder_abs = os.path.abspath(app.config["UPLOAD_FOLDER"])
+        upload_folder_abs = os.path.abspath(current_app.config["UPLOAD_FOLDER"])
         save_path_abs = os.path.abspath(save_path)
         if not save_path_abs.startswith(upload_folder_abs):
-            logging.error(f"[UPLOAD SECURITY] Path traversal attempt detected: {save_path_abs}")
+            logger.error(f"[UPLOAD SECURITY] Path traversal attempt detected: {save_path_abs}")
             return jsonify({
                 "success": False,
                 "message": "Invalid file path"
@@ -1135,28 +1103,31 @@ def upload_media():
                 media_type = 'image'
 
         except PermissionError as e:
-            logging.error(f"[UPLOAD ERROR] Permission denied: {e}")
+            logger.error(f"[UPLOAD ERROR] Permission denied: {e}")
             return jsonify({
                 "success": False,
                 "message": f"Permission denied when saving file. Please contact administrator."
             }), 500
         except FileNotFoundError as e:
-            logging.error(f"[UPLOAD ERROR] Folder not found: {e}")
+            logger.error(f"[UPLOAD ERROR] Folder not found: {e}")
             return jsonify({
                 "success": False,
                 "message": f"Upload folder not found. Please contact administrator."
             }), 500
         except Exception as e:
-            logging.error(f"[UPLOAD ERROR] Unexpected: {e}")
+            logger.error(f"[UPLOAD ERROR] Unexpected: {e}")
             return jsonify({
                 "success": False,
                 "message": f"Unexpected error while saving file: {str(e)}"
             }), 500
 
+        UPLOADS.inc(media_type)
+        UPLOAD_BYTES.inc(media_type, amount=size_bytes)
+
         # unique media URL (relative for frontend)
         media_url = f"/uploads/{unique_name}"
 
-        logging.info(f"[UPLOAD SUCCESS] User {getattr(request, 'user_id', 'unknown')} uploaded {detected_ext} file: {unique_name}")
+        logger.info(f"[UPLOAD SUCCESS] User {getattr(request, 'user_id', 'unknown')} uploaded {detected_ext} file: {unique_name}")
         
         return jsonify({
             "success": True,
@@ -1166,7 +1137,7 @@ def upload_media():
         }), 201
 
     except Exception as e:
-        logging.error(f"[UPLOAD ERROR] Outer catch: {e}")
+        logger.error(f"[UPLOAD ERROR] Outer catch: {e}")
         return jsonify({
             "success": False,
             "message": f"Unexpected server error: {str(e)}"
@@ -1174,7 +1145,7 @@ def upload_media():
 
 
 # lets frontend load media directly from the path below
-@app.route("/uploads/<path:filename>")
+@bp.route("/uploads/<path:filename>")
 def serve_upload(filename):
     """
     Serve uploaded media files securely.
@@ -1185,30 +1156,30 @@ def serve_upload(filename):
         sanitized = sanitize_filename(filename)
         
         # Additional security: ensure resolved path is within upload folder
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], sanitized)
-        upload_folder_abs = os.path.abspath(app.config["UPLOAD_FOLDER"])
+        file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], sanitized)
+        upload_folder_abs = os.path.abspath(current_app.config["UPLOAD_FOLDER"])
         file_path_abs = os.path.abspath(file_path)
         
         if not file_path_abs.startswith(upload_folder_abs):
-            logging.warning(f"[SERVE UPLOAD SECURITY] Path traversal attempt: {filename}")
+            logger.warning(f"[SERVE UPLOAD SECURITY] Path traversal attempt: {filename}")
             return jsonify({"error": "File not found"}), 404
         
         # Check if file exists
         if not os.path.exists(file_path) or not os.path.isfile(file_path):
             return jsonify({"error": "File not found"}), 404
         
-        return send_from_directory(app.config["UPLOAD_FOLDER"], sanitized)
+        return send_from_directory(current_app.config["UPLOAD_FOLDER"], sanitized)
     except ValueError as e:
-        logging.warning(f"[SERVE UPLOAD SECURITY] Invalid filename: {filename}")
+        logger.warning(f"[SERVE UPLOAD SECURITY] Invalid filename: {filename}")
         return jsonify({"error": "File not found"}), 404
     except Exception as e:
-        logging.error(f"[SERVE UPLOAD ERROR] {e}")
+        logger.error(f"[SERVE UPLOAD ERROR] {e}")
         return jsonify({"error": "Error serving file"}), 500
 
 # --- Post Visibility (public / friends / exclusive) ---
 # IMPORTANT: This route must come BEFORE /api/posts/<int:user_id> to avoid route conflicts
 # Flask matches routes in order, and more specific routes should come first
-@app.route("/api/posts/user/<int:creator_id>", methods=["GET"])
+@bp.route("/api/posts/user/<int:creator_id>", methods=["GET"])
 @optional_auth
 def api_view_creator_posts(creator_id):
     """
@@ -1220,7 +1191,8 @@ def api_view_creator_posts(creator_id):
     viewer_id = request.args.get("viewer", default=0, type=int)
     
     # Debug logging
-    print(f"api_view_creator_posts: creator_id={creator_id}, viewer_id={viewer_id}, is_own_profile={viewer_id == creator_id if viewer_id else False}")
+    logger.debug("api_view_creator_posts: creator_id=%s, viewer_id=%s, is_own_profile=%s",
+                 creator_id, viewer_id, viewer_id == creator_id if viewer_id else False)
     
     # Connect to DB
     connection = get_db_connection()
@@ -1235,96 +1207,30 @@ def api_view_creator_posts(creator_id):
         
         # If viewing own posts, show all posts
         if viewer_id and viewer_id == creator_id:
-            db_query.execute(
-                """
-                SELECT 
-                    p.post_id, 
-                    p.content_text, 
-                    p.media_url, 
-                    p.privacy, 
-                    p.created_at,
-                    (SELECT COUNT(*) FROM post_like pl WHERE pl.post_id = p.post_id) as like_count
-                FROM post p
-                WHERE p.user_id = %s
-                ORDER BY p.created_at DESC
-                """,
-                (creator_id,)
-            )
+            db_query.execute(queries.CREATOR_POSTS_OWN, (creator_id,))
         elif viewer_id:
             # Viewing someone else's posts - respect privacy
             # Show: public posts, friends posts (if friendship exists), exclusive posts (if subscribed)
-            db_query.execute(
-                """
-                SELECT 
-                    p.post_id, 
-                    p.content_text, 
-                    p.media_url, 
-                    p.privacy, 
-                    p.created_at,
-                    (SELECT COUNT(*) FROM post_like pl WHERE pl.post_id = p.post_id) as like_count
-                FROM post p
-                WHERE p.user_id = %s
-                  AND (
-                    p.privacy = 'public'
-                    OR (p.privacy = 'friends' AND EXISTS (
-                        SELECT 1 FROM friends f 
-                        WHERE (f.user_id = %s AND f.friend_user_id = %s)
-                           OR (f.user_id = %s AND f.friend_user_id = %s)
-                    ))
-                    OR (p.privacy = 'exclusive' AND EXISTS (
-                        SELECT 1 FROM subscription s
-                        WHERE s.subscriber_id = %s 
-                          AND s.creator_id = %s 
-                          AND s.is_active = TRUE
-                          AND NOW() BETWEEN s.start_date AND s.end_date
-                    ))
-                  )
-                ORDER BY p.created_at DESC
-                """,
-                (creator_id, viewer_id, creator_id, creator_id, viewer_id, viewer_id, creator_id)
-            )
+            # Subscription state comes from the cached point lookup instead of a per-row subquery
+            is_subscriber = has_active_subscription(viewer_id, creator_id)
+            db_query.execute(queries.CREATOR_POSTS_VIEWER, (creator_id, viewer_id, creator_id, creator_id, viewer_id, is_subscriber))
             
             # Log for debugging
-            print(f"Fetching posts for creator_id={creator_id}, viewer_id={viewer_id}")
+            logger.debug("Fetching posts for creator_id=%s, viewer_id=%s", creator_id, viewer_id)
             posts_fetched = db_query.fetchall()
-            print(f"Found {len(posts_fetched)} posts")
+            logger.debug("Found %d posts", len(posts_fetched))
             posts = posts_fetched
         else:
             # Not authenticated - only public posts
-            db_query.execute(
-                """
-                SELECT 
-                    p.post_id, 
-                    p.content_text, 
-                    p.media_url, 
-                    p.privacy, 
-                    p.created_at,
-                    (SELECT COUNT(*) FROM post_like pl WHERE pl.post_id = p.post_id) as like_count
-                FROM post p
-                WHERE p.user_id = %s AND p.privacy = 'public'
-                ORDER BY p.created_at DESC
-                """,
-                (creator_id,)
-            )
+            db_query.execute(queries.CREATOR_POSTS_PUBLIC, (creator_id,))
             
             posts = db_query.fetchall()
         
-        # Format response
-        results = []
-        for post in posts:
-            results.append({
-                "post_id": post['post_id'],
-                "content_text": post['content_text'],
-                "media_url": post['media_url'],
-                "privacy": post['privacy'],
-                "created_at": post['created_at'].isoformat() if post['created_at'] else None,
-                "like_count": post['like_count'] or 0
-            })
-        
-        return jsonify(results), 200
+        # Rows already have the response shape; the JSON provider formats created_at
+        return jsonify(posts), 200
         
     except Exception as e:
-        print(f"Error fetching creator posts: {e}")
+        logger.error("Error fetching creator posts: %s", e)
         return jsonify({
             "success": False,
             "message": "Error fetching posts"
@@ -1333,7 +1239,7 @@ def api_view_creator_posts(creator_id):
         db_query.close()
         connection.close()
 
-@app.route("/api/posts/<int:user_id>", methods=["GET"])
+@bp.route("/api/posts/<int:user_id>", methods=["GET"])
 def get_user_posts(user_id):
     # Connect to DB
     connection = get_db_connection()
@@ -1345,12 +1251,12 @@ def get_user_posts(user_id):
     
     db_query = connection.cursor(dictionary=True)
     # get user's post query
-    db_query.execute("SELECT post_id, content_text, media_url, privacy, created_at FROM post WHERE user_id=%s ORDER BY created_at DESC", (user_id,))
+    db_query.execute(queries.USER_POSTS, (user_id,))
     posts = db_query.fetchall(); db_query.close(); connection.close()
     return jsonify(posts)
 
 # --- Post Update/Delete ---
-@app.route("/api/posts/<int:post_id>", methods=["PUT"])  # body: { user_id, content_text, media_url, privacy }
+@bp.route("/api/posts/<int:post_id>", methods=["PUT"])  # body: { user_id, content_text, media_url, privacy }
 def api_update_post(post_id):
     data = request.get_json()
     user_id = int(data.get("user_id"))
@@ -1382,7 +1288,7 @@ def api_update_post(post_id):
     finally:
         db_query.close(); connection.close()
 
-@app.route("/api/posts/<int:post_id>", methods=["DELETE"])  # body: { user_id }
+@bp.route("/api/posts/<int:post_id>", methods=["DELETE"])  # body: { user_id }
 def api_delete_post(post_id):
     data = request.get_json()
     user_id = int(data.get("user_id"))
@@ -1405,7 +1311,7 @@ def api_delete_post(post_id):
         db_query.close(); connection.close()
         
 # --- get random public posts and display ---
-@app.route("/api/posts/public", methods=["GET"])
+@bp.route("/api/posts/public", methods=["GET"])
 def api_public_posts():
     try:
         limit = int(request.args.get("limit", 20))
@@ -1425,26 +1331,7 @@ def api_public_posts():
     try:
         db_query = connection.cursor(dictionary=True)
         # Include author name/username; only privacy='public'
-        db_query.execute(
-            """
-            SELECT 
-              p.post_id,
-              p.user_id,
-              p.content_text,
-              p.media_url,
-              p.media_type,
-              p.privacy,
-              p.created_at,
-              u.user_name,
-              u.user_email
-            FROM post p
-            JOIN user u ON u.user_id = p.user_id
-            WHERE p.privacy = 'public'
-            ORDER BY p.created_at DESC, p.post_id DESC
-            LIMIT %s
-            """,
-            (limit,)
-        )
+        db_query.execute(queries.PUBLIC_FEED, (limit,))
         rows = db_query.fetchall()
         return jsonify({"success": True, "items": rows})
     finally:
@@ -1475,7 +1362,7 @@ def sanitize_search_query(query):
     
     return sanitized
 
-@app.route("/api/posts/search", methods=["GET", "OPTIONS"])
+@bp.route("/api/posts/search", methods=["GET", "OPTIONS"])
 @optional_auth
 def api_search_posts():
     """
@@ -1531,27 +1418,7 @@ def api_search_posts():
         # Search in content_text (case-insensitive)
         # Only return public posts for security
         search_pattern = f"%{search_query}%"
-        db_query.execute(
-            """
-            SELECT 
-              p.post_id,
-              p.user_id,
-              p.content_text,
-              p.media_url,
-              p.media_type,
-              p.privacy,
-              p.created_at,
-              u.user_name,
-              u.user_email
-            FROM post p
-            JOIN user u ON u.user_id = p.user_id
-            WHERE p.privacy = 'public'
-              AND p.content_text LIKE %s
-            ORDER BY p.created_at DESC, p.post_id DESC
-            LIMIT %s
-            """,
-            (search_pattern, limit)
-        )
+        db_query.execute(queries.SEARCH_POSTS, (search_pattern, limit))
         rows = db_query.fetchall()
         
         return jsonify({
@@ -1561,7 +1428,7 @@ def api_search_posts():
             "count": len(rows)
         })
     except Exception as e:
-        print(f"Error searching posts: {e}")
+        logger.error("Error searching posts: %s", e)
         return jsonify({
             "success": False,
             "message": "Error searching posts"
@@ -1604,7 +1471,7 @@ def api_search_posts():
 #         db_query.close(); connection.close()
 
 # --- Rate ---
-@app.route("/api/rate", methods=["POST"])
+@bp.route("/api/rate", methods=["POST"])
 def rate_user():
     data = request.get_json()
     user_id, target_email, rating = data.get("user_id"), data.get("target_email"), int(data.get("rating_value"))
@@ -1618,7 +1485,7 @@ def rate_user():
     
     db_query = connection.cursor(dictionary=True)
     # select user based on email query
-    db_query.execute("SELECT user_id FROM user WHERE user_email=%s", (target_email,))
+    db_query.execute(queries.USER_ID_BY_EMAIL, (target_email,))
     target = db_query.fetchone()
     if not target:
         return jsonify({"error": "Target user not found."}), 404
@@ -1628,7 +1495,7 @@ def rate_user():
     connection.commit(); db_query.close(); connection.close()
     return jsonify({"message": f"Rated {target_email} with {rating}/5."})
 
-@app.route("/api/rating/<email>", methods=["GET"])
+@bp.route("/api/rating/<email>", methods=["GET"])
 def view_rating(email):
     # Connect to DB
     connection = get_db_connection()
@@ -1640,7 +1507,7 @@ def view_rating(email):
     
     db_query = connection.cursor(dictionary=True)
     # get average rating query
-    db_query.execute("SELECT ROUND(AVG(rating_value),2) avg, COUNT(*) cnt FROM rating r JOIN user u ON r.rated_user_id=u.user_id WHERE u.user_email=%s", (email,))
+    db_query.execute(queries.RATING_BY_EMAIL, (email,))
     stats = db_query.fetchone(); db_query.close(); connection.close()
     if stats["cnt"]:
         return jsonify({"email": email, "average": stats["avg"], "count": stats["cnt"]})
@@ -1833,7 +1700,7 @@ def view_rating(email):
 #         db_query.close(); connection.close()
 
 # --- Admin Routes ---
-@app.route("/api/admin/posts", methods=["GET", "OPTIONS"])
+@bp.route("/api/admin/posts", methods=["GET", "OPTIONS"])
 @require_auth
 @require_admin
 def api_admin_get_all_posts():
@@ -1862,41 +1729,9 @@ def api_admin_get_all_posts():
     try:
         db_query = connection.cursor(dictionary=True)
         # Get all posts with author information
-        db_query.execute(
-            """
-            SELECT 
-              p.post_id,
-              p.user_id,
-              p.content_text,
-              p.media_url,
-              p.media_type,
-              p.privacy,
-              p.created_at,
-              u.user_name,
-              u.user_email
-            FROM post p
-            JOIN user u ON u.user_id = p.user_id
-            ORDER BY p.created_at DESC, p.post_id DESC
-            LIMIT %s
-            """,
-            (limit,)
-        )
-        rows = db_query.fetchall()
-        
-        # Format response
-        posts = []
-        for row in rows:
-            posts.append({
-                "post_id": row['post_id'],
-                "user_id": row['user_id'],
-                "user_name": row['user_name'],
-                "user_email": row['user_email'],
-                "content_text": row['content_text'],
-                "media_url": row['media_url'],
-                "media_type": row['media_type'],
-                "privacy": row['privacy'],
-                "created_at": row['created_at'].isoformat() if row['created_at'] else None
-            })
+        db_query.execute(queries.ADMIN_ALL_POSTS, (limit,))
+        # Rows already have the response shape; the JSON provider formats created_at
+        posts = db_query.fetchall()
         
         return jsonify({
             "success": True,
@@ -1904,7 +1739,7 @@ def api_admin_get_all_posts():
             "count": len(posts)
         }), 200
     except Exception as e:
-        print(f"Error fetching admin posts: {e}")
+        logger.error("Error fetching admin posts: %s", e)
         return jsonify({
             "success": False,
             "message": "Error fetching posts"
@@ -1913,7 +1748,7 @@ def api_admin_get_all_posts():
         db_query.close()
         connection.close()
 
-@app.route("/api/admin/posts/<int:post_id>", methods=["DELETE", "OPTIONS"])
+@bp.route("/api/admin/posts/<int:post_id>", methods=["DELETE", "OPTIONS"])
 @require_auth
 @require_admin
 def api_admin_delete_post(post_id):
@@ -1936,7 +1771,7 @@ def api_admin_delete_post(post_id):
         db_query = connection.cursor(dictionary=True)
         
         # First, check if post exists
-        db_query.execute("SELECT post_id, user_id FROM post WHERE post_id = %s", (post_id,))
+        db_query.execute(queries.POST_OWNER, (post_id,))
         post = db_query.fetchone()
         
         if not post:
@@ -1961,7 +1796,7 @@ def api_admin_delete_post(post_id):
         }), 200
         
     except Exception as e:
-        print(f"Error deleting post: {e}")
+        logger.error("Error deleting post: %s", e)
         if connection:
             connection.rollback()
         return jsonify({
@@ -1971,3 +1806,125 @@ def api_admin_delete_post(post_id):
     finally:
         db_query.close()
         connection.close()
+
+@bp.route("/api/admin/users/<int:user_id>/role", methods=["PUT", "OPTIONS"])
+@require_auth
+@require_admin
+def api_admin_set_role(user_id):
+    """
+    Change a user's role (admin only).
+    Takes effect on every worker within USER_DIRECTORY_VERSION_INTERVAL seconds.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    data = request.get_json(silent=True) or {}
+    role = data.get("role")
+    if role not in ("normie", "admin"):
+        return jsonify({
+            "success": False,
+            "message": "role must be 'normie' or 'admin'"
+        }), 400
+    
+    if user_id == request.user_id and role != "admin":
+        return jsonify({
+            "success": False,
+            "message": "Admins cannot demote themselves"
+        }), 400
+    
+    # Connect to DB
+    connection = get_db_connection()
+    if connection is None:
+        return jsonify({
+            "success": False,
+            "message": "Database connection failed."
+        }), 500
+    
+    try:
+        db_query = connection.cursor()
+        db_query.execute(queries.USER_ROLE_BY_ID, (user_id,))
+        user = db_query.fetchone()
+        if not user:
+            return jsonify({
+                "success": False,
+                "message": "User not found"
+            }), 404
+        
+        if user[0] != role:
+            db_query.execute(queries.SET_USER_ROLE, (role, user_id))
+            user_directory.record_change(db_query)
+            connection.commit()
+            user_directory.invalidate(user_id)
+            logger.info("User %s role changed from %s to %s by admin %s", user_id, user[0], role, request.user_id)
+        
+        return jsonify({
+            "success": True,
+            "message": "Role updated",
+            "user": {"id": user_id, "role": role}
+        }), 200
+        
+    except Exception as e:
+        logger.error("Error changing user role: %s", e)
+        connection.rollback()
+        return jsonify({
+            "success": False,
+            "message": "Error changing user role"
+        }), 500
+    finally:
+        db_query.close()
+        connection.close()
+
+@bp.route("/api/metrics", methods=["GET"])
+@require_auth
+@require_admin
+def api_metrics():
+    """
+    Prometheus metrics for every worker of this server (admin only).
+    """
+    return current_app.response_class(metrics_text(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+@bp.route("/api/admin/profiles", methods=["GET"])
+@require_auth
+@require_admin
+def api_admin_list_profiles():
+    """
+    List stored request profiles, newest first (admin only).
+    """
+    return jsonify({"success": True, "profiles": list_profiles()}), 200
+
+@bp.route("/api/admin/profiles/<profile_id>", methods=["GET"])
+@require_auth
+@require_admin
+def api_admin_get_profile(profile_id):
+    """
+    Download a request profile (admin only).
+    ?format=collapsed (default) for flamegraph tools, ?format=speedscope for speedscope JSON,
+    ?format=summary for the category breakdown.
+    """
+    profile = load_profile(profile_id)
+    if not profile:
+        return jsonify({"success": False, "message": "Profile not found"}), 404
+
+    output_format = request.args.get("format", "collapsed")
+    if output_format == "speedscope":
+        return jsonify(to_speedscope(profile)), 200
+    if output_format == "summary":
+        profile.pop("collapsed", None)
+        return jsonify({"success": True, "profile": profile}), 200
+    return current_app.response_class("\n".join(profile["collapsed"]) + "\n", mimetype="text/plain"), 200
+
+@bp.route("/api/admin/flamegraph", methods=["GET"])
+@require_auth
+@require_admin
+def api_admin_flamegraph():
+    """
+    Collapsed stacks from the background sampler for the last N minutes,
+    merged across workers (admin only). ?minutes=10 by default.
+    """
+    try:
+        minutes = int(request.args.get("minutes", 10))
+        minutes = max(1, min(minutes, SAMPLER_RETENTION_MINUTES))
+    except ValueError:
+        minutes = 10
+
+    return current_app.response_class(collapsed_text(recent_stacks(minutes)), mimetype="text/plain"), 200
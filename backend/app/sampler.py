@@ -0,0 +1,203 @@
+"""
+Sampling Profiler Module
+Always-on, low-overhead profiler for request threads.
+
+A background thread in each worker reads sys._current_frames() SAMPLER_HZ
+times a second. For every thread that is serving a request, it adds the
+stack to a bounded in-memory table. Each minute the table is written to
+SAMPLER_DIR as a collapsed-stacks file named <pid>-<unix minute>.collapsed
+and then cleared. Files older than SAMPLER_RETENTION_MINUTES are deleted.
+
+Admins can download the last N minutes, merged across workers, from
+/api/admin/flamegraph?minutes=N and feed them to flamegraph.pl or speedscope.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from app.profiler import frame_label
+
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+_DEFAULT_HZ = 100 if os.getenv('FLASK_ENV') == 'production' else 0
+SAMPLER_HZ = float(os.getenv('SAMPLER_HZ') or _DEFAULT_HZ)  # 0 disables the sampler
+SAMPLER_DIR = os.getenv('SAMPLER_DIR') or os.path.join(tempfile.gettempdir(), 'feedfinder-samples')
+SAMPLER_ROTATE_SECONDS = 60
+SAMPLER_RETENTION_MINUTES = int(os.getenv('SAMPLER_RETENTION_MINUTES') or 60)
+SAMPLER_MAX_STACKS = 5000  # Distinct stacks kept per minute; the rest are counted as truncated
+SAMPLER_MAX_DEPTH = 64
+
+TRUNCATED_STACK = ('[truncated]',)
+
+# Thread idents currently serving a request
+_request_threads = set()
+
+_sampler = None
+_sampler_pid = None
+_sampler_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples request threads and rotates the aggregated stacks to disk."""
+
+    def __init__(self, hz=None, directory=None, max_stacks=SAMPLER_MAX_STACKS):
+        self.interval = 1.0 / (hz or SAMPLER_HZ)
+        self.directory = directory or SAMPLER_DIR
+        self.max_stacks = max_stacks
+        self.table = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """
+        Take one sample of every thread serving a request.
+        """
+        if not _request_threads:
+            return
+        frames = sys._current_frames()
+        for ident in tuple(_request_threads):
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < SAMPLER_MAX_DEPTH:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            key = tuple(reversed(stack))
+            with self._lock:
+                if key not in self.table and len(self.table) >= self.max_stacks:
+                    key = TRUNCATED_STACK
+                self.table[key] = self.table.get(key, 0) + 1
+
+    def rotate(self, now=None):
+        """
+        Write the current table to disk, clear it, and delete expired files.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            table, self.table = self.table, {}
+
+        os.makedirs(self.directory, exist_ok=True)
+        if table:
+            path = os.path.join(self.directory, f"{os.getpid()}-{int(now // 60)}.collapsed")
+            with open(path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{';'.join(stack)} {count}\n" for stack, count in table.items())
+
+        oldest_minute = int(now // 60) - SAMPLER_RETENTION_MINUTES
+        for name, minute in _sample_files(self.directory):
+            if minute < oldest_minute:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.table)
+
+    def _run(self):
+        next_rotation = time.monotonic() + SAMPLER_ROTATE_SECONDS
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+                if time.monotonic() >= next_rotation:
+                    next_rotation += SAMPLER_ROTATE_SECONDS
+                    self.rotate()
+            except Exception as e:
+                logger.error("Error in stack sampler: %s", e)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.rotate()
+
+
+def _sample_files(directory):
+    """
+    Yield (filename, unix minute) for each rotated sample file.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith('.collapsed'):
+            continue
+        try:
+            yield name, int(name[:-len('.collapsed')].rsplit('-', 1)[1])
+        except (IndexError, ValueError):
+            continue
+
+
+def recent_stacks(minutes, directory=None, now=None):
+    """
+    Merge the last `minutes` of rotated samples from every worker, plus this
+    worker's not-yet-rotated table, into {stack: count}.
+    """
+    directory = directory or SAMPLER_DIR
+    now = time.time() if now is None else now
+    first_minute = int(now // 60) - minutes
+    merged = {}
+    for name, minute in _sample_files(directory):
+        if minute < first_minute:
+            continue
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    key = tuple(stack.split(';'))
+                    merged[key] = merged.get(key, 0) + int(count)
+    if _sampler is not None and _sampler_pid == os.getpid():
+        for key, count in _sampler.snapshot().items():
+            merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def collapsed_text(stacks):
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def start_sampler():
+    """
+    Start the sampler once per process (checked by pid, so each forked
+    worker gets its own thread). Does nothing when SAMPLER_HZ is 0.
+    """
+    global _sampler, _sampler_pid
+    if SAMPLER_HZ <= 0 or _sampler_pid == os.getpid():
+        return
+    with _sampler_lock:
+        if _sampler_pid == os.getpid():
+            return
+        _sampler = StackSampler()
+        _sampler.start()
+        _sampler_pid = os.getpid()
+
+
+def _enter_request():
+    _request_threads.add(threading.get_ident())
+    start_sampler()
+
+
+def _leave_request(exc):
+    _request_threads.discard(threading.get_ident())
+
+
+def init_app(app):
+    """
+    Register request threads with the sampler.
+    """
+    if SAMPLER_HZ <= 0:
+        return
+    app.before_request(_enter_request)
+    app.teardown_request(_leave_request)
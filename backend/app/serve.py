@@ -0,0 +1,191 @@
+"""
+Serve Module
+Production entry point: runs the app under Gunicorn with gthread workers.
+
+Sizing, unless overridden:
+- workers: one per CPU core plus one. Each worker is a separate process, so
+  CPU-bound work (Argon2, JSON) runs in parallel.
+- threads per worker: DEFAULT_THREADS. There is no connection pool:
+  get_db_connection() opens a new connection per call, and a request may
+  hold two at once (a route's own, plus one opened by a helper such as
+  has_active_subscription). When DB_MAX_CONNECTIONS is set, threads are
+  capped so that workers * threads * DB_CONNECTIONS_PER_THREAD stays
+  within it.
+
+--preload imports the app once in the master, so forked workers share its
+code copy-on-write. Background threads do not survive fork, so each worker
+restarts them (log writer, metrics flusher, sampler, maintenance scheduler,
+mail sender)
+after it boots.
+It also compiles the URL map and checks that the database is reachable,
+logging a warning if not.
+
+Graceful reload: `kill -HUP <master pid>` replaces workers one by one after
+their in-flight requests finish (up to --graceful-timeout). With --preload
+the master keeps the old code, so deploy new code with USR2 (start a new
+master) followed by TERM to the old one.
+
+Usage:
+    python -m app.serve --bind 0.0.0.0:5000 --preload
+    python -m app.serve --print-config
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+
+# Configuration
+SERVE_BIND = os.getenv('SERVE_BIND') or '0.0.0.0:5000'
+SERVE_WORKERS = int(os.getenv('SERVE_WORKERS') or 0)  # 0 derives from the CPU count
+SERVE_THREADS = int(os.getenv('SERVE_THREADS') or 0)  # 0 derives from DEFAULT_THREADS and DB_MAX_CONNECTIONS
+SERVE_PRELOAD = os.getenv('SERVE_PRELOAD', '1') != '0'
+SERVE_KEEPALIVE = int(os.getenv('SERVE_KEEPALIVE') or 5)  # Seconds an idle keep-alive connection stays open
+SERVE_TIMEOUT = int(os.getenv('SERVE_TIMEOUT') or 30)  # Silent workers are killed after this many seconds
+SERVE_GRACEFUL_TIMEOUT = int(os.getenv('SERVE_GRACEFUL_TIMEOUT') or 30)
+SERVE_MAX_REQUESTS = int(os.getenv('SERVE_MAX_REQUESTS') or 0)  # Recycle workers after N requests; 0 never
+DEFAULT_THREADS = 8
+DB_CONNECTIONS_PER_THREAD = 2  # Most a request holds at once
+DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS') or 0)  # Server-wide budget; 0 means no cap
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers(cpu_count=None):
+    return (cpu_count or os.cpu_count() or 1) + 1
+
+
+def default_threads(workers, threads=None, max_connections=None):
+    threads = threads or DEFAULT_THREADS
+    max_connections = DB_MAX_CONNECTIONS if max_connections is None else max_connections
+    if max_connections > 0:
+        return max(1, min(threads, max_connections // (workers * DB_CONNECTIONS_PER_THREAD)))
+    return max(1, threads)
+
+
+def warmup():
+    """
+    Per-worker initialisation, run once the worker has loaded the app.
+    Restarts background threads lost in the fork, compiles the URL map and
+    checks that the database is reachable.
+    """
+    from app import app
+    from app import logging_setup, mail_queue, maintenance, metrics, sampler
+    from app.db import get_db_connection
+
+    started = time.perf_counter()
+    logging_setup.configure_logging()
+    metrics._ensure_flusher()
+    sampler.start_sampler()
+    maintenance.start_scheduler()
+    # Sends mail left in the spool by previous workers
+    mail_queue.start_sender(app)
+
+    app.url_map.bind('localhost').match('/api/health')
+
+    connection = get_db_connection()
+    if connection is None:
+        logger.warning("Worker %s started without a database connection", os.getpid())
+    else:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+        finally:
+            connection.close()
+    logger.info("Worker %s warmed up in %.1f ms", os.getpid(), (time.perf_counter() - started) * 1000)
+
+
+def _post_worker_init(worker):
+    warmup()
+
+
+def _worker_exit(server, worker):
+    from app import logging_setup, session_activity
+    session_activity.flush()
+    logging_setup.shutdown_logging()
+
+
+def _child_exit(server, worker):
+    # Runs in the master, also for workers that were killed
+    from app import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def build_options(args):
+    """
+    Gunicorn settings for the parsed command line.
+    """
+    workers = args.workers or default_workers()
+    threads = args.threads or default_threads(workers)
+    options = {
+        'bind': args.bind,
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'preload_app': args.preload,
+        'keepalive': args.keepalive,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'worker_tmp_dir': '/dev/shm' if os.path.isdir('/dev/shm') else None,
+        'post_worker_init': _post_worker_init,
+        'worker_exit': _worker_exit,
+        'child_exit': _child_exit,
+    }
+    if args.pidfile:
+        options['pidfile'] = args.pidfile
+    return options
+
+
+def run(options):
+    # Imported here so the app and its tests do not need gunicorn installed
+    from gunicorn.app.base import BaseApplication
+
+    class FeedFinderApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    FeedFinderApplication().run()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the FeedFinder backend under Gunicorn.")
+    parser.add_argument('--bind', default=SERVE_BIND, help="address to listen on (default %(default)s)")
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS, help="worker processes (default: CPU count + 1)")
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS, help="threads per worker (default: %d, capped by DB_MAX_CONNECTIONS)" % DEFAULT_THREADS)
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction, default=SERVE_PRELOAD,
+                        help="import the app in the master and fork workers from it")
+    parser.add_argument('--keepalive', type=int, default=SERVE_KEEPALIVE, help="keep-alive seconds")
+    parser.add_argument('--timeout', type=int, default=SERVE_TIMEOUT)
+    parser.add_argument('--graceful-timeout', type=int, default=SERVE_GRACEFUL_TIMEOUT)
+    parser.add_argument('--max-requests', type=int, default=SERVE_MAX_REQUESTS,
+                        help="recycle a worker after this many requests (0 never)")
+    parser.add_argument('--pidfile', help="write the master pid here, for kill -HUP reloads")
+    parser.add_argument('--print-config', action='store_true', help="print the derived settings and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = build_options(args)
+    if args.print_config:
+        print(json.dumps({k: v for k, v in options.items() if not callable(v)}, indent=2, sort_keys=True))
+        return 0
+    run(options)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
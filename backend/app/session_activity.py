@@ -0,0 +1,119 @@
+"""
+Session Activity Module
+Write-behind tracking of sessions.last_accessed, with optional sliding expiry.
+
+verify_session_token() records the session id of each successfully
+authenticated request in an in-memory set. A background thread in each worker
+flushes the set every SESSION_ACTIVITY_FLUSH_INTERVAL seconds through the
+session store (see app.session_store), in chunks of
+SESSION_ACTIVITY_BATCH_SIZE ids. With MySQL each chunk is one statement:
+
+    UPDATE sessions SET last_accessed = NOW()
+    WHERE session_id IN (...) AND is_active = 1 AND expires_at > NOW()
+
+A session used a thousand times in an interval costs one row update.
+
+With SESSION_SLIDING_EXPIRY=1 the same statement also pushes expires_at out
+to SESSION_IDLE_TIMEOUT seconds after the last activity. It never moves
+expires_at earlier, and never past created_at + SESSION_MAX_LIFETIME. Active
+sessions keep refreshing, and idle ones lapse. Once expired, a session is
+never extended again. When sessions is partitioned by expiry day (migration
+0005), MySQL moves a row to its new day's partition as expires_at changes.
+
+Pending activity is also flushed when a Gunicorn worker exits (see app.serve).
+"""
+
+import logging
+import os
+import threading
+import time
+from app import session_store
+
+
+# Configuration
+SESSION_ACTIVITY_FLUSH_INTERVAL = float(os.getenv('SESSION_ACTIVITY_FLUSH_INTERVAL') or 30)  # 0 disables tracking
+SESSION_ACTIVITY_BATCH_SIZE = 500  # Session ids per UPDATE
+SESSION_SLIDING_EXPIRY = os.getenv('SESSION_SLIDING_EXPIRY') == '1'
+SESSION_IDLE_TIMEOUT = int(os.getenv('SESSION_IDLE_TIMEOUT') or 24 * 3600)  # Seconds after last activity
+SESSION_MAX_LIFETIME = int(os.getenv('SESSION_MAX_LIFETIME') or 7 * 24 * 3600)  # Cap from created_at (refresh token lifetime)
+
+logger = logging.getLogger(__name__)
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def touch(session_id):
+    """
+    Record activity for a session; written at the next flush.
+    """
+    if SESSION_ACTIVITY_FLUSH_INTERVAL <= 0 or not session_id:
+        return
+    with _pending_lock:
+        _pending.add(session_id)
+    _ensure_flusher()
+
+
+def flush():
+    """
+    Write pending activity. Returns the number of sessions written, or None
+    if the session store could not be reached (unwritten ids are kept for
+    the next try).
+    """
+    global _pending
+    with _pending_lock:
+        if not _pending:
+            return 0
+        session_ids, _pending = sorted(_pending), set()
+
+    store = session_store.get_store()
+    extend = (SESSION_IDLE_TIMEOUT, SESSION_MAX_LIFETIME) if SESSION_SLIDING_EXPIRY else None
+    for start in range(0, len(session_ids), SESSION_ACTIVITY_BATCH_SIZE):
+        chunk = session_ids[start:start + SESSION_ACTIVITY_BATCH_SIZE]
+        try:
+            written = store.touch(chunk, extend)
+        except Exception as e:
+            logger.error("Error flushing session activity: %s", e)
+            written = None
+        if written is None:
+            _requeue(session_ids[start:])
+            return None
+    return len(session_ids)
+
+
+def _requeue(session_ids):
+    with _pending_lock:
+        _pending.update(session_ids)
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception as e:
+            logger.error("Error in session activity flusher: %s", e)
+
+
+def _ensure_flusher():
+    """
+    Start the flusher once per process. Checked by pid so each forked
+    worker gets its own thread.
+    """
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        thread = threading.Thread(
+            target=_flush_loop,
+            args=(SESSION_ACTIVITY_FLUSH_INTERVAL,),
+            name='session-activity-flusher',
+            daemon=True
+        )
+        thread.start()
+        _flusher_pid = os.getpid()
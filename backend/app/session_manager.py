@@ -10,9 +10,13 @@ import hashlib
 import time
 from datetime import datetime, timedelta
 from flask import request, jsonify
-from app.db import get_db_connection
+from app.tracing import span
+from app import revocation, session_activity, session_store, token_cache, user_directory
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 # Configuration
 SECRET_KEY = os.getenv('SECRET_KEY') or 'AlphaThreeForty'
@@ -20,19 +24,39 @@ JWT_ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRY = timedelta(hours=1)  # Short-lived access token
 REFRESH_TOKEN_EXPIRY = timedelta(days=7)  # Longer-lived refresh token
 SESSION_TOKEN_EXPIRY = timedelta(hours=24)  # Session token expiry
+REFRESH_TOKEN_ROTATION = os.getenv('REFRESH_TOKEN_ROTATION') == '1'  # New refresh token on every refresh, with reuse detection
+REFRESH_REUSE_GRACE = float(os.getenv('REFRESH_REUSE_GRACE') or 5)  # Seconds a just-rotated refresh token is still accepted
+
+
+def encode_token(payload):
+    """
+    Sign a JWT payload.
+    """
+    with span('jwt.encode', **{'jwt.type': payload.get('type')}):
+        return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
-def generate_session_token(user_id, username, user_role, ip_address, user_agent):
+def decode_token(token):
+    """
+    Verify a JWT's signature and expiry and return its payload.
+    Raises jwt.InvalidTokenError subclasses on failure.
+    """
+    with span('jwt.decode'):
+        return jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+
+
+def generate_session_token(user_id, username, user_role, ip_address, user_agent, session_id=None):
     """
     Generate a secure session token (JWT) with user info and security metadata.
     Includes protection against tampering via signature.
+    Pass session_id to issue a new access token for an existing session.
     """
     # Create a fingerprint from IP and User-Agent to detect session hijacking
     fingerprint_data = f"{ip_address}:{user_agent}"
     fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()[:16]
     
     # Generate a unique session ID
-    session_id = secrets.token_urlsafe(32)
+    session_id = session_id or secrets.token_urlsafe(32)
     
     # Current timestamp
     now = datetime.utcnow()
@@ -51,41 +75,71 @@ def generate_session_token(user_id, username, user_role, ip_address, user_agent)
         'type': 'access_token'
     }
     
-    token = jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
+    token = encode_token(payload)
     return token, session_id
 
 
-def generate_refresh_token(user_id, session_id, username, user_role):
+def generate_refresh_token(user_id, session_id, username, user_role, generation=0, exp=None):
     """
     Generate a refresh token for obtaining new access tokens.
     Includes user_role and username to preserve session state without database lookup.
+    generation counts rotations of the session's refresh token; a rotated
+    token keeps the exp of the one it replaces.
     """
     now = datetime.utcnow()
     iat = int(now.timestamp())
-    exp = int((now + REFRESH_TOKEN_EXPIRY).timestamp())
+    exp = exp or int((now + REFRESH_TOKEN_EXPIRY).timestamp())
     
     payload = {
         'user_id': user_id,
         'session_id': session_id,
         'username': username,
         'user_role': user_role,
+        'gen': generation,
         'iat': iat,
         'exp': exp,
         'type': 'refresh_token'
     }
     
-    token = jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
+    token = encode_token(payload)
     return token
 
 
+def _session_active(payload):
+    """
+    Check the token's session in the database, or in stateless mode that it
+    was not revoked.
+    """
+    session_id = payload.get('session_id')
+    if not session_id:
+        return False
+    revoked = revocation.is_revoked(session_id) if revocation.STATELESS_ACCESS_TOKENS else None
+    if revoked is None:
+        return is_session_valid(session_id, payload.get('user_id'))
+    return not revoked
+
+
 def verify_session_token(token):
     """
     Verify and decode a session token.
     Returns (is_valid, payload, error_message)
+    Payloads verified before for the same client come from the token cache;
+    treat the returned payload as read-only.
     """
     try:
+        current_ip = request.remote_addr
+        current_user_agent = request.headers.get('User-Agent', '')
+        cache_key = token_cache.cache_key(token, current_ip, current_user_agent)
+        payload = token_cache.verified_tokens.get(cache_key)
+        if payload is not None:
+            # Signature, type, expiry and fingerprint were checked when cached
+            if not _session_active(payload):
+                return False, None, "Session not found or invalid"
+            session_activity.touch(payload['session_id'])
+            return True, payload, None
+
         # Verify token signature and expiration
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        payload = decode_token(token)
         
         # Check token type
         if payload.get('type') != 'access_token':
@@ -96,14 +150,11 @@ def verify_session_token(token):
         if exp and datetime.utcnow().timestamp() > exp:
             return False, None, "Token expired"
         
-        # Verify session exists in database
-        session_id = payload.get('session_id')
-        if not session_id or not is_session_valid(session_id, payload.get('user_id')):
+        # Verify session exists in database, or in stateless mode that it was not revoked
+        if not _session_active(payload):
             return False, None, "Session not found or invalid"
         
         # Verify fingerprint matches (protection against session hijacking)
-        current_ip = request.remote_addr
-        current_user_agent = request.headers.get('User-Agent', '')
         fingerprint_data = f"{current_ip}:{current_user_agent}"
         current_fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()[:16]
         
@@ -112,6 +163,8 @@ def verify_session_token(token):
             # Fingerprint mismatch - potential session hijacking
             return False, None, "Session security check failed"
         
+        token_cache.verified_tokens.put(cache_key, payload)
+        session_activity.touch(payload['session_id'])
         return True, payload, None
         
     except jwt.ExpiredSignatureError:
@@ -122,137 +175,87 @@ def verify_session_token(token):
         return False, None, f"Token verification error: {str(e)}"
 
 
-def verify_refresh_token(token):
+def _decode_refresh_token(token):
     """
-    Verify a refresh token.
-    Returns (is_valid, payload, error_message)
+    Check a refresh token's signature, expiry and type.
+    Returns (payload, error_message)
     """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        
-        if payload.get('type') != 'refresh_token':
-            return False, None, "Invalid token type"
-        
-        # Verify session exists
-        session_id = payload.get('session_id')
-        user_id = payload.get('user_id')
-        if not session_id or not is_session_valid(session_id, user_id):
-            return False, None, "Session not found or invalid"
-        
-        return True, payload, None
-        
+        payload = decode_token(token)
     except jwt.ExpiredSignatureError:
-        return False, None, "Refresh token expired"
+        return None, "Refresh token expired"
     except jwt.InvalidTokenError as e:
-        return False, None, f"Invalid refresh token: {str(e)}"
+        return None, f"Invalid refresh token: {str(e)}"
+    
+    if payload.get('type') != 'refresh_token':
+        return None, "Invalid token type"
+    return payload, None
 
 
-def create_session(user_id, username, user_role, ip_address, user_agent):
+def verify_refresh_token(token):
     """
-    Create a new session in the database and return tokens.
+    Verify a refresh token.
+    Returns (is_valid, payload, error_message)
     """
-    connection = get_db_connection()
-    if not connection:
-        return None, None, None
+    payload, error = _decode_refresh_token(token)
+    if payload is None:
+        return False, None, error
+    
+    # Always check the session store: refresh tokens outlive the revocation
+    # set's entries, which are dropped once the session expires
+    session_id = payload.get('session_id')
+    if not session_id or not is_session_valid(session_id, payload.get('user_id')):
+        return False, None, "Session not found or invalid"
     
+    return True, payload, None
+
+
+def create_session(user_id, username, user_role, ip_address, user_agent):
+    """
+    Create a new session in the session store and return tokens.
+    """
     try:
-        # Create sessions table if it doesn't exist (do this first)
-        create_sessions_table_if_not_exists()
-        
-        # Get a fresh connection for the insert
-        connection = get_db_connection()
-        if not connection:
-            return None, None, None
-        
-        db_query = connection.cursor(dictionary=True)
-        
         # Generate tokens
         access_token, session_id = generate_session_token(user_id, username, user_role, ip_address, user_agent)
         refresh_token = generate_refresh_token(user_id, session_id, username, user_role)
         
-        # Store session in database
+        # Store session
         now = datetime.utcnow()
         expires_at = now + SESSION_TOKEN_EXPIRY
         
-        insert_query = """
-            INSERT INTO sessions (session_id, user_id, username, ip_address, user_agent, 
-                                  fingerprint, created_at, expires_at, is_active)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
         fingerprint_data = f"{ip_address}:{user_agent}"
         fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()[:16]
         
-        db_query.execute(insert_query, (
-            session_id,
-            user_id,
-            username,
-            ip_address,
-            user_agent,
-            fingerprint,
-            now,
-            expires_at,
-            1  # is_active
-        ))
-        connection.commit()
-        
-        db_query.close()
-        connection.close()
+        stored = session_store.get_store().create(
+            session_id, user_id, username, ip_address, user_agent, fingerprint, now, expires_at
+        )
+        if not stored:
+            return None, None, None
         
         return access_token, refresh_token, session_id
         
     except Exception as e:
-        print(f"Error creating session: {e}")
-        import traceback
-        traceback.print_exc()
-        if connection:
-            try:
-                connection.rollback()
-                connection.close()
-            except:
-                pass
+        logger.exception("Error creating session: %s", e)
         return None, None, None
 
 
 def invalidate_session(session_id, user_id=None):
     """
-    Invalidate a session by setting is_active to 0.
+    End a session, or every session of user_id (logout from all devices).
     """
-    # Ensure sessions table exists
-    create_sessions_table_if_not_exists()
-    
-    connection = get_db_connection()
-    if not connection:
-        return False
-    
     try:
-        db_query = connection.cursor()
-        
-        if user_id:
-            # Invalidate all sessions for a user (logout from all devices)
-            update_query = "UPDATE sessions SET is_active = 0 WHERE user_id = %s"
-            db_query.execute(update_query, (user_id,))
-        else:
-            # Invalidate specific session
-            update_query = "UPDATE sessions SET is_active = 0 WHERE session_id = %s"
-            db_query.execute(update_query, (session_id,))
-        
-        connection.commit()
-        db_query.close()
-        connection.close()
-        
+        revoked = session_store.get_store().invalidate(session_id, user_id)
+        if revoked is None:
+            return False
+        
+        revocation.note_revoked(revoked)
+        for revoked_session_id, _ in revoked:
+            token_cache.verified_tokens.evict_session(revoked_session_id)
+        token_cache.verified_tokens.evict_session(session_id)
         return True
         
     except Exception as e:
-        print(f"Error invalidating session: {e}")
-        import traceback
-        traceback.print_exc()
-        if connection:
-            try:
-                connection.rollback()
-                connection.close()
-            except:
-                pass
+        logger.exception("Error invalidating session: %s", e)
         return False
 
 
@@ -260,146 +263,84 @@ def is_session_valid(session_id, user_id):
     """
     Check if a session is valid (exists, active, and not expired).
     """
-    connection = get_db_connection()
-    if not connection:
-        return False
-    
     try:
-        db_query = connection.cursor(dictionary=True)
-        
-        query = """
-            SELECT * FROM sessions 
-            WHERE session_id = %s AND user_id = %s AND is_active = 1 AND expires_at > NOW()
-        """
-        db_query.execute(query, (session_id, user_id))
-        session = db_query.fetchone()
-        
-        db_query.close()
-        connection.close()
-        
-        return session is not None
-        
+        return bool(session_store.get_store().is_valid(session_id, user_id))
     except Exception as e:
-        print(f"Error checking session validity: {e}")
-        if connection:
-            connection.close()
+        logger.error("Error checking session validity: %s", e)
         return False
 
 
 def refresh_access_token(refresh_token):
     """
     Generate a new access token from a valid refresh token.
-    Uses user_role and username from the refresh token payload to preserve session state.
+    Uses user_role from the refresh token payload to preserve session state,
+    and the current username from the user directory cache.
+    Returns (access_token, new_refresh_token, error_message); new_refresh_token
+    is None unless REFRESH_TOKEN_ROTATION is on.
+    
+    With rotation, each refresh token can be used once: the session's
+    generation is advanced with a compare-and-set, and presenting an older
+    generation again ends the session. For REFRESH_REUSE_GRACE seconds
+    after a rotation, the replaced token instead gets the token that
+    rotation issued, so concurrent refreshes (two tabs, a retried request)
+    are not mistaken for theft.
     """
-    is_valid, payload, error = verify_refresh_token(refresh_token)
-    if not is_valid:
+    payload, error = _decode_refresh_token(refresh_token)
+    if payload is None:
         return None, None, error
     
-    # Get user info from refresh token payload (preserves session state)
     user_id = payload.get('user_id')
     session_id = payload.get('session_id')
-    username = payload.get('username')
     user_role = payload.get('user_role')
-    
-    # Get user info from database
-    connection = get_db_connection()
-    if not connection:
-        return None, None, "Database connection failed"
+    if not session_id:
+        return None, None, "Session not found or invalid"
     
     try:
-        db_query = connection.cursor(dictionary=True)
-        db_query.execute("SELECT user_name FROM user WHERE user_id = %s", (user_id,))
-        user = db_query.fetchone()
-        db_query.close()
-        connection.close()
-        
+        user = user_directory.get_user(user_id)
         if not user:
             return None, None, "User not found"
         
+        new_refresh_token = None
+        if REFRESH_TOKEN_ROTATION:
+            generation = payload.get('gen', 0)
+            outcome = session_store.get_store().rotate_refresh(session_id, user_id, generation, REFRESH_REUSE_GRACE)
+            if outcome == session_store.REUSED:
+                logger.warning("Refresh token reuse detected for session of user %s; ending session", user_id)
+                invalidate_session(session_id)
+                return None, None, "Refresh token reuse detected"
+            if outcome not in (session_store.ROTATED, session_store.GRACE):
+                return None, None, "Session not found or invalid"
+            # On GRACE this is the token the concurrent rotation issued:
+            # same session, generation and exp
+            new_refresh_token = generate_refresh_token(
+                user_id, session_id, user['user_name'], user_role, generation + 1, payload.get('exp')
+            )
+        elif not is_session_valid(session_id, user_id):
+            # The store, not the revocation set: see verify_refresh_token
+            return None, None, "Session not found or invalid"
+        
         # Get current request info
         ip_address = request.remote_addr
         user_agent = request.headers.get('User-Agent', '')
         
-        # Generate new access token
-        access_token, _ = generate_session_token(user_id, user['user_name'], user_role, ip_address, user_agent)
+        # Generate new access token for the same session, so revoking the session covers it
+        access_token, _ = generate_session_token(user_id, user['user_name'], user_role, ip_address, user_agent, session_id)
         
-        return access_token, None, None
+        return access_token, new_refresh_token, None
         
     except Exception as e:
-        print(f"Error refreshing token: {e}")
-        if connection:
-            connection.close()
+        logger.error("Error refreshing token: %s", e)
         return None, None, str(e)
 
 
-
-def create_sessions_table_if_not_exists():
-    """
-    Create the sessions table if it doesn't exist.
-    """
-    connection = get_db_connection()
-    if not connection:
-        return False
-    
-    try:
-        db_query = connection.cursor()
-        
-        create_table_query = """
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id VARCHAR(255) PRIMARY KEY,
-                user_id INT NOT NULL,
-                username VARCHAR(50) NOT NULL,
-                ip_address VARCHAR(45) NOT NULL,
-                user_agent TEXT,
-                fingerprint VARCHAR(64),
-                created_at DATETIME NOT NULL,
-                expires_at DATETIME NOT NULL,
-                last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                is_active TINYINT(1) DEFAULT 1,
-                INDEX idx_user_id (user_id),
-                INDEX idx_session_id (session_id),
-                INDEX idx_expires_at (expires_at),
-                FOREIGN KEY (user_id) REFERENCES user(user_id) ON DELETE CASCADE
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """
-        
-        db_query.execute(create_table_query)
-        connection.commit()
-        db_query.close()
-        connection.close()
-        return True
-        
-    except Exception as e:
-        print(f"Note creating sessions table: {e}")
-        if connection:
-            try:
-                connection.rollback()
-                connection.close()
-            except:
-                pass
-        return False
-
-
 def cleanup_expired_sessions():
     """
-    Clean up expired sessions from the database.
-    Should be run periodically (e.g., via cron job or scheduled task).
+    Clean up expired sessions and their revocation rows from the database.
+    Deletes in bounded batches; app.maintenance runs this periodically.
     """
-    connection = get_db_connection()
-    if not connection:
-        return
-    
+    from app.maintenance import purge_expired_sessions, purge_expired_revocations
     try:
-        db_query = connection.cursor()
-        delete_query = "DELETE FROM sessions WHERE expires_at < NOW() OR is_active = 0"
-        db_query.execute(delete_query)
-        connection.commit()
-        db_query.close()
-        connection.close()
-        
+        purge_expired_sessions()
+        purge_expired_revocations()
     except Exception as e:
-        print(f"Error cleaning up sessions: {e}")
-        if connection:
-            connection.rollback()
-            connection.close()
-
+        logger.error("Error cleaning up sessions: %s", e)
@@ -0,0 +1,415 @@
+"""
+Session Store Module
+Server-side session state behind one interface, used by app.session_manager
+and app.session_activity.
+
+SESSION_STORE selects the backend:
+
+- mysql (default): the sessions table.
+- redis: any server speaking the Redis protocol, at SESSION_STORE_URL.
+  Each session is a hash that expires on its own at expires_at:
+
+      session:<session_id>      user_id, username, ip_address, user_agent,
+                                fingerprint, created_at, expires_at,
+                                last_accessed (epoch seconds), refresh_gen
+      user_sessions:<user_id>   set of the user's session ids
+      refresh_claim:<session_id>:<gen>
+                                when the refresh token of generation <gen>
+                                was rotated (epoch ms)
+
+  The auth check is a single HGET. Logging out everywhere reads the user's
+  set and deletes those sessions in one MULTI/EXEC. Expired sessions need
+  no purge, and auth checks no longer touch MySQL. Add servers to scale
+  horizontally.
+
+With STATELESS_ACCESS_TOKENS=1 revocations are still published through the
+session_revocation table (see app.revocation).
+"""
+
+import calendar
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from app.db import get_db_connection
+from app import revocation
+from app.resp import RespClient
+
+
+# Configuration
+SESSION_STORE = os.getenv('SESSION_STORE') or 'mysql'  # mysql or redis
+SESSION_STORE_URL = os.getenv('SESSION_STORE_URL') or 'redis://localhost:6379/0'
+SESSION_STORE_PREFIX = os.getenv('SESSION_STORE_PREFIX') or 'feedfinder:'  # Key prefix on shared servers
+
+# rotate_refresh() outcomes
+ROTATED = 'rotated'
+GRACE = 'grace'
+REUSED = 'reused'
+ENDED = 'ended'
+
+# Selecting a constant keeps the check covered by idx_sessions_validity
+IS_VALID_SQL = """
+    SELECT 1 AS valid FROM sessions
+    WHERE session_id = %s AND user_id = %s AND is_active = 1 AND expires_at > NOW()
+    LIMIT 1
+"""
+
+ROTATE_REFRESH_SQL = """
+    UPDATE sessions SET refresh_gen = refresh_gen + 1, refresh_rotated_at = NOW(3)
+    WHERE session_id = %s AND user_id = %s AND refresh_gen = %s AND is_active = 1 AND expires_at > NOW()
+"""
+
+# NULL when no active session; 1 when `gen` was rotated within the grace seconds
+ROTATED_RECENTLY_SQL = """
+    SELECT refresh_gen = %s + 1 AND refresh_rotated_at >= NOW(3) - INTERVAL %s SECOND AS recent
+    FROM sessions
+    WHERE session_id = %s AND user_id = %s AND is_active = 1 AND expires_at > NOW()
+    LIMIT 1
+"""
+
+# expires_at > NOW() limits the updates to partitions still in use
+# (sessions is partitioned by expiry day, see migration 0005)
+USER_SESSIONS_SQL = (
+    "SELECT session_id, expires_at FROM sessions WHERE user_id = %s AND is_active = 1 AND expires_at > NOW()"
+)
+END_USER_SESSIONS_SQL = (
+    "UPDATE sessions SET is_active = 0 WHERE user_id = %s AND is_active = 1 AND expires_at > NOW()"
+)
+SESSION_SQL = (
+    "SELECT session_id, expires_at FROM sessions WHERE session_id = %s AND is_active = 1 AND expires_at > NOW()"
+)
+END_SESSION_SQL = "UPDATE sessions SET is_active = 0 WHERE session_id = %s AND expires_at > NOW()"
+
+# Slides expires_at; params (idle_timeout, max_lifetime) go first
+EXTEND_ASSIGNMENT = (
+    ', expires_at = GREATEST(expires_at, LEAST('
+    'NOW() + INTERVAL %s SECOND, created_at + INTERVAL %s SECOND))'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def touch_sql(count, extend=False):
+    """
+    The UPDATE that records activity for `count` session ids.
+    """
+    placeholders = ', '.join(['%s'] * count)
+    assignments = 'last_accessed = NOW()' + (EXTEND_ASSIGNMENT if extend else '')
+    return (
+        f"UPDATE sessions SET {assignments} "
+        f"WHERE session_id IN ({placeholders}) AND is_active = 1 AND expires_at > NOW()"
+    )
+
+
+class SessionStore:
+    """
+    Interface for session backends. Methods raise on backend errors and
+    return None when the backend cannot be reached.
+    """
+
+    name = None
+
+    def create(self, session_id, user_id, username, ip_address, user_agent, fingerprint, created_at, expires_at):
+        """
+        Store a new active session. created_at and expires_at are naive UTC
+        datetimes. Returns True once stored.
+        """
+        raise NotImplementedError
+
+    def is_valid(self, session_id, user_id):
+        """
+        Whether the session exists, belongs to user_id, is active and has
+        not expired.
+        """
+        raise NotImplementedError
+
+    def invalidate(self, session_id=None, user_id=None):
+        """
+        End one session, or every session of user_id when it is given.
+        Returns [(session_id, expires_at)] of the sessions that were active.
+        """
+        raise NotImplementedError
+
+    def rotate_refresh(self, session_id, user_id, generation, grace=0):
+        """
+        Advance the session's refresh token generation from `generation`
+        to the next one, atomically. Returns ROTATED; GRACE when another
+        caller rotated from `generation` less than `grace` seconds ago (a
+        concurrent refresh with the same token); REUSED when the session
+        is active at another generation (an old refresh token was
+        replayed); or ENDED when the session is not active.
+        """
+        raise NotImplementedError
+
+    def touch(self, session_ids, extend=None):
+        """
+        Record activity for active sessions. extend=(idle_timeout,
+        max_lifetime) also slides expires_at (see app.session_activity).
+        Returns the number of ids written.
+        """
+        raise NotImplementedError
+
+
+class MySQLSessionStore(SessionStore):
+    """Sessions in the sessions table."""
+
+    name = 'mysql'
+
+    def create(self, session_id, user_id, username, ip_address, user_agent, fingerprint, created_at, expires_at):
+        connection = get_db_connection()
+        if not connection:
+            return None
+        try:
+            db_query = connection.cursor()
+            db_query.execute(
+                """
+                INSERT INTO sessions (session_id, user_id, username, ip_address, user_agent,
+                                      fingerprint, created_at, expires_at, is_active)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (session_id, user_id, username, ip_address, user_agent, fingerprint, created_at, expires_at, 1)
+            )
+            connection.commit()
+            db_query.close()
+            return True
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def is_valid(self, session_id, user_id):
+        connection = get_db_connection()
+        if not connection:
+            return None
+        try:
+            db_query = connection.cursor()
+            db_query.execute(IS_VALID_SQL, (session_id, user_id))
+            session = db_query.fetchone()
+            db_query.close()
+            return session is not None
+        finally:
+            connection.close()
+
+    def invalidate(self, session_id=None, user_id=None):
+        connection = get_db_connection()
+        if not connection:
+            return None
+        try:
+            db_query = connection.cursor()
+            if user_id:
+                # Invalidate all sessions for a user (logout from all devices)
+                db_query.execute(USER_SESSIONS_SQL, (user_id,))
+                revoked = db_query.fetchall()
+                db_query.execute(END_USER_SESSIONS_SQL, (user_id,))
+            else:
+                db_query.execute(SESSION_SQL, (session_id,))
+                revoked = db_query.fetchall()
+                db_query.execute(END_SESSION_SQL, (session_id,))
+            # Published to every worker's revocation set in the same transaction
+            revocation.record_revocations(db_query, revoked)
+            connection.commit()
+            db_query.close()
+            return revoked
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def rotate_refresh(self, session_id, user_id, generation, grace=0):
+        connection = get_db_connection()
+        if not connection:
+            return None
+        try:
+            db_query = connection.cursor()
+            db_query.execute(ROTATE_REFRESH_SQL, (session_id, user_id, generation))
+            rotated = db_query.rowcount == 1
+            connection.commit()
+            outcome = ROTATED
+            if not rotated:
+                # Rare path: tell a concurrent refresh from a replayed token
+                # and from an ended session
+                db_query.execute(ROTATED_RECENTLY_SQL, (generation, grace, session_id, user_id))
+                row = db_query.fetchone()
+                outcome = ENDED if row is None else GRACE if row[0] else REUSED
+            db_query.close()
+            return outcome
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def touch(self, session_ids, extend=None):
+        if not session_ids:
+            return 0
+        connection = get_db_connection()
+        if not connection:
+            return None
+        params = tuple(extend or ()) + tuple(session_ids)
+        try:
+            db_query = connection.cursor()
+            db_query.execute(touch_sql(len(session_ids), bool(extend)), params)
+            connection.commit()
+            db_query.close()
+            return len(session_ids)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+
+def _epoch(value):
+    # Naive UTC datetime -> epoch seconds
+    return calendar.timegm(value.utctimetuple())
+
+
+class RespSessionStore(SessionStore):
+    """Sessions as expiring hashes on a Redis-protocol server."""
+
+    name = 'redis'
+
+    def __init__(self, client, prefix=None):
+        self.client = client
+        self.prefix = SESSION_STORE_PREFIX if prefix is None else prefix
+
+    def _session_key(self, session_id):
+        return f"{self.prefix}session:{session_id}"
+
+    def _user_key(self, user_id):
+        return f"{self.prefix}user_sessions:{user_id}"
+
+    def _claim_key(self, session_id, generation):
+        return f"{self.prefix}refresh_claim:{session_id}:{generation}"
+
+    def create(self, session_id, user_id, username, ip_address, user_agent, fingerprint, created_at, expires_at):
+        from app.session_activity import SESSION_MAX_LIFETIME
+        key = self._session_key(session_id)
+        created, expires = _epoch(created_at), _epoch(expires_at)
+        # The set outlives every session in it: sliding expiry never passes
+        # created_at + SESSION_MAX_LIFETIME, and this session is the newest
+        user_expires = max(expires, created + SESSION_MAX_LIFETIME)
+        self.client.transaction([
+            ('HSET', key,
+             'user_id', user_id, 'username', username, 'ip_address', ip_address,
+             'user_agent', user_agent or '', 'fingerprint', fingerprint,
+             'created_at', created, 'expires_at', expires, 'last_accessed', created, 'refresh_gen', 0),
+            ('EXPIREAT', key, expires),
+            ('SADD', self._user_key(user_id), session_id),
+            ('EXPIREAT', self._user_key(user_id), user_expires),
+        ])
+        return True
+
+    def is_valid(self, session_id, user_id):
+        # Expired hashes are gone, and invalidated ones are deleted
+        return self.client.execute('HGET', self._session_key(session_id), 'user_id') == str(user_id)
+
+    def invalidate(self, session_id=None, user_id=None):
+        if user_id:
+            session_ids = self.client.execute('SMEMBERS', self._user_key(user_id)) or []
+        else:
+            session_ids = [session_id]
+        if not session_ids:
+            return []
+
+        fields = self.client.pipeline([
+            ('HMGET', self._session_key(sid), 'user_id', 'expires_at') for sid in session_ids
+        ])
+        commands, revoked = [], []
+        for sid, values in zip(session_ids, fields):
+            if isinstance(values, Exception):
+                raise values
+            owner, expires = values
+            if owner is None:
+                continue
+            commands.append(('DEL', self._session_key(sid)))
+            commands.append(('SREM', self._user_key(owner), sid))
+            revoked.append((sid, datetime.utcfromtimestamp(int(expires))))
+        if user_id:
+            # Ids whose sessions already expired
+            commands.append(('SREM', self._user_key(user_id), *session_ids))
+        if commands:
+            self.client.transaction(commands)
+
+        if revoked and revocation.STATELESS_ACCESS_TOKENS:
+            revocation.publish_revocations(revoked)
+        return revoked
+
+    def rotate_refresh(self, session_id, user_id, generation, grace=0):
+        key = self._session_key(session_id)
+        owner, current, expires = self.client.execute('HMGET', key, 'user_id', 'refresh_gen', 'expires_at')
+        if owner != str(user_id):
+            return ENDED
+        current = int(current or 0)
+        claim = self._claim_key(session_id, generation)
+        if current == generation:
+            # Claiming the generation is the compare-and-set: of concurrent
+            # rotations from it, only one sets the key
+            if self.client.execute('SET', claim, int(time.time() * 1000), 'NX', 'EXAT', expires) is not None:
+                self.client.transaction([
+                    ('HSET', key, 'refresh_gen', generation + 1),
+                    ('EXPIREAT', key, expires),
+                ])
+                return ROTATED
+        elif current != generation + 1:
+            return REUSED
+        rotated_at = self.client.execute('GET', claim)
+        if rotated_at is not None and time.time() * 1000 - int(rotated_at) < grace * 1000:
+            return GRACE
+        return REUSED
+
+    def touch(self, session_ids, extend=None):
+        if not session_ids:
+            return 0
+        keys = [self._session_key(sid) for sid in session_ids]
+        fields = self.client.pipeline([('HMGET', key, 'created_at', 'expires_at') for key in keys])
+        now = int(time.time())
+        commands = []
+        for key, values in zip(keys, fields):
+            if isinstance(values, Exception):
+                raise values
+            created, expires = values
+            if expires is None:
+                continue
+            expires = int(expires)
+            if extend:
+                idle_timeout, max_lifetime = extend
+                expires = max(expires, min(now + idle_timeout, int(created) + max_lifetime))
+            # EXPIREAT again so a hash deleted since the read cannot come
+            # back as a partial hash without a TTL
+            commands.append(('HSET', key, 'last_accessed', now, 'expires_at', expires))
+            commands.append(('EXPIREAT', key, expires))
+        if commands:
+            self.client.transaction(commands)
+        return len(session_ids)
+
+
+def create_store(name=None, url=None):
+    """
+    Build the store named by SESSION_STORE.
+    """
+    name = name or SESSION_STORE
+    if name == 'mysql':
+        return MySQLSessionStore()
+    if name == 'redis':
+        return RespSessionStore(RespClient.from_url(url or SESSION_STORE_URL))
+    raise ValueError(f"Unknown SESSION_STORE: {name!r}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    The process-wide store, built on first use.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
@@ -0,0 +1,168 @@
+"""
+Subscription Module
+Implements the active-subscription check used for exclusive post visibility,
+backed by a per-process cache, plus the batched deactivation of expired
+subscriptions and memberships run by the sweep_subscriptions job in
+app.maintenance.
+"""
+
+import logging
+import threading
+import time
+from app.db import get_db_connection
+from app.metrics import CACHE_REQUESTS
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SUBSCRIPTION_CACHE_TTL = int(os.getenv('SUBSCRIPTION_CACHE_TTL') or 300)  # Max seconds to trust an active entry
+SUBSCRIPTION_CACHE_MAX_ENTRIES = 10000
+SWEEP_BATCH_SIZE = int(os.getenv('SUBSCRIPTION_SWEEP_BATCH_SIZE') or 500)
+
+ACTIVE_SUBSCRIPTION_SQL = """
+    SELECT TIMESTAMPDIFF(SECOND, NOW(), end_date) AS remaining
+    FROM subscription
+    WHERE subscriber_id = %s
+      AND creator_id = %s
+      AND end_date > NOW()
+      AND start_date <= NOW()
+      AND is_active = 1
+    ORDER BY end_date DESC
+    LIMIT 1
+"""
+
+# Formatted with a subscription-like table name
+DEACTIVATE_EXPIRED_SQL = "UPDATE {table} SET is_active = 0 WHERE is_active = 1 AND end_date < NOW() LIMIT %s"
+
+# (subscriber_id, creator_id) -> (True, cache_expires_at on the monotonic clock)
+_subscription_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _fetch_active_subscription(subscriber_id, creator_id):
+    """
+    Look up the active subscription for a subscriber/creator pair.
+    Returns the number of seconds until it ends, None if there is no active
+    subscription, or False if the database could not be reached.
+    Served by idx_subscription_active (subscriber_id, creator_id, end_date).
+    """
+    connection = get_db_connection()
+    if not connection:
+        return False
+
+    try:
+        db_query = connection.cursor(dictionary=True)
+        db_query.execute(ACTIVE_SUBSCRIPTION_SQL, (subscriber_id, creator_id))
+        row = db_query.fetchone()
+        db_query.close()
+        connection.close()
+
+        if not row:
+            return None
+        return max(int(row['remaining'] or 0), 0)
+
+    except Exception as e:
+        logger.error("Error checking subscription: %s", e)
+        if connection:
+            connection.close()
+        return False
+
+
+def has_active_subscription(subscriber_id, creator_id):
+    """
+    Check whether subscriber_id currently has an active subscription to creator_id.
+    Active results are cached per process. They never outlive the
+    subscription's end_date, so an expiring subscription stops granting
+    access on time even before the sweep_subscriptions job flips is_active.
+    "Not subscribed" is not cached: subscriptions are written outside this
+    process, and a new subscriber must get access on the next request.
+    """
+    if not subscriber_id or not creator_id:
+        return False
+
+    key = (subscriber_id, creator_id)
+    now = time.monotonic()
+
+    with _cache_lock:
+        cached = _subscription_cache.get(key)
+    if cached and cached[1] > now:
+        CACHE_REQUESTS.inc('subscription', 'hit')
+        return cached[0]
+
+    CACHE_REQUESTS.inc('subscription', 'miss')
+
+    remaining = _fetch_active_subscription(subscriber_id, creator_id)
+    if remaining is False:
+        # Database unavailable - deny without caching so we retry next time
+        return False
+
+    if remaining is None:
+        return False
+
+    with _cache_lock:
+        if len(_subscription_cache) >= SUBSCRIPTION_CACHE_MAX_ENTRIES:
+            _subscription_cache.clear()
+        _subscription_cache[key] = (True, now + min(SUBSCRIPTION_CACHE_TTL, remaining))
+
+    return True
+
+
+def invalidate_subscription_cache(subscriber_id=None, creator_id=None):
+    """
+    Drop cached subscription state.
+    Call with both ids after a subscription is cancelled,
+    or with no arguments to clear the whole cache.
+    """
+    with _cache_lock:
+        if subscriber_id is None and creator_id is None:
+            _subscription_cache.clear()
+        else:
+            _subscription_cache.pop((subscriber_id, creator_id), None)
+
+
+def _deactivate_expired(table, batch_size):
+    """
+    Flip is_active to 0 on expired rows of a subscription-like table,
+    one bounded batch at a time so no single statement locks a large range.
+    Returns the total number of rows updated.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return 0
+
+    total = 0
+    try:
+        db_query = connection.cursor()
+        while True:
+            db_query.execute(DEACTIVATE_EXPIRED_SQL.format(table=table), (batch_size,))
+            connection.commit()
+            total += db_query.rowcount
+            if db_query.rowcount < batch_size:
+                break
+        db_query.close()
+        connection.close()
+        return total
+
+    except Exception as e:
+        logger.error("Error sweeping expired %s rows: %s", table, e)
+        if connection:
+            try:
+                connection.rollback()
+                connection.close()
+            except:
+                pass
+        return total
+
+
+def sweep_expired_subscriptions(batch_size=None):
+    """
+    Deactivate expired subscriptions and memberships.
+    Returns a dict with the number of rows flipped per table.
+    """
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    return {
+        'subscription': _deactivate_expired('subscription', batch_size),
+        'membership': _deactivate_expired('membership', batch_size),
+    }
@@ -0,0 +1,102 @@
+"""
+Token Cache Module
+Per-worker LRU of verified access-token payloads, so repeat requests with
+the same token skip jwt.decode and the fingerprint hash.
+
+Entries are keyed by a digest of the token together with the client IP and
+User-Agent that passed the fingerprint check. A request from another client
+therefore never hits an entry it was not verified for. An entry is kept
+until the token's exp. invalidate_session() evicts the entries of the
+sessions it ends. The session check itself (sessions table or revocation
+set) still runs on every request.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.metrics import CACHE_REQUESTS
+
+
+# Configuration
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE') or 10000)  # Entries per worker; 0 disables the cache
+
+
+def cache_key(token, ip_address, user_agent):
+    """
+    Digest of the token and the fingerprint inputs it was verified with.
+    """
+    return hashlib.blake2b(
+        f"{token}\0{ip_address}\0{user_agent}".encode(), digest_size=16
+    ).digest()
+
+
+class TokenCache:
+    """Bounded LRU of verified payloads, expiring at each token's exp."""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = TOKEN_CACHE_SIZE if max_entries is None else max_entries
+        self._entries = OrderedDict()  # key -> payload
+        self._by_session = {}  # session_id -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key, now=None):
+        """
+        Return the cached payload, or None if absent or expired.
+        """
+        if self.max_entries <= 0:
+            return None
+        now = time.time() if now is None else now
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                if payload.get('exp', 0) <= now:
+                    self._remove(key)
+                    payload = None
+                else:
+                    self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc('token', 'hit' if payload is not None else 'miss')
+        return payload
+
+    def put(self, key, payload):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = payload
+            self._by_session.setdefault(payload.get('session_id'), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def evict_session(self, session_id):
+        """
+        Drop every entry for a session. Returns the number dropped.
+        """
+        with self._lock:
+            keys = self._by_session.pop(session_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_session.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        # Caller holds the lock
+        payload = self._entries.pop(key)
+        keys = self._by_session.get(payload.get('session_id'))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_session[payload.get('session_id')]
+
+
+# The worker's cache
+verified_tokens = TokenCache()
@@ -0,0 +1,301 @@
+"""
+Tracing Module
+Lightweight span tracing for slow-request forensics, exported as
+OTLP-compatible JSON to rotating local files (no collector needed).
+
+Every request records a tree of spans in memory. The spans cover:
+- the request itself
+- database connection checkouts
+- each query, with its statement fingerprint and row count
+- JWT encode and decode
+- mail.send
+
+When the request ends, a tail-based sampler decides whether to keep the
+trace. Requests slower than TRACE_SLOW_MS and server errors are always
+kept; a TRACE_SAMPLE_RATE share of the rest is kept as a baseline.
+Kept traces are appended as one ExportTraceServiceRequest JSON object per
+line to TRACE_DIR/traces-<pid>.jsonl, which rotates by size. The response
+carries X-Trace-Id so a slow request can be found in the files.
+
+An incoming W3C traceparent header is honoured, so traces can be joined
+with a proxy's or client's trace.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import secrets
+import tempfile
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from app.logging_setup import request_id
+
+
+# Configuration
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '1') != '0'
+TRACE_DIR = os.getenv('TRACE_DIR') or os.path.join(tempfile.gettempdir(), 'feedfinder-traces')
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS') or 500)  # Requests at least this slow are always kept
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE') or 0.01)  # Share of other requests kept
+TRACE_MAX_SPANS = 512  # Per trace; later spans are counted but not kept
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES') or 50 * 1024 * 1024)
+TRACE_BACKUP_COUNT = int(os.getenv('TRACE_BACKUP_COUNT') or 5)
+
+SERVICE_NAME = 'feedfinder-backend'
+TRACE_ID_HEADER = 'X-Trace-Id'
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+logger = logging.getLogger(__name__)
+
+_export_logger = logging.getLogger('app.tracing.export')
+_export_logger.propagate = False
+_export_logger.setLevel(logging.INFO)
+_export_pid = None
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns', 'attributes', 'status')
+
+    def __init__(self, trace, name, kind, parent_id, attributes):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = STATUS_OK
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def add(self, key, amount):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def fail(self, error):
+        self.status = STATUS_ERROR
+        self.attributes['exception.type'] = type(error).__name__
+        self.attributes['exception.message'] = str(error)[:500]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.close(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1_000_000
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or self.start_ns),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': self.status},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class Trace:
+    """Spans of one request, held until the sampling decision."""
+
+    def __init__(self, trace_id=None, remote_parent_id=None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.remote_parent_id = remote_parent_id
+        self.spans = []
+        self.dropped = 0
+        self.has_error = False
+        self._open = []
+
+    def start(self, name, kind=KIND_INTERNAL, attributes=None):
+        parent_id = self._open[-1].span_id if self._open else self.remote_parent_id
+        span = Span(self, name, kind, parent_id, attributes or {})
+        self._open.append(span)
+        return span
+
+    def close(self, span):
+        if span in self._open:
+            self._open.remove(span)
+        if span.status == STATUS_ERROR and span.kind == KIND_CLIENT:
+            # A failing dependency (database, SMTP); rejected tokens are not errors
+            self.has_error = True
+        if len(self.spans) < TRACE_MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def to_otlp(self):
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [
+                    _otlp_attribute('service.name', SERVICE_NAME),
+                    _otlp_attribute('process.pid', os.getpid()),
+                ]},
+                'scopeSpans': [{
+                    'scope': {'name': 'app.tracing'},
+                    'spans': [span.to_otlp() for span in self.spans],
+                }],
+            }]
+        }
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def current_trace():
+    """
+    Trace of the current request, or None when not tracing.
+    """
+    if not has_request_context():
+        return None
+    return g.get('trace')
+
+
+def start_span(name, kind=KIND_INTERNAL, attributes=None):
+    """
+    Start a span in the current trace. Returns None when not tracing;
+    callers must end() the span themselves.
+    """
+    trace = current_trace()
+    if trace is None:
+        return None
+    return trace.start(name, kind, attributes)
+
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """
+    Time a block as a span of the current request:
+
+        with span('mail.send', KIND_CLIENT) as s:
+            mail.send(msg)
+    """
+    current = start_span(name, kind, attributes)
+    if current is None:
+        yield None
+        return
+    try:
+        yield current
+    except Exception as e:
+        current.fail(e)
+        raise
+    finally:
+        current.end()
+
+
+def should_keep(trace, root):
+    """
+    Tail-based sampling decision for a finished request.
+    """
+    if root.duration_ms >= TRACE_SLOW_MS:
+        return True
+    if trace.has_error or root.attributes.get('http.status_code', 0) >= 500:
+        return True
+    return random.random() < TRACE_SAMPLE_RATE
+
+
+def _exporter():
+    """
+    Per-process rotating file writer, recreated after fork.
+    """
+    global _export_pid
+    if _export_pid != os.getpid():
+        for handler in list(_export_logger.handlers):
+            _export_logger.removeHandler(handler)
+            handler.close()
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(TRACE_DIR, f"traces-{os.getpid()}.jsonl"),
+            maxBytes=TRACE_MAX_BYTES,
+            backupCount=TRACE_BACKUP_COUNT,
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _export_logger.addHandler(handler)
+        _export_pid = os.getpid()
+    return _export_logger
+
+
+def export(trace):
+    _exporter().info(json.dumps(trace.to_otlp(), separators=(',', ':')))
+
+
+def _start_request():
+    trace_id = remote_parent_id = None
+    match = _TRACEPARENT_RE.match(request.headers.get('traceparent', ''))
+    if match and match.group(1) != '0' * 32:
+        trace_id, remote_parent_id = match.group(1), match.group(2)
+
+    trace = Trace(trace_id, remote_parent_id)
+    g.trace = trace
+    g.trace_root = trace.start(f"{request.method} {request.path}", KIND_SERVER, {
+        'http.method': request.method,
+        # Path only: query strings carry emails and tokens
+        'http.target': request.path,
+    })
+
+
+def _finish_request(response):
+    trace = g.pop('trace', None)
+    root = g.pop('trace_root', None)
+    if trace is None or root is None:
+        return response
+
+    root.name = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+    root.set('http.route', request.url_rule.rule if request.url_rule else '<unmatched>')
+    root.set('http.status_code', response.status_code)
+    root.set('request.id', request_id())
+    if response.status_code >= 500:
+        root.status = STATUS_ERROR
+    root.end()
+    if trace.dropped:
+        root.set('trace.dropped_spans', trace.dropped)
+
+    if should_keep(trace, root):
+        try:
+            export(trace)
+            response.headers[TRACE_ID_HEADER] = trace.trace_id
+        except OSError as e:
+            logger.error("Error exporting trace: %s", e)
+    return response
+
+
+def init_app(app):
+    """
+    Register the request span hooks on a Flask app. Register early so the
+    request span encloses the other hooks.
+    """
+    if not TRACING_ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
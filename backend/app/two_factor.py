@@ -2,13 +2,13 @@
 import random, time
 from flask_mail import Message
 from flask import current_app, session
-from app import mail
+from app import mail_queue
 
 # Generate a 6-digit numeric code
 def generate_2fa_code():
     return str(random.randint(100000, 999999))
 
-# Send the code to user's email
+# Queue the code for the user's email; the request does not wait on SMTP
 def send_2fa_email(recipient_email, code):
     msg = Message(
         subject="Your 2FA Verification Code",
@@ -16,7 +16,8 @@ def send_2fa_email(recipient_email, code):
         body=f"Your verification code is: {code}\n\nThis code will expire in 5 minutes.",
         sender=current_app.config['MAIL_USERNAME']
     )
-    mail.send(msg)
+    # Dropped unsent once the code has expired (see verify_2fa_code)
+    mail_queue.enqueue(msg, expires_in=300)
 
 # Create and send code, then store it in session
 def initiate_2fa(email):
@@ -0,0 +1,172 @@
+"""
+User Directory Module
+Per-worker cache of user rows read on hot paths: the username for a token
+refresh, and the role checked by require_auth and require_admin.
+
+Entries expire after USER_DIRECTORY_TTL seconds. Routes that change a
+cached column (profile updates, admin role changes) call
+record_change(cursor) in their transaction and invalidate(user_id) after
+committing. record_change bumps a shared counter in user_directory_version.
+Every worker reads the counter at most once per
+USER_DIRECTORY_VERSION_INTERVAL seconds and drops its whole cache when the
+counter has moved. A role demotion therefore reaches all workers within
+that interval, and changes made outside the app within the TTL.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.db import get_db_connection
+from app.metrics import CACHE_REQUESTS
+
+
+# Configuration
+USER_DIRECTORY_TTL = float(os.getenv('USER_DIRECTORY_TTL') or 60)  # Seconds; 0 disables the cache
+USER_DIRECTORY_SIZE = int(os.getenv('USER_DIRECTORY_SIZE') or 10000)  # Users per worker
+USER_DIRECTORY_VERSION_INTERVAL = float(os.getenv('USER_DIRECTORY_VERSION_INTERVAL') or 2)  # Seconds between version checks
+
+USER_COLUMNS = ('user_id', 'user_name', 'user_role', 'is_active', 'is_private')
+USER_ROW_SQL = f"SELECT {', '.join(USER_COLUMNS)} FROM user WHERE user_id = %s"
+VERSION_SQL = "SELECT version FROM user_directory_version WHERE id = 1"
+BUMP_VERSION_SQL = "UPDATE user_directory_version SET version = version + 1 WHERE id = 1"
+
+logger = logging.getLogger(__name__)
+
+
+def load_user(user_id):
+    """
+    Read a user's directory row from the database, or None.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    try:
+        db_query = connection.cursor(dictionary=True)
+        db_query.execute(USER_ROW_SQL, (user_id,))
+        user = db_query.fetchone()
+        db_query.close()
+        return user
+    finally:
+        connection.close()
+
+
+def load_version():
+    """
+    Read the shared directory version, or None if it cannot be read.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    try:
+        db_query = connection.cursor()
+        db_query.execute(VERSION_SQL)
+        row = db_query.fetchone()
+        db_query.close()
+        return row[0] if row else None
+    finally:
+        connection.close()
+
+
+def record_change(db_query):
+    """
+    Bump the shared directory version using the caller's cursor, so every
+    worker drops its cached rows once the caller commits.
+    """
+    db_query.execute(BUMP_VERSION_SQL)
+
+
+class UserDirectory:
+    """Bounded LRU of user rows with a TTL."""
+
+    def __init__(self, ttl=None, max_entries=None, version_interval=None):
+        self.ttl = USER_DIRECTORY_TTL if ttl is None else ttl
+        self.max_entries = USER_DIRECTORY_SIZE if max_entries is None else max_entries
+        self.version_interval = USER_DIRECTORY_VERSION_INTERVAL if version_interval is None else version_interval
+        self._entries = OrderedDict()  # user_id -> (loaded_at, row)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = None
+        self._version_lock = threading.Lock()
+
+    def get(self, user_id, now=None):
+        """
+        Return the user's row, loading it on a miss. None if the user does
+        not exist or the database cannot be reached. Treat the row as read-only.
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return load_user(user_id)
+        now = time.monotonic() if now is None else now
+        self._check_version(now)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                CACHE_REQUESTS.inc('user', 'hit')
+                return entry[1]
+        CACHE_REQUESTS.inc('user', 'miss')
+
+        version = self._version
+        user = load_user(user_id)
+        # Skip caching a row read while the version moved
+        if user is not None and version == self._version:
+            with self._lock:
+                self._entries[user_id] = (now, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return user
+
+    def _check_version(self, now):
+        """
+        Drop every entry when another worker has recorded a change.
+        """
+        if self._version_checked is not None and now - self._version_checked < self.version_interval:
+            return
+        # One thread checks; the others keep using the cache meanwhile
+        if not self._version_lock.acquire(blocking=False):
+            return
+        try:
+            self._version_checked = now
+            try:
+                version = load_version()
+            except Exception as e:
+                logger.error("Error reading user directory version: %s", e)
+                return
+            if version is not None and version != self._version:
+                self._version = version
+                self.clear()
+        finally:
+            self._version_lock.release()
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# The worker's directory
+users = UserDirectory()
+
+
+def get_user(user_id):
+    """
+    Cached directory row for a user, or None.
+    """
+    if not user_id:
+        return None
+    return users.get(user_id)
+
+
+def invalidate(user_id):
+    """
+    Drop a user's cached row after changing it.
+    """
+    users.invalidate(user_id)
@@ -0,0 +1,4 @@
+"""
+Benchmark and load-testing tools for the FeedFinder backend.
+Run from the backend directory, e.g. python -m benchmarks.seed --help
+"""
@@ -0,0 +1,307 @@
+"""
+Endpoint Benchmarks
+Drives the real Flask app through its test client against a seeded MySQL
+database and reports latency percentiles, throughput and database work per
+request for the hot endpoints.
+
+Setup:
+    docker compose -f ../sql_stuff/docker-compose.yml up -d
+    python -m app.migrations
+    python -m benchmarks.seed --scale 0.01 --truncate
+
+Usage:
+    python -m benchmarks.endpoints --iterations 200 --output bench.json
+    python -m benchmarks.endpoints --baseline bench.json     # compare against an earlier run
+
+DB_HOST/DB_PORT/DB_USER/DB_PASSWORD/DB_NAME select the database, exactly as for the app.
+"""
+
+import argparse
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.seed import SEED_PASSWORD, FOLLOWER_SKEW, skewed_id
+
+
+SCENARIOS = ('login', 'verify_session', 'public_feed', 'creator_feed', 'search', 'profile_stats', 'upload')
+
+SEARCH_TERMS = ('coffee', 'sunset', 'travel', 'music', 'cat', 'beach launch', 'garden')
+
+# Smallest valid PNG: signature plus IHDR/IDAT/IEND chunks for a 1x1 image
+TINY_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000b49444154789c6360000200000500017a5eab3f0000000049454e44ae426082'
+)
+
+
+class QueryCounter:
+    """
+    Counts connections and statements opened through mysql.connector.connect
+    while a request runs. Thread-local so concurrent workers don't mix counts.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._original_connect = None
+
+    def reset(self):
+        self._local.connections = 0
+        self._local.queries = 0
+
+    def snapshot(self):
+        return getattr(self._local, 'connections', 0), getattr(self._local, 'queries', 0)
+
+    def install(self):
+        import mysql.connector
+        self._original_connect = mysql.connector.connect
+        counter = self
+
+        def connect(*args, **kwargs):
+            connection = counter._original_connect(*args, **kwargs)
+            counter._local.connections = getattr(counter._local, 'connections', 0) + 1
+            original_cursor = connection.cursor
+
+            def cursor(*c_args, **c_kwargs):
+                real_cursor = original_cursor(*c_args, **c_kwargs)
+                original_execute = real_cursor.execute
+
+                def execute(*e_args, **e_kwargs):
+                    counter._local.queries = getattr(counter._local, 'queries', 0) + 1
+                    return original_execute(*e_args, **e_kwargs)
+
+                real_cursor.execute = execute
+                return real_cursor
+
+            connection.cursor = cursor
+            return connection
+
+        mysql.connector.connect = connect
+
+    def uninstall(self):
+        if self._original_connect:
+            import mysql.connector
+            mysql.connector.connect = self._original_connect
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, wall_seconds):
+    """
+    Reduce (latency_ms, ok, connections, queries) samples to a result row.
+    """
+    latencies = sorted(sample[0] for sample in samples)
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': sum(1 for sample in samples if not sample[1]),
+        'mean_ms': round(sum(latencies) / count, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'throughput_rps': round(count / wall_seconds, 1) if wall_seconds else 0.0,
+        'connections_per_request': round(sum(sample[2] for sample in samples) / count, 2) if count else 0.0,
+        'queries_per_request': round(sum(sample[3] for sample in samples) / count, 2) if count else 0.0,
+    }
+
+
+def access_token_from(response):
+    for header in response.headers.getlist('Set-Cookie'):
+        if header.startswith('access_token='):
+            return header.split(';', 1)[0].split('=', 1)[1]
+    return None
+
+
+class EndpointBench:
+    """
+    Builds one request per scenario call. Each worker thread gets its own
+    test client and logged-in user.
+    """
+
+    def __init__(self, flask_app, users, seed):
+        self.app = flask_app
+        self.users = users
+        self.seed = seed
+        self._local = threading.local()
+        self._worker_ids = itertools.count()
+        self._worker_lock = threading.Lock()
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, 'client'):
+            with self._worker_lock:
+                worker_id = next(self._worker_ids)
+            state.client = self.app.test_client()
+            state.rng = random.Random(f"{self.seed}:{worker_id}")
+            state.user_id = state.rng.randint(2, self.users)
+            state.token = self._login(state, state.user_id)
+        return state
+
+    def _login(self, state, user_id):
+        response = state.client.post('/api/login', json={'username': f"user_{user_id}", 'password': SEED_PASSWORD})
+        return access_token_from(response)
+
+    def _auth(self, state):
+        return {'Authorization': f"Bearer {state.token}"} if state.token else {}
+
+    def login(self):
+        state = self._state()
+        user_id = state.rng.randint(2, self.users)
+        return state.client.post('/api/login', json={'username': f"user_{user_id}", 'password': SEED_PASSWORD})
+
+    def verify_session(self):
+        state = self._state()
+        return state.client.get('/api/verify-session', headers=self._auth(state))
+
+    def public_feed(self):
+        state = self._state()
+        return state.client.get('/api/posts/public?limit=20')
+
+    def creator_feed(self):
+        state = self._state()
+        creator_id = skewed_id(state.rng, self.users, FOLLOWER_SKEW)
+        return state.client.get(f'/api/posts/user/{creator_id}?viewer={state.user_id}', headers=self._auth(state))
+
+    def search(self):
+        state = self._state()
+        term = state.rng.choice(SEARCH_TERMS)
+        return state.client.get('/api/posts/search', query_string={'q': term, 'limit': 50})
+
+    def profile_stats(self):
+        state = self._state()
+        user_id = skewed_id(state.rng, self.users, FOLLOWER_SKEW)
+        return state.client.get(f'/api/profile/{user_id}/stats')
+
+    def upload(self):
+        state = self._state()
+        return state.client.post(
+            '/api/upload',
+            data={'file': (io.BytesIO(TINY_PNG), 'bench.png', 'image/png')},
+            headers=self._auth(state),
+            content_type='multipart/form-data'
+        )
+
+
+def run_scenario(bench, name, iterations, warmup, concurrency, counter):
+    """
+    Run one scenario and return its summary.
+    """
+    action = getattr(bench, name)
+
+    def one_request(_):
+        counter.reset()
+        started = time.perf_counter()
+        response = action()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        connections, queries = counter.snapshot()
+        return elapsed_ms, response.status_code < 400, connections, queries
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(warmup)))
+        started = time.perf_counter()
+        samples = list(pool.map(one_request, range(iterations)))
+        wall_seconds = time.perf_counter() - started
+
+    return summarize(samples, wall_seconds)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(baseline, results):
+    """
+    Print the change in p50/p95/p99 and queries against a baseline run.
+    """
+    print(f"\n{'scenario':<16}{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+            before, after = previous.get(metric, 0), current.get(metric, 0)
+            change = f"{(after - before) / before * 100:+.1f}%" if before else 'n/a'
+            print(f"{name:<16}{metric:<22}{before:>12}{after:>12}{change:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FeedFinder endpoints against a seeded database.")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=200, help="measured requests per scenario")
+    parser.add_argument('--warmup', type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=1, help="worker threads, one test client each")
+    parser.add_argument('--users', type=int, default=10000, help="number of seeded users (matches the seed run)")
+    parser.add_argument('--seed', type=int, default=42, help="random seed for request parameters")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against an earlier JSON result")
+    args = parser.parse_args(argv)
+
+    counter = QueryCounter()
+    counter.install()
+
+    from app import create_app
+    flask_app = create_app({'UPLOAD_FOLDER': tempfile.mkdtemp(prefix='feedfinder-bench-')})
+    bench = EndpointBench(flask_app, args.users, args.seed)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'users': args.users,
+            'seed': args.seed,
+        },
+        'scenarios': {},
+    }
+
+    try:
+        print(f"{'scenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>10}{'errors':>8}")
+        for name in args.scenarios:
+            summary = run_scenario(bench, name, args.iterations, args.warmup, args.concurrency, counter)
+            results['scenarios'][name] = summary
+            print(f"{name:<16}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+                  f"{summary['throughput_rps']:>10.1f}{summary['queries_per_request']:>10.2f}{summary['errors']:>8}")
+    finally:
+        counter.uninstall()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(json.load(f), results)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""
+Synthetic Data Generator
+Seeds a FeedFinder database with production-scale data for load testing and
+query plan work: users, posts, likes, comments, friendships, subscriptions,
+ratings and sessions.
+
+The data is skewed the way social data is: a few users attract most
+followers, a few recent posts go viral and collect most likes. Every table
+draws from its own random stream derived from --seed, so the same seed and
+counts always produce the same rows and benchmark runs stay comparable.
+
+Usage:
+    python -m benchmarks.seed --scale 0.01 --truncate          # ~10k users
+    python -m benchmarks.seed --method load-data               # full scale via LOAD DATA LOCAL INFILE
+    python -m benchmarks.seed --dry-run                        # print row counts only
+
+Every seeded user's password is SEED_PASSWORD.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+# Row counts at --scale 1.0
+DEFAULT_COUNTS = {
+    'user': 1_000_000,
+    'post': 5_000_000,
+    'post_like': 20_000_000,
+    'comment': 5_000_000,
+    'friends': 10_000_000,
+    'subscription': 500_000,
+    'rating': 1_000_000,
+    'sessions': 2_000_000,
+}
+
+# Load order respects foreign keys
+TABLES = ('user', 'post', 'post_like', 'comment', 'friends', 'subscription', 'rating', 'sessions')
+
+COLUMNS = {
+    'user': ('user_id', 'user_name', 'user_email', 'password_hash', 'bio', 'is_private', 'created_at', 'user_role'),
+    'post': ('post_id', 'user_id', 'content_text', 'media_url', 'privacy', 'media_type', 'created_at'),
+    'post_like': ('user_id', 'post_id', 'created_at'),
+    'comment': ('post_id', 'user_id', 'comment_text', 'created_at'),
+    'friends': ('user_id', 'friend_user_id', 'created_at'),
+    'subscription': ('subscriber_id', 'creator_id', 'start_date', 'end_date', 'is_active'),
+    'rating': ('user_id', 'rated_user_id', 'rating_value', 'created_at'),
+    'sessions': ('session_id', 'user_id', 'username', 'ip_address', 'user_agent', 'fingerprint',
+                 'created_at', 'expires_at', 'is_active'),
+}
+
+SEED_PASSWORD = 'Password123!'
+DEFAULT_NOW = datetime(2025, 1, 1, 12, 0, 0)
+HISTORY = timedelta(days=365)
+
+# Higher exponent = heavier skew toward the popular end
+FOLLOWER_SKEW = 3.0
+AUTHOR_SKEW = 2.0
+VIRAL_SKEW = 6.0
+
+WORDS = ('hello', 'sunset', 'coffee', 'launch', 'travel', 'music', 'recipe', 'workout', 'cat', 'city',
+         'weekend', 'photo', 'project', 'friends', 'beach', 'update', 'review', 'garden', 'game', 'art')
+USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+)
+
+
+def table_rng(seed, table):
+    """
+    Independent, reproducible random stream per table.
+    """
+    return random.Random(f"{seed}:{table}")
+
+
+def skewed_id(rng, n, exponent):
+    """
+    Pick an id in 1..n with a power-law bias toward 1.
+    """
+    return min(int(n * rng.random() ** exponent), n - 1) + 1
+
+
+def recent_skewed_id(rng, n, exponent):
+    """
+    Pick an id in 1..n with a power-law bias toward n (the newest rows).
+    """
+    return n - skewed_id(rng, n, exponent) + 1
+
+
+def sentence(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed_password_hash():
+    """
+    One Argon2 hash shared by every seeded user, with a fixed salt so the
+    output is reproducible. Hashing millions of passwords would take days.
+    """
+    from app.hash import ph
+    return ph.hash(SEED_PASSWORD, salt=b'feedfinder-seed!')
+
+
+def generate_users(counts, seed, now, password_hash='x'):
+    rng = table_rng(seed, 'user')
+    for user_id in range(1, counts['user'] + 1):
+        created = now - HISTORY + timedelta(seconds=int(HISTORY.total_seconds() * user_id / counts['user']))
+        yield (
+            user_id,
+            f"user_{user_id}",
+            f"user_{user_id}@example.com",
+            password_hash,
+            sentence(rng, rng.randint(0, 12)),
+            1 if rng.random() < 0.1 else 0,
+            created,
+            'admin' if user_id == 1 else 'normie',
+        )
+
+
+def generate_posts(counts, seed, now):
+    rng = table_rng(seed, 'post')
+    for post_id in range(1, counts['post'] + 1):
+        # post_id order follows created_at order, as with AUTO_INCREMENT
+        created = now - HISTORY + timedelta(seconds=int(HISTORY.total_seconds() * post_id / counts['post']))
+        is_video = rng.random() < 0.15
+        yield (
+            post_id,
+            skewed_id(rng, counts['user'], AUTHOR_SKEW),
+            sentence(rng, rng.randint(3, 30)),
+            f"/uploads/seed_{post_id}.{'mp4' if is_video else 'jpg'}" if rng.random() < 0.6 else None,
+            rng.choices(('public', 'friends', 'exclusive'), weights=(70, 20, 10))[0],
+            'video' if is_video else 'image',
+            created,
+        )
+
+
+def generate_likes(counts, seed, now):
+    """
+    Likes concentrate on a small set of recent viral posts.
+    Duplicate (user, post) pairs are dropped by INSERT IGNORE at load time.
+    """
+    rng = table_rng(seed, 'post_like')
+    for _ in range(counts['post_like']):
+        yield (
+            rng.randint(1, counts['user']),
+            recent_skewed_id(rng, counts['post'], VIRAL_SKEW),
+            now - timedelta(seconds=rng.randint(0, int(HISTORY.total_seconds()))),
+        )
+
+
+def generate_comments(counts, seed, now):
+    rng = table_rng(seed, 'comment')
+    for _ in range(counts['comment']):
+        yield (
+            recent_skewed_id(rng, counts['post'], VIRAL_SKEW),
+            rng.randint(1, counts['user']),
+            sentence(rng, rng.randint(1, 20)),
+            now - timedelta(seconds=rng.randint(0, int(HISTORY.total_seconds()))),
+        )
+
+
+def generate_friends(counts, seed, now):
+    """
+    Follower counts follow a power law: friend_user_id is heavily skewed
+    toward a few celebrity accounts while followers are uniform.
+    """
+    rng = table_rng(seed, 'friends')
+    for _ in range(counts['friends']):
+        follower = rng.randint(1, counts['user'])
+        followed = skewed_id(rng, counts['user'], FOLLOWER_SKEW)
+        if follower == followed:
+            continue
+        yield (follower, followed, now - timedelta(seconds=rng.randint(0, int(HISTORY.total_seconds()))))
+
+
+def generate_subscriptions(counts, seed, now):
+    """
+    Subscriptions go to popular creators. About two thirds have already
+    ended but are still flagged is_active, as the expiry sweeper finds them.
+    """
+    rng = table_rng(seed, 'subscription')
+    for _ in range(counts['subscription']):
+        subscriber = rng.randint(1, counts['user'])
+        creator = skewed_id(rng, counts['user'], FOLLOWER_SKEW)
+        if subscriber == creator:
+            continue
+        start = now - timedelta(days=rng.randint(0, 90), seconds=rng.randint(0, 86399))
+        yield (subscriber, creator, start, start + timedelta(days=30), 1)
+
+
+def generate_ratings(counts, seed, now):
+    rng = table_rng(seed, 'rating')
+    for _ in range(counts['rating']):
+        rater = rng.randint(1, counts['user'])
+        rated = skewed_id(rng, counts['user'], FOLLOWER_SKEW)
+        if rater == rated:
+            continue
+        yield (rater, rated, rng.randint(1, 10), now - timedelta(seconds=rng.randint(0, int(HISTORY.total_seconds()))))
+
+
+def generate_sessions(counts, seed, now):
+    """
+    A mix of live, expired and logged-out sessions, as the purge job sees them.
+    """
+    rng = table_rng(seed, 'sessions')
+    for _ in range(counts['sessions']):
+        user_id = rng.randint(1, counts['user'])
+        created = now - timedelta(seconds=rng.randint(0, 14 * 86400))
+        ip_address = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        yield (
+            f"{rng.getrandbits(256):064x}",
+            user_id,
+            f"user_{user_id}",
+            ip_address,
+            rng.choice(USER_AGENTS),
+            f"{rng.getrandbits(64):016x}",
+            created,
+            created + timedelta(hours=24),
+            0 if rng.random() < 0.2 else 1,
+        )
+
+
+GENERATORS = {
+    'user': generate_users,
+    'post': generate_posts,
+    'post_like': generate_likes,
+    'comment': generate_comments,
+    'friends': generate_friends,
+    'subscription': generate_subscriptions,
+    'rating': generate_ratings,
+    'sessions': generate_sessions,
+}
+
+
+def scaled_counts(scale=1.0, overrides=None):
+    """
+    Row counts for a scale factor, with optional per-table overrides.
+    """
+    counts = {table: max(1, int(count * scale)) for table, count in DEFAULT_COUNTS.items()}
+    counts.update({table: count for table, count in (overrides or {}).items() if count is not None})
+    return counts
+
+
+def multi_row_insert(table, columns, batch):
+    """
+    Build one INSERT IGNORE ... VALUES (...), (...) statement for a batch.
+    """
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    sql = (
+        f"INSERT IGNORE INTO `{table}` ({', '.join(columns)}) VALUES "
+        + ', '.join([placeholders] * len(batch))
+    )
+    params = [value for row in batch for value in row]
+    return sql, params
+
+
+def tsv_value(value):
+    """
+    Format a value for LOAD DATA's default tab-separated format.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    text = str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def load_with_insert(connection, table, rows, batch_size):
+    db_query = connection.cursor()
+    columns = COLUMNS[table]
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db_query.execute(*multi_row_insert(table, columns, batch))
+            total += len(batch)
+            batch = []
+    if batch:
+        db_query.execute(*multi_row_insert(table, columns, batch))
+        total += len(batch)
+    connection.commit()
+    db_query.close()
+    return total
+
+
+def load_with_load_data(connection, table, rows, batch_size):
+    """
+    Write rows to a temporary TSV file and bulk-load it with LOAD DATA LOCAL INFILE.
+    """
+    total = 0
+    with tempfile.NamedTemporaryFile('w', suffix=f'_{table}.tsv', encoding='utf-8', delete=False) as f:
+        path = f.name
+        for row in rows:
+            f.write('\t'.join(tsv_value(value) for value in row) + '\n')
+            total += 1
+    try:
+        db_query = connection.cursor()
+        db_query.execute(
+            f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE `{table}` "
+            f"CHARACTER SET utf8mb4 ({', '.join(COLUMNS[table])})",
+            (path,)
+        )
+        connection.commit()
+        db_query.close()
+    finally:
+        os.remove(path)
+    return total
+
+
+def connect(allow_local_infile=False):
+    """
+    Connect with the same environment variables as app.db.
+    """
+    import mysql.connector
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT") or 3306),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        allow_local_infile=allow_local_infile
+    )
+
+
+def seed_database(connection, counts, seed=42, now=DEFAULT_NOW, method='insert', batch_size=5000,
+                  truncate=False, out=print):
+    """
+    Generate and load every table. Returns {table: (rows, seconds)}.
+    """
+    loader = load_with_load_data if method == 'load-data' else load_with_insert
+    password_hash = seed_password_hash()
+
+    db_query = connection.cursor()
+    db_query.execute("SET FOREIGN_KEY_CHECKS = 0")
+    if truncate:
+        for table in reversed(TABLES):
+            db_query.execute(f"TRUNCATE TABLE `{table}`")
+
+    results = {}
+    try:
+        for table in TABLES:
+            started = time.monotonic()
+            if table == 'user':
+                rows = generate_users(counts, seed, now, password_hash)
+            else:
+                rows = GENERATORS[table](counts, seed, now)
+            loaded = loader(connection, table, rows, batch_size)
+            elapsed = time.monotonic() - started
+            results[table] = (loaded, elapsed)
+            out(f"{table:<13} {loaded:>12,} rows  {elapsed:8.1f}s  {loaded / max(elapsed, 1e-9):>12,.0f} rows/s")
+    finally:
+        db_query.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+    for table in TABLES:
+        db_query.execute(f"ANALYZE TABLE `{table}`")
+        db_query.fetchall()
+    db_query.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a FeedFinder database with synthetic data.")
+    parser.add_argument('--seed', type=int, default=42, help="random seed (same seed = same data)")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every default row count")
+    for table in TABLES:
+        parser.add_argument(f"--{table.replace('_', '-')}", type=int, dest=table,
+                            help=f"row count for {table} (default {DEFAULT_COUNTS[table]:,} x scale)")
+    parser.add_argument('--method', choices=('insert', 'load-data'), default='insert',
+                        help="multi-row INSERT batches or LOAD DATA LOCAL INFILE")
+    parser.add_argument('--batch-size', type=int, default=5000, help="rows per multi-row INSERT")
+    parser.add_argument('--truncate', action='store_true', help="empty the seeded tables first")
+    parser.add_argument('--dry-run', action='store_true', help="print row counts without connecting")
+    args = parser.parse_args(argv)
+
+    counts = scaled_counts(args.scale, {table: getattr(args, table) for table in TABLES})
+
+    if args.dry_run:
+        for table in TABLES:
+            print(f"{table:<13} {counts[table]:>12,} rows")
+        return 0
+
+    connection = connect(allow_local_infile=args.method == 'load-data')
+    try:
+        seed_database(connection, counts, seed=args.seed, method=args.method,
+                      batch_size=args.batch_size, truncate=args.truncate)
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Serialization Benchmarks
+Times jsonify() of 100-row feed pages with Flask's default JSON provider
+against app.json_provider.FastJSONProvider (orjson, and its stdlib fallback).
+The rows look like what mysql-connector returns: datetime created_at,
+Decimal counts and nullable text. No database is needed.
+
+Usage:
+    python -m benchmarks.serialization --rows 100 --iterations 2000
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app import json_provider
+from app.json_provider import FastJSONProvider
+
+
+def feed_rows(count, start=datetime(2024, 1, 1, 12, 0, 0)):
+    """
+    Synthetic feed page shaped like the creator/public feed queries.
+    """
+    return [
+        {
+            'post_id': 100000 - i,
+            'user_id': 1 + i % 37,
+            'user_name': f"creator_{i % 37}",
+            'content_text': f"Post number {i} about coffee, sunsets and travel " * 3,
+            'media_url': f"/uploads/{i:08x}.png" if i % 3 else None,
+            'media_type': 'image' if i % 3 else None,
+            'privacy': ('public', 'followers', 'exclusive')[i % 3],
+            'created_at': start - timedelta(minutes=7 * i),
+            'like_count': Decimal(i * 3 % 500),
+        }
+        for i in range(count)
+    ]
+
+
+def default_rows(rows):
+    """
+    The per-row copy the routes used to do before handing rows to the
+    default provider, which cannot serialize Decimal.
+    """
+    return [
+        dict(row, created_at=row['created_at'].isoformat(), like_count=int(row['like_count']))
+        for row in rows
+    ]
+
+
+def time_jsonify(app, build, iterations):
+    timings = []
+    with app.app_context():
+        for _ in range(iterations):
+            start = time.perf_counter()
+            app.json.response({'success': True, 'posts': build()}).get_data()
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    return {
+        'mean_us': statistics.fmean(timings),
+        'p50_us': timings[len(timings) // 2],
+        'p99_us': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rows = feed_rows(args.rows)
+    app = Flask(__name__)
+
+    app.json = DefaultJSONProvider(app)
+    results = {'default': time_jsonify(app, lambda: default_rows(rows), args.iterations)}
+
+    app.json = FastJSONProvider(app)
+    if json_provider.orjson is not None:
+        results['orjson'] = time_jsonify(app, lambda: rows, args.iterations)
+    with patch.object(json_provider, 'orjson', None):
+        results['stdlib_fallback'] = time_jsonify(app, lambda: rows, args.iterations)
+
+    print(f"jsonify() of {args.rows}-row feed pages, {args.iterations} iterations")
+    print(f"{'provider':<18}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'speedup':>10}")
+    baseline = results['default']['mean_us']
+    for name, stats in results.items():
+        print(f"{name:<18}{stats['mean_us']:>10.1f}{stats['p50_us']:>10.1f}{stats['p99_us']:>10.1f}"
+              f"{baseline / stats['mean_us']:>9.1f}x")
+    return results
+
+
+if __name__ == '__main__':
+    main()
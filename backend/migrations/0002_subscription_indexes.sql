@@ -0,0 +1,10 @@
+-- Active-subscription lookup indexes.
+--
+-- idx_subscription_active turns the exclusive-post visibility check
+-- (subscriber_id = ? AND creator_id = ? AND end_date > NOW() ...) into a
+-- point lookup; the (is_active, end_date) indexes let the expiry sweeper
+-- find expired rows without scanning the whole table.
+
+CREATE INDEX idx_subscription_active ON subscription (subscriber_id, creator_id, end_date);
+CREATE INDEX idx_subscription_expiry ON subscription (is_active, end_date);
+CREATE INDEX idx_membership_expiry ON membership (is_active, end_date);
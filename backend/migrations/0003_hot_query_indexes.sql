@@ -0,0 +1,17 @@
+-- Covering indexes for the hot queries in app/routes.py and app/session_manager.py.
+--
+--   post(privacy, created_at, post_id)  public feed and search:
+--                                       WHERE privacy = 'public' ORDER BY created_at DESC, post_id DESC LIMIT n
+--   post(user_id, created_at)           creator feed, /api/posts/<user_id>, profile post count
+--   post(created_at, post_id)           admin feed: ORDER BY created_at DESC, post_id DESC LIMIT n
+--   rating(user_id, rating_value)       profile stats COUNT/AVG answered from the index alone
+--   sessions(session_id, user_id,       is_session_valid() answered from the index alone,
+--            is_active, expires_at)     without reading the user_agent TEXT column
+--   user(user_name)                     login and registration lookups by username
+
+CREATE INDEX idx_post_privacy_created ON post (privacy, created_at, post_id);
+CREATE INDEX idx_post_user_created ON post (user_id, created_at);
+CREATE INDEX idx_post_created ON post (created_at, post_id);
+CREATE INDEX idx_rating_user_value ON rating (user_id, rating_value);
+CREATE INDEX idx_sessions_validity ON sessions (session_id, user_id, is_active, expires_at);
+CREATE INDEX idx_user_name ON user (user_name);
@@ -0,0 +1,14 @@
+-- Revoked sessions, read by app/revocation.py when STATELESS_ACCESS_TOKENS=1.
+--
+-- invalidate_session() adds one row per session it deactivates. Each worker
+-- polls for rows above the highest revocation_id it has seen, so access tokens
+-- can be checked against an in-memory set instead of the sessions table.
+-- Rows are only needed until the session would have expired anyway.
+
+CREATE TABLE IF NOT EXISTS session_revocation (
+    revocation_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    session_id VARCHAR(255) NOT NULL,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_revocation_expires (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,38 @@
+-- Partition sessions by expiry day, so expired sessions are removed by
+-- dropping whole partitions instead of deleting rows (see app/maintenance.py).
+--
+-- MySQL requires every unique key of a partitioned table to include the
+-- partitioning column, so the primary key becomes (session_id, expires_at).
+-- session_id stays the leading column, and lookups by session_id still use it.
+--
+-- Partitioned InnoDB tables cannot have foreign keys, so the cascade from
+-- user is dropped. The app never deletes users; if one is removed by hand, its
+-- sessions lapse at expires_at like any other.
+--
+-- The table starts with one catch-all partition. The session_partitions job
+-- splits daily partitions off it (pYYYYMMDD holds rows expiring on that day)
+-- and drops each one after its day has passed.
+--
+-- offline: the primary key change and PARTITION BY rebuild the whole sessions
+-- table and block writes to it (logins, logouts, refreshes) until done, which
+-- takes about as long as copying the table. Apply it in a maintenance window
+-- with `python -m app.migrations --offline`.
+
+-- The foreign key's name depends on how the table was created
+SET @drop_sessions_fk = (
+    SELECT IFNULL(CONCAT('ALTER TABLE sessions DROP FOREIGN KEY `', MIN(constraint_name), '`'), 'DO 0')
+    FROM information_schema.referential_constraints
+    WHERE constraint_schema = DATABASE() AND table_name = 'sessions' AND referenced_table_name = 'user'
+);
+
+PREPARE drop_sessions_fk FROM @drop_sessions_fk;
+
+EXECUTE drop_sessions_fk;
+
+DEALLOCATE PREPARE drop_sessions_fk;
+
+ALTER TABLE sessions DROP PRIMARY KEY, ADD PRIMARY KEY (session_id, expires_at);
+
+ALTER TABLE sessions PARTITION BY RANGE (TO_DAYS(expires_at)) (
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
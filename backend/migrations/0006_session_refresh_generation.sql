@@ -0,0 +1,9 @@
+-- Refresh token generation per session, for REFRESH_TOKEN_ROTATION=1.
+--
+-- Each refresh token carries the generation it was issued at. A refresh
+-- advances sessions.refresh_gen with a compare-and-set
+--   UPDATE sessions SET refresh_gen = refresh_gen + 1 WHERE session_id = %s AND refresh_gen = %s ...
+-- so every refresh token works once, and a replayed one ends the session
+-- (see rotate_refresh() in app/session_store.py).
+
+ALTER TABLE sessions ADD COLUMN refresh_gen INT NOT NULL DEFAULT 0;
@@ -0,0 +1,12 @@
+-- Shared version of the cached user directory (see app/user_directory.py).
+--
+-- Routes that change a cached user column bump the counter in their own
+-- transaction. Each worker reads it every few seconds and drops its cached
+-- user rows when it has moved, so role changes reach every worker quickly.
+
+CREATE TABLE IF NOT EXISTS user_directory_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT IGNORE INTO user_directory_version (id, version) VALUES (1, 0);
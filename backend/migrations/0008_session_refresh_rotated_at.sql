@@ -0,0 +1,9 @@
+-- When a session's refresh token was last rotated, for REFRESH_TOKEN_ROTATION=1.
+--
+-- Two requests refreshing with the same token at once (two tabs, a retried
+-- request) both present the old generation. The one that loses the
+-- compare-and-set is not treated as a replay while the rotation is less
+-- than REFRESH_REUSE_GRACE seconds old (see rotate_refresh() in
+-- app/session_store.py).
+
+ALTER TABLE sessions ADD COLUMN refresh_rotated_at DATETIME(3) NULL;
@@ -0,0 +1,10 @@
+-- When each maintenance job last started (see app/maintenance.py).
+--
+-- Every worker runs the scheduler. A worker whose turn comes up takes the
+-- job's advisory lock, and runs the job only if no worker started it within
+-- the job's interval, so each job runs once per interval in total.
+
+CREATE TABLE IF NOT EXISTS maintenance_run (
+    job_name VARCHAR(64) PRIMARY KEY,
+    last_run_at DATETIME(3) NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -4,9 +4,10 @@ Pytest configuration and fixtures for backend tests.
 import pytest
 import os
 import sys
+from contextlib import contextmanager
 from unittest.mock import Mock, patch, MagicMock
 from flask import Flask
-from app import app as flask_app
+from app.query_stats import track
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -14,11 +15,28 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 @pytest.fixture
 def app():
     """Create a test Flask application."""
+    from app import app as flask_app
     flask_app.config['TESTING'] = True
     flask_app.config['SECRET_KEY'] = 'test-secret-key-for-testing-only'
     flask_app.config['WTF_CSRF_ENABLED'] = False
     return flask_app
 
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    """Start every test without verified tokens cached by an earlier one."""
+    from app.token_cache import verified_tokens
+    verified_tokens.clear()
+    yield
+    verified_tokens.clear()
+
+@pytest.fixture(autouse=True)
+def clear_user_directory():
+    """Start every test without user rows cached by an earlier one."""
+    from app.user_directory import users
+    users.clear()
+    yield
+    users.clear()
+
 @pytest.fixture
 def client(app):
     """Create a test client."""
@@ -41,6 +59,29 @@ def mock_db_connection():
     mock_cursor.lastrowid = 1
     return mock_conn, mock_cursor
 
+@pytest.fixture
+def max_queries(mock_db_connection, monkeypatch):
+    """
+    Fail a block that issues more than `limit` statements. mysql.connector.connect
+    is patched to return the mock connection, so the real get_db_connection runs:
+
+        with max_queries(6) as (cursor, stats):
+            client.get('/api/profile/1/stats')
+    """
+    mock_conn, mock_cursor = mock_db_connection
+    monkeypatch.setenv('DB_PORT', os.getenv('DB_PORT') or '3306')
+
+    @contextmanager
+    def check(limit):
+        with patch('mysql.connector.connect', return_value=mock_conn), track() as stats:
+            yield mock_cursor, stats
+        assert stats.queries <= limit, (
+            f"{stats.queries} queries issued, budget is {limit}:\n"
+            + "\n".join(f"  {count}x {shape}" for shape, count in stats.shapes.most_common())
+        )
+
+    return check
+
 @pytest.fixture
 def sample_user():
     """Sample user data for testing."""
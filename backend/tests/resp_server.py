@@ -0,0 +1,179 @@
+"""
+In-process stand-in for a Redis-protocol server, for tests.
+
+Implements the commands app.session_store uses, with key expiry, on a
+thread per connection. Not a Redis implementation: replies only cover the
+cases the app relies on.
+"""
+import socketserver
+import threading
+import time
+from app.resp import encode_command
+
+
+class StandInRespServer:
+    """Serve RESP on 127.0.0.1 on a free port."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+        self.lock = threading.Lock()
+        outer = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                queued = None
+                while True:
+                    args = read_command(self.rfile)
+                    if args is None:
+                        return
+                    name = args[0].upper()
+                    if name == 'MULTI':
+                        queued = []
+                        self.wfile.write(b'+OK\r\n')
+                    elif name == 'EXEC':
+                        replies = [outer.run(command) for command in queued or []]
+                        queued = None
+                        self.wfile.write(b'*%d\r\n%s' % (len(replies), b''.join(replies)))
+                    elif queued is not None:
+                        queued.append(args)
+                        self.wfile.write(b'+QUEUED\r\n')
+                    else:
+                        self.wfile.write(outer.run(args))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        self.url = f"redis://127.0.0.1:{self.port}/0"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _get(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def run(self, args):
+        with self.lock:
+            self.commands.append(args)
+            name, args = args[0].upper(), args[1:]
+            handler = getattr(self, f"cmd_{name.lower()}", None)
+            if handler is None:
+                return b'-ERR unknown command\r\n'
+            return handler(*args)
+
+    def cmd_ping(self):
+        return b'+PONG\r\n'
+
+    def cmd_select(self, db):
+        return b'+OK\r\n'
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        if 'NX' in options and self._get(key) is not None:
+            return b'$-1\r\n'
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if 'EXAT' in options:
+            self.expires[key] = int(options[options.index('EXAT') + 1])
+        return b'+OK\r\n'
+
+    def cmd_get(self, key):
+        return bulk(self._get(key))
+
+    def cmd_hset(self, key, *pairs):
+        value = self._get(key)
+        if value is None:
+            value = self.data[key] = {}
+        added = 0
+        for field, item in zip(pairs[::2], pairs[1::2]):
+            added += field not in value
+            value[field] = item
+        return b':%d\r\n' % added
+
+    def cmd_hincrby(self, key, field, amount):
+        value = self._get(key)
+        if value is None:
+            value = self.data[key] = {}
+        value[field] = str(int(value.get(field, 0)) + int(amount))
+        return b':%d\r\n' % int(value[field])
+
+    def cmd_hget(self, key, field):
+        return bulk((self._get(key) or {}).get(field))
+
+    def cmd_hmget(self, key, *fields):
+        value = self._get(key) or {}
+        return b'*%d\r\n%s' % (len(fields), b''.join(bulk(value.get(field)) for field in fields))
+
+    def cmd_sadd(self, key, *members):
+        value = self._get(key)
+        if value is None:
+            value = self.data[key] = set()
+        added = len(set(members) - value)
+        value.update(members)
+        return b':%d\r\n' % added
+
+    def cmd_srem(self, key, *members):
+        value = self._get(key) or set()
+        removed = len(value & set(members))
+        value.difference_update(members)
+        if key in self.data and not value:
+            del self.data[key]
+            self.expires.pop(key, None)
+        return b':%d\r\n' % removed
+
+    def cmd_smembers(self, key):
+        members = sorted(self._get(key) or ())
+        return b'*%d\r\n%s' % (len(members), b''.join(bulk(m) for m in members))
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += self._get(key) is not None
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return b':%d\r\n' % removed
+
+    def cmd_expireat(self, key, timestamp):
+        if self._get(key) is None:
+            return b':0\r\n'
+        self.expires[key] = int(timestamp)
+        return b':1\r\n'
+
+    def cmd_ttl(self, key):
+        if self._get(key) is None:
+            return b':-2\r\n'
+        if key not in self.expires:
+            return b':-1\r\n'
+        return b':%d\r\n' % round(self.expires[key] - time.time())
+
+
+def bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    return encode_command([value])[4:]
+
+
+def read_command(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+    count = int(line[1:])
+    args = []
+    for _ in range(count):
+        length = int(rfile.readline()[1:])
+        args.append(rfile.read(length + 2)[:-2].decode('utf-8'))
+    return args
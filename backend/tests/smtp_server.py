@@ -0,0 +1,84 @@
+"""
+In-process stand-in for an SMTP server, for tests.
+
+Accepts the commands smtplib sends for a plain (no TLS, no AUTH) session
+and records each connection and message. Addresses in `reject` are refused
+with a permanent 550. Not an MTA: nothing is delivered.
+"""
+import socketserver
+import threading
+
+
+class StandInSmtpServer:
+    """Serve SMTP on 127.0.0.1 on a free port."""
+
+    def __init__(self, reject=()):
+        self.connections = 0
+        self.messages = []  # (mail_from, [rcpt_to], data)
+        self.reject = set(reject)
+        self.lock = threading.Lock()
+        outer = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b'\r\n')
+
+            def handle(self):
+                with outer.lock:
+                    outer.connections += 1
+                self.reply('220 stand-in ESMTP')
+                mail_from, rcpt_to = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command, _, argument = line.decode().strip().partition(' ')
+                    command = command.upper()
+                    if command == 'EHLO':
+                        self.reply('250-stand-in')
+                        self.reply('250 8BITMIME')
+                    elif command in ('HELO', 'NOOP', 'RSET'):
+                        mail_from, rcpt_to = None, []
+                        self.reply('250 OK')
+                    elif command == 'MAIL':
+                        mail_from = argument.partition(':')[2].strip('<> ')
+                        self.reply('250 OK')
+                    elif command == 'RCPT':
+                        address = argument.partition(':')[2].strip('<> ')
+                        if address in outer.reject:
+                            self.reply('550 No such user')
+                        else:
+                            rcpt_to.append(address)
+                            self.reply('250 OK')
+                    elif command == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        data = []
+                        for data_line in self.rfile:
+                            if data_line == b'.\r\n':
+                                break
+                            data.append(data_line)
+                        with outer.lock:
+                            outer.messages.append((mail_from, rcpt_to, b''.join(data)))
+                        mail_from, rcpt_to = None, []
+                        self.reply('250 OK queued')
+                    elif command == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Command not implemented')
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -185,17 +185,13 @@ class TestVerifySessionAPI:
     
     @patch('app.routes.get_token_from_request')
     @patch('app.routes.verify_session_token')
-    @patch('app.routes.get_db_connection')
-    def test_api_verify_session_success(self, mock_db, mock_verify, mock_get_token, client, mock_session_token, sample_user):
+    @patch('app.user_directory.load_version', return_value=None)
+    @patch('app.user_directory.load_user')
+    def test_api_verify_session_success(self, mock_load_user, mock_version, mock_verify, mock_get_token, client, mock_session_token, sample_user):
         """Test successful session verification."""
         mock_get_token.return_value = 'valid-token'
         mock_verify.return_value = (True, mock_session_token, None)
-        
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_cursor.fetchone.return_value = {'user_role': 'normie'}
-        mock_conn.cursor.return_value = mock_cursor
-        mock_db.return_value = mock_conn
+        mock_load_user.return_value = {'user_id': 1, 'user_name': 'testuser', 'user_role': 'normie', 'is_active': 1, 'is_private': 0}
         
         response = client.get('/api/verify-session',
             headers={'Authorization': 'Bearer valid-token'}
@@ -205,4 +201,5 @@ class TestVerifySessionAPI:
         data = json.loads(response.data)
         assert data['success'] is True
         assert 'user' in data
+        assert data['user']['role'] == 'normie'
 
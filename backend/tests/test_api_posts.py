@@ -104,6 +104,29 @@ class TestSearchPostsAPI:
         assert 'long' in data['message'].lower()
 
 
+class TestCreatorPostsAPI:
+    """Test creator posts API endpoint."""
+    
+    @patch('app.routes.has_active_subscription')
+    @patch('app.routes.get_db_connection')
+    def test_creator_posts_uses_cached_subscription_check(self, mock_db, mock_sub, client):
+        """Test that exclusive visibility comes from the subscription lookup, not a subquery."""
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_conn.cursor.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        mock_sub.return_value = True
+        
+        response = client.get('/api/posts/user/1?viewer=2')
+        
+        assert response.status_code == 200
+        mock_sub.assert_called_once_with(2, 1)
+        query, params = mock_cursor.execute.call_args[0]
+        assert 'FROM subscription' not in query
+        assert params[-1] is True
+
+
 class TestCreatePostAPI:
     """Test create post API endpoint."""
     
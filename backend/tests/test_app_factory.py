@@ -0,0 +1,50 @@
+"""
+Tests for the application factory.
+"""
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+import app as app_package
+from app import create_app
+
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestCreateApp:
+    """Test building isolated app instances."""
+
+    def test_instances_are_isolated(self):
+        """Test that two apps keep separate config but serve the same routes."""
+        first = create_app({'TESTING': True, 'UPLOAD_FOLDER': '/tmp/first'})
+        second = create_app({'UPLOAD_FOLDER': '/tmp/second'})
+
+        assert first is not second
+        assert first.config['UPLOAD_FOLDER'] == '/tmp/first'
+        assert second.config['UPLOAD_FOLDER'] == '/tmp/second'
+        assert not second.config['TESTING']
+        assert first.test_client().get('/api/health').status_code == 200
+        assert second.test_client().get('/api/health').status_code == 200
+
+    def test_factory_does_not_start_maintenance(self):
+        """Test that building an app leaves the maintenance scheduler to the workers."""
+        with patch('app.maintenance.start_scheduler') as mock_scheduler:
+            create_app({'TESTING': True})
+        mock_scheduler.assert_not_called()
+
+    def test_default_app_is_shared(self, app):
+        """Test that `from app import app` always returns the same instance."""
+        from app import app as again
+        assert again is app is app_package.app
+
+    def test_submodule_import_does_not_build_app(self):
+        """Test that importing a helper module skips routes and app setup."""
+        code = (
+            "import sys, app.session_manager, app as pkg;"
+            "print(pkg._default_app is None, 'app.routes' in sys.modules, 'flask_mail' in sys.modules)"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+        assert result.stdout.split() == ['True', 'False', 'False']
@@ -0,0 +1,108 @@
+"""
+Tests for response compression.
+"""
+import gzip
+import zlib
+import pytest
+from flask import Response
+from unittest.mock import patch
+from app import compression
+from app.compression import negotiate, compress, stream_compressor
+from app.metrics import COMPRESS_BYTES_IN
+
+
+@pytest.fixture
+def feed_rows(mock_db_connection):
+    """A public feed page large enough to be compressed."""
+    mock_conn, mock_cursor = mock_db_connection
+    mock_cursor.fetchall.return_value = [
+        {
+            'post_id': i,
+            'user_id': 1,
+            'content_text': 'A post about coffee and sunsets',
+            'media_url': None,
+            'media_type': None,
+            'privacy': 'public',
+            'created_at': '2024-01-01',
+            'user_name': 'testuser',
+            'user_email': 'test@example.com',
+        }
+        for i in range(50, 0, -1)
+    ]
+    compression.clear_cache()
+    with patch('app.routes.get_db_connection', return_value=mock_conn):
+        yield
+    compression.clear_cache()
+
+
+class TestNegotiate:
+    """Test Accept-Encoding negotiation."""
+
+    def test_prefers_server_order_on_ties(self):
+        """Test that equal q-values fall back to the server preference."""
+        assert negotiate('gzip, br, zstd', ('zstd', 'br', 'gzip')) == 'zstd'
+        assert negotiate('gzip, br', ('zstd', 'br', 'gzip')) == 'br'
+        assert negotiate('gzip, br', ('gzip',)) == 'gzip'
+
+    def test_q_values_and_wildcard(self):
+        """Test that q-values rank encodings and q=0 refuses one."""
+        assert negotiate('br;q=0.5, gzip;q=0.9', ('br', 'gzip')) == 'gzip'
+        assert negotiate('gzip;q=0', ('gzip',)) is None
+        assert negotiate('*', ('br', 'gzip')) == 'br'
+        assert negotiate('*, br;q=0', ('br', 'gzip')) == 'gzip'
+        assert negotiate('identity', ('gzip',)) is None
+        assert negotiate('', ('gzip',)) is None
+
+    def test_streaming_matches_one_shot(self):
+        """Test that chunked gzip output decompresses to the input."""
+        feed, finish = stream_compressor('gzip', 6)
+        body = b''.join(feed(chunk) for chunk in (b'{"a":', b'1}')) + finish()
+        assert gzip.decompress(body) == b'{"a":1}'
+        assert gzip.decompress(compress(b'x' * 100, 'gzip')) == b'x' * 100
+
+
+class TestCompressionMiddleware:
+    """Test the after_request hook."""
+
+    def test_feed_is_gzipped(self, client, feed_rows, monkeypatch):
+        """Test that a large JSON feed is compressed and reported."""
+        monkeypatch.setattr(compression, 'brotli', None)
+        monkeypatch.setattr(compression, 'zstandard', None)
+        before = COMPRESS_BYTES_IN._values.get(('gzip',), 0)
+
+        response = client.get('/api/posts/public?limit=50', headers={'Accept-Encoding': 'gzip, br'})
+        plain = client.get('/api/posts/public?limit=50')
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert int(response.headers['Content-Length']) < len(plain.data)
+        assert gzip.decompress(response.data) == plain.data
+        assert 'compress;dur=' in response.headers['Server-Timing']
+        assert COMPRESS_BYTES_IN._values[('gzip',)] - before == len(plain.data)
+        assert 'Content-Encoding' not in plain.headers
+
+    def test_identical_bodies_use_cache(self, client, feed_rows):
+        """Test that a repeated body is served from the compressed cache."""
+        first = client.get('/api/posts/public?limit=50', headers={'Accept-Encoding': 'gzip'})
+        second = client.get('/api/posts/public?limit=50', headers={'Accept-Encoding': 'gzip'})
+        assert first.data == second.data
+        assert 'cached' in second.headers['Server-Timing']
+
+    def test_small_responses_untouched(self, client):
+        """Test that bodies under the threshold are sent as-is."""
+        response = client.get('/api/health', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert 'Accept-Encoding' in response.headers['Vary']
+
+    def test_streamed_response(self, app):
+        """Test that streamed bodies are compressed incrementally."""
+        rows = (f'{{"row":{i}}}\n' for i in range(3))
+        with app.test_request_context('/api/export', headers={'Accept-Encoding': 'gzip'}):
+            response = compression._compress_response(Response(rows, mimetype='application/json'))
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        chunks = list(response.response)
+        assert len(chunks) == 4
+        decompressor = zlib.decompressobj(31)
+        assert decompressor.decompress(b''.join(chunks)) == b'{"row":0}\n{"row":1}\n{"row":2}\n'
@@ -1,64 +1,122 @@
 """
 Tests for CSRF protection utilities.
 """
+import time
 import pytest
-from flask import session
-from app.csrf import generate_csrf_token, validate_csrf_token, require_csrf
-from datetime import datetime, timedelta
+from flask import jsonify
+from app.csrf import generate_csrf_token, validate_csrf_token, require_csrf, CSRF_COOKIE, CSRF_TOKEN_LIFETIME
+
+CSRF_ID = 'client-csrf-id'
+
 
 class TestCSRFToken:
     """Test CSRF token generation and validation."""
     
-    def test_generate_csrf_token(self, app, client):
-        """Test that CSRF token is generated and stored in session."""
-        with app.test_request_context():
-            with client.session_transaction() as sess:
-                token = generate_csrf_token()
-                
-                assert token is not None
-                assert isinstance(token, str)
-                assert len(token) > 20
-                assert 'csrf_token' in sess
-                assert sess['csrf_token'] == token
-                assert 'csrf_token_expiry' in sess
-    
-    def test_generate_csrf_token_reuses_existing(self, app, client):
-        """Test that generate_csrf_token reuses existing token."""
-        with app.test_request_context():
-            with client.session_transaction() as sess:
-                token1 = generate_csrf_token()
-                token2 = generate_csrf_token()
-                
-                assert token1 == token2
+    def test_generate_csrf_token(self, app):
+        """Test that CSRF token is an expiry and a signature, with no session state."""
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            from flask import session
+            token = generate_csrf_token()
+            
+            expires, _, signature = token.partition('.')
+            assert abs(int(expires) - (time.time() + CSRF_TOKEN_LIFETIME)) < 5
+            assert len(signature) > 20
+            assert 'csrf_token' not in session
     
-    def test_validate_csrf_token_valid(self, app, client):
+    def test_validate_csrf_token_valid(self, app):
         """Test that valid CSRF token is accepted."""
-        with app.test_request_context():
-            with client.session_transaction() as sess:
-                token = generate_csrf_token()
-                assert validate_csrf_token(token) is True
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            token = generate_csrf_token()
+            assert validate_csrf_token(token) is True
     
-    def test_validate_csrf_token_invalid(self, app, client):
+    def test_validate_csrf_token_invalid(self, app):
         """Test that invalid CSRF token is rejected."""
-        with app.test_request_context():
-            with client.session_transaction() as sess:
-                generate_csrf_token()
-                assert validate_csrf_token("invalid-token") is False
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            expires = generate_csrf_token().partition('.')[0]
+            assert validate_csrf_token("invalid-token") is False
+            assert validate_csrf_token(f"{expires}.forged") is False
+            assert validate_csrf_token(f"{expires}.é") is False
+    
+    def test_validate_csrf_token_other_client(self, app):
+        """Test that a token only matches the csrf_id it was issued for."""
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            token = generate_csrf_token()
+            assert validate_csrf_token(token, csrf_id='someone-else') is False
     
-    def test_validate_csrf_token_missing_session(self, app, client):
-        """Test that validation fails when session has no token."""
+    def test_validate_csrf_token_missing_cookie(self, app):
+        """Test that validation fails when the request has no csrf_id cookie."""
         with app.test_request_context():
             assert validate_csrf_token("any-token") is False
     
-    def test_validate_csrf_token_expired(self, app, client):
+    def test_validate_csrf_token_expired(self, app):
         """Test that expired CSRF token is rejected."""
-        with app.test_request_context():
-            with client.session_transaction() as sess:
-                token = generate_csrf_token()
-                # Set expiry to past
-                sess['csrf_token_expiry'] = (datetime.utcnow() - timedelta(hours=1)).isoformat()
-                
-                assert validate_csrf_token(token) is False
-                # Token should be removed from session
-                assert 'csrf_token' not in sess
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            token = generate_csrf_token(now=time.time() - CSRF_TOKEN_LIFETIME - 60)
+            assert validate_csrf_token(token) is False
+    
+    def test_expiry_is_signed(self, app):
+        """Test that extending the expiry invalidates the signature."""
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            expires, _, signature = generate_csrf_token().partition('.')
+            assert validate_csrf_token(f"{int(expires) + 3600}.{signature}") is False
+
 
+class TestCSRFEndpoint:
+    """Test /api/csrf-token."""
+    
+    def test_new_client_gets_cookie(self, client):
+        """Test that the first call sets the csrf_id cookie the token is bound to."""
+        response = client.get('/api/csrf-token')
+        assert response.status_code == 200
+        cookies = response.headers.getlist('Set-Cookie')
+        assert len(cookies) == 1 and cookies[0].startswith(f'{CSRF_COOKIE}=')
+        assert 'HttpOnly' in cookies[0]
+    
+    def test_existing_client_no_cookie_writes(self, client):
+        """Test that later calls do not rewrite any cookie."""
+        client.set_cookie(CSRF_COOKIE, CSRF_ID)
+        response = client.get('/api/csrf-token')
+        assert response.status_code == 200
+        assert response.headers.getlist('Set-Cookie') == []
+        
+        token = response.get_json()['csrf_token']
+        with client.application.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            assert validate_csrf_token(token)
+
+
+class TestRequireCSRF:
+    """Test the require_csrf decorator."""
+    
+    @pytest.fixture
+    def protected(self):
+        @require_csrf
+        def view():
+            return jsonify({'success': True})
+        return view
+    
+    def call(self, app, protected, method='POST', **kwargs):
+        with app.test_request_context(method=method, **kwargs):
+            response = protected()
+            return response[1] if isinstance(response, tuple) else 200
+    
+    def test_header_token_accepted(self, app, protected):
+        """Test that the X-CSRF-Token header is checked for non-JSON requests too."""
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            token = generate_csrf_token()
+        status = self.call(app, protected, headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}', 'X-CSRF-Token': token})
+        assert status == 200
+    
+    def test_json_body_token_accepted(self, app, protected):
+        """Test that a csrf_token field in a JSON body is accepted."""
+        with app.test_request_context(headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}):
+            token = generate_csrf_token()
+        status = self.call(app, protected, headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}, json={'csrf_token': token})
+        assert status == 200
+    
+    def test_missing_token_rejected(self, app, protected):
+        """Test that a mutating request without a token is rejected."""
+        assert self.call(app, protected, headers={'Cookie': f'{CSRF_COOKIE}={CSRF_ID}'}) == 403
+    
+    def test_safe_methods_skip_check(self, app, protected):
+        """Test that GET requests are not checked."""
+        assert self.call(app, protected, method='GET') == 200
@@ -0,0 +1,55 @@
+"""
+Tests for the endpoint benchmark helpers.
+"""
+import io
+from unittest.mock import MagicMock
+from werkzeug.datastructures import FileStorage
+from benchmarks.endpoints import percentile, summarize, access_token_from, TINY_PNG
+from app.file_validator import validate_uploaded_file
+
+
+class TestSummaries:
+    """Test latency summaries."""
+
+    def test_percentile_nearest_rank(self):
+        """Test nearest-rank percentiles on a known distribution."""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        assert percentile([], 50) == 0.0
+
+    def test_summarize_counts_errors_and_queries(self):
+        """Test that a summary reports errors and per-request DB work."""
+        samples = [(10.0, True, 1, 3), (20.0, True, 1, 3), (30.0, False, 2, 6)]
+        summary = summarize(samples, wall_seconds=0.5)
+        assert summary['requests'] == 3
+        assert summary['errors'] == 1
+        assert summary['p50_ms'] == 20.0
+        assert summary['max_ms'] == 30.0
+        assert summary['throughput_rps'] == 6.0
+        assert summary['connections_per_request'] == 1.33
+        assert summary['queries_per_request'] == 4.0
+
+    def test_summarize_empty(self):
+        """Test that an empty run does not divide by zero."""
+        assert summarize([], 0)['requests'] == 0
+
+
+class TestRequests:
+    """Test request helpers."""
+
+    def test_access_token_from_cookie(self):
+        """Test that the access token is read from Set-Cookie."""
+        response = MagicMock()
+        response.headers.getlist.return_value = [
+            'refresh_token=r; HttpOnly', 'access_token=abc.def; HttpOnly; Path=/'
+        ]
+        assert access_token_from(response) == 'abc.def'
+
+    def test_upload_payload_is_valid_png(self):
+        """Test that the upload scenario sends a file the validator accepts."""
+        upload = FileStorage(io.BytesIO(TINY_PNG), 'bench.png', content_type='image/png')
+        is_valid, error, _ = validate_uploaded_file(upload, 'bench.png', 'image/png')
+        assert is_valid, error
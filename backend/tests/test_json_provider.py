@@ -0,0 +1,132 @@
+"""
+Tests for the orjson-backed JSON provider.
+"""
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+import pytest
+from flask import jsonify
+from app import json_provider
+from app.json_provider import FastJSONProvider
+
+
+ROW = {
+    'post_id': 7,
+    'created_at': datetime(2024, 1, 2, 3, 4, 5),
+    'birthday': date(2000, 2, 29),
+    'like_count': Decimal('12'),
+    'avg_rating': Decimal('4.5'),
+    'blob': b'caf\xc3\xa9',
+    'duration': timedelta(hours=1, minutes=2, seconds=3),
+    'media_url': None,
+}
+
+EXPECTED = {
+    'post_id': 7,
+    'created_at': '2024-01-02T03:04:05+00:00',
+    'birthday': '2000-02-29',
+    'like_count': 12,
+    'avg_rating': 4.5,
+    'blob': 'café',
+    'duration': '01:02:03',
+    'media_url': None,
+}
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def backend(request, monkeypatch):
+    """Run a test against orjson and against the stdlib fallback."""
+    if request.param == 'stdlib':
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    elif json_provider.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+class TestFastJSONProvider:
+    """Test serialization of database row types."""
+
+    def test_app_uses_fast_provider(self, app):
+        """Test that the app is wired to the fast provider."""
+        assert isinstance(app.json, FastJSONProvider)
+
+    def test_row_types(self, app, backend):
+        """Test that datetime, Decimal, bytes and timedelta serialize natively."""
+        with app.app_context():
+            response = jsonify([ROW])
+        assert response.mimetype == 'application/json'
+        assert json.loads(response.get_data()) == [EXPECTED]
+
+    def test_keys_sorted_and_compact(self, app, backend):
+        """Test that output matches the default provider's key order."""
+        with app.app_context():
+            body = jsonify({'b': 1, 'a': [1, 2]}).get_data(as_text=True)
+        assert body == '{"a":[1,2],"b":1}'
+
+    def test_dumps_and_loads_round_trip(self, app, backend):
+        """Test the dumps/loads API used by Flask internals."""
+        text = app.json.dumps({'when': datetime(2024, 1, 1), 'n': Decimal('1.25')})
+        assert app.json.loads(text) == {'n': 1.25, 'when': '2024-01-01T00:00:00+00:00'}
+        assert app.json.loads(b'{"x": 1}') == {'x': 1}
+
+    def test_aware_datetime_keeps_offset(self, app, backend):
+        """Test that only naive datetimes are taken as UTC."""
+        when = datetime(2024, 1, 1, 12, tzinfo=timezone(timedelta(hours=2)))
+        assert app.json.loads(app.json.dumps({'when': when})) == {'when': '2024-01-01T12:00:00+02:00'}
+
+    def test_unserializable_raises(self, app, backend):
+        """Test that unknown types still fail loudly."""
+        with pytest.raises(TypeError):
+            app.json.dumps({'x': object()})
+
+
+class TestPostRoutes:
+    """Test that post routes return rows without per-row copies."""
+
+    def test_creator_posts_iso_dates(self, client, mock_db_connection):
+        """Test that creator posts serialize created_at as ISO 8601."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchall.return_value = [{
+            'post_id': 1,
+            'content_text': 'hello',
+            'media_url': None,
+            'privacy': 'public',
+            'created_at': datetime(2024, 5, 6, 7, 8, 9),
+            'like_count': 3,
+        }]
+
+        with patch('app.routes.get_db_connection', return_value=mock_conn):
+            response = client.get('/api/posts/user/1')
+
+        assert response.status_code == 200
+        (post,) = response.get_json()
+        assert post['created_at'] == '2024-05-06T07:08:09+00:00'
+        assert post['like_count'] == 3
+
+    def test_admin_posts_iso_dates(self, client, auth_headers, mock_db_connection):
+        """Test that the admin post list serializes rows directly."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchall.return_value = [{
+            'post_id': 1,
+            'user_id': 2,
+            'content_text': 'hello',
+            'media_url': None,
+            'media_type': None,
+            'privacy': 'public',
+            'created_at': datetime(2024, 5, 6, 7, 8, 9),
+            'user_name': 'alice',
+            'user_email': 'alice@example.com',
+        }]
+
+        with patch('app.routes.get_db_connection', return_value=mock_conn), \
+             patch('app.auth_middleware.verify_session_token') as mock_verify, \
+             patch('app.auth_middleware.get_user_role_from_db') as mock_get_role:
+            mock_verify.return_value = (True, {'user_id': 1, 'username': 'admin'}, None)
+            mock_get_role.return_value = 'admin'
+            response = client.get('/api/admin/posts', headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['count'] == 1
+        assert data['posts'][0]['created_at'] == '2024-05-06T07:08:09+00:00'
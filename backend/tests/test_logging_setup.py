@@ -0,0 +1,153 @@
+"""
+Tests for structured logging and request correlation ids.
+"""
+import io
+import json
+import logging
+import queue
+import sys
+from unittest.mock import patch
+from app import logging_setup
+from app.logging_setup import (
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    RequestContextFilter,
+    REQUEST_ID_HEADER
+)
+
+
+def make_record(level=logging.ERROR, msg="failed for %s", args=('alice',), exc_info=None):
+    return logging.LogRecord('app.test', level, __file__, 1, msg, args, exc_info)
+
+
+class TestJsonFormatter:
+    """Test the JSON line format."""
+
+    def test_fields_and_extras(self):
+        """Test that a record becomes one JSON object with extras included."""
+        record = make_record()
+        record.request_id = 'abc'
+        line = JsonFormatter().format(record)
+
+        entry = json.loads(line)
+        assert '\n' not in line
+        assert entry['level'] == 'ERROR'
+        assert entry['logger'] == 'app.test'
+        assert entry['msg'] == 'failed for alice'
+        assert entry['request_id'] == 'abc'
+
+    def test_exception_included(self):
+        """Test that tracebacks are kept in a single field."""
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            record = make_record(exc_info=sys.exc_info())
+        entry = json.loads(JsonFormatter().format(record))
+        assert 'ValueError: bad' in entry['exc']
+
+
+class TestQueueHandler:
+    """Test the non-blocking hand-off to the writer thread."""
+
+    def test_message_rendered_before_queueing(self):
+        """Test that args are merged and tracebacks rendered on the caller's thread."""
+        log_queue = queue.Queue()
+        handler = NonBlockingQueueHandler(log_queue)
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            handler.handle(make_record(exc_info=sys.exc_info()))
+
+        queued = log_queue.get_nowait()
+        assert queued.msg == 'failed for alice'
+        assert queued.args is None
+        assert queued.exc_info is None
+        assert 'RuntimeError: boom' in queued.exc_text
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that a full queue never blocks the request."""
+        log_queue = queue.Queue(maxsize=1)
+        handler = NonBlockingQueueHandler(log_queue)
+        handler.handle(make_record())
+        handler.handle(make_record())
+        assert log_queue.qsize() == 1
+
+    def test_listener_writes_json(self):
+        """Test the full path from logger to stream."""
+        stream = io.StringIO()
+        logging_setup.configure_logging(stream=stream)
+        try:
+            logging.getLogger('app.test').warning("hello %d", 42)
+        finally:
+            logging_setup.shutdown_logging()
+            logging_setup.configure_logging()
+
+        entry = json.loads(stream.getvalue().strip().splitlines()[-1])
+        assert entry['msg'] == 'hello 42'
+        assert entry['level'] == 'WARNING'
+
+
+class TestRequestContext:
+    """Test correlation ids and debug sampling."""
+
+    def test_request_id_generated_and_returned(self, client):
+        """Test that each response carries a generated correlation id."""
+        first = client.get('/api/health').headers[REQUEST_ID_HEADER]
+        second = client.get('/api/health').headers[REQUEST_ID_HEADER]
+        assert len(first) == 32
+        assert first != second
+
+    def test_incoming_request_id_propagated(self, client):
+        """Test that a caller-supplied id is reused."""
+        response = client.get('/api/health', headers={REQUEST_ID_HEADER: 'edge-1234'})
+        assert response.headers[REQUEST_ID_HEADER] == 'edge-1234'
+
+    def test_malformed_request_id_replaced(self, client):
+        """Test that ids that could break log lines are not trusted."""
+        response = client.get('/api/health', headers={REQUEST_ID_HEADER: 'bad id "x"'})
+        assert response.headers[REQUEST_ID_HEADER] != 'bad id "x"'
+
+    def test_filter_adds_request_fields(self, app):
+        """Test that records logged in a request carry its id and path."""
+        with app.test_request_context('/api/login', method='POST', headers={REQUEST_ID_HEADER: 'req-1'}):
+            record = make_record()
+            assert RequestContextFilter().filter(record)
+        assert record.request_id == 'req-1'
+        assert record.method == 'POST'
+        assert record.path == '/api/login'
+
+    def test_debug_sampled_per_request(self, app):
+        """Test that the sampling decision is made once per request."""
+        with app.test_request_context('/'):
+            with patch('app.logging_setup.random.random', return_value=0.99):
+                assert not RequestContextFilter().filter(make_record(level=logging.DEBUG))
+            with patch('app.logging_setup.random.random', return_value=0.0):
+                # Decision already made for this request
+                assert not RequestContextFilter().filter(make_record(level=logging.DEBUG))
+            assert RequestContextFilter().filter(make_record(level=logging.INFO))
+
+        with app.test_request_context('/'):
+            with patch('app.logging_setup.random.random', return_value=0.0):
+                assert RequestContextFilter().filter(make_record(level=logging.DEBUG))
+
+    def test_debug_level_keeps_everything(self, app):
+        """Test that LOG_LEVEL=DEBUG disables sampling."""
+        with app.test_request_context('/'):
+            with patch('app.logging_setup.random.random', return_value=0.99):
+                assert RequestContextFilter(logging.DEBUG).filter(make_record(level=logging.DEBUG))
+
+    def test_sampled_debug_reaches_the_stream(self):
+        """Test that app loggers do not drop DEBUG before sampling."""
+        stream = io.StringIO()
+        logging_setup.configure_logging(level='INFO', stream=stream)
+        try:
+            with patch('app.logging_setup.random.random', return_value=0.0):
+                logging.getLogger('app.routes').debug("sampled")
+            with patch('app.logging_setup.random.random', return_value=0.99):
+                logging.getLogger('app.routes').debug("dropped")
+        finally:
+            logging_setup.shutdown_logging()
+            logging_setup.configure_logging()
+
+        assert 'sampled' in stream.getvalue()
+        assert 'dropped' not in stream.getvalue()
@@ -0,0 +1,191 @@
+"""
+Tests for the outbound mail spool and its sender.
+"""
+import os
+from unittest.mock import patch
+import pytest
+from flask_mail import Message
+from app import create_app, mail, mail_queue
+from app.two_factor import send_2fa_email
+from tests.smtp_server import StandInSmtpServer
+
+SENDER = 'noreply@feedfinder.test'
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    """A private spool directory, without a background sender."""
+    monkeypatch.setattr(mail_queue, 'MAIL_SPOOL_DIR', str(tmp_path))
+    with patch('app.mail_queue.start_sender') as mock_start:
+        yield str(tmp_path), mock_start
+
+
+@pytest.fixture
+def smtp():
+    with StandInSmtpServer(reject={'gone@example.com'}) as server:
+        yield server
+
+
+@pytest.fixture
+def smtp_app(smtp):
+    """An app whose mail goes to the stand-in server."""
+    return create_app({
+        'TESTING': True,
+        'MAIL_SUPPRESS_SEND': False,
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': smtp.port,
+        'MAIL_USE_TLS': False,
+        'MAIL_USERNAME': SENDER,
+        'MAIL_PASSWORD': None,
+    })
+
+
+@pytest.fixture
+def outbox_app():
+    """An app that records mail instead of sending it."""
+    return create_app({'TESTING': True, 'MAIL_USERNAME': SENDER})
+
+
+def queued(spool_dir, state='queue'):
+    return sorted(os.listdir(os.path.join(spool_dir, state)))
+
+
+def message(recipient='alice@example.com', subject='Hello'):
+    return Message(subject=subject, recipients=[recipient], body='Hi', sender=SENDER)
+
+
+class TestEnqueue:
+    """Test that sending mail only writes to the spool."""
+
+    def test_2fa_email_is_queued_not_sent(self, app, spool):
+        """Test that send_2fa_email returns without talking to SMTP."""
+        spool_dir, mock_start = spool
+        with app.test_request_context(), \
+             patch.dict(app.config, {'MAIL_USERNAME': SENDER}), \
+             patch('app.mail_queue.send_now') as mock_send:
+            send_2fa_email('alice@example.com', '123456')
+        mock_send.assert_not_called()
+        mock_start.assert_called_once()
+        (name,) = queued(spool_dir)
+        with open(os.path.join(spool_dir, 'queue', name)) as f:
+            assert '123456' in f.read()
+        assert os.stat(os.path.join(spool_dir, 'queue', name)).st_mode & 0o077 == 0
+
+    def test_unwritable_spool_sends_now(self, app, spool, tmp_path, monkeypatch):
+        """Test that a spool that cannot be written warns once and sends in the request."""
+        blocker = tmp_path / 'file'
+        blocker.write_text('')
+        monkeypatch.setattr(mail_queue, 'MAIL_SPOOL_DIR', str(blocker))
+        with app.test_request_context(), \
+             patch('app.mail_queue.send_now') as mock_send, \
+             patch.object(mail_queue.logger, 'warning') as mock_warning:
+            assert mail_queue.enqueue(message()) is None
+            assert mail_queue.enqueue(message()) is None
+        assert mock_send.call_count == 2
+        mock_warning.assert_called_once()
+
+    def test_default_spool_is_in_instance_folder(self, app, monkeypatch):
+        """Test that without MAIL_SPOOL_DIR the spool lives in the instance folder."""
+        monkeypatch.setattr(mail_queue, 'MAIL_SPOOL_DIR', None)
+        assert mail_queue.spool_path(app) == os.path.join(app.instance_path, 'mail')
+
+
+class TestSender:
+    """Test batched sending over one connection, with retries."""
+
+    def test_batch_uses_one_connection(self, smtp_app, smtp, spool):
+        """Test that a batch of messages is sent over a single SMTP connection."""
+        spool_dir, _ = spool
+        with smtp_app.test_request_context():
+            for i in range(5):
+                mail_queue.enqueue(message(subject=f"Message {i}"))
+        assert mail_queue.send_pending(smtp_app, spool_dir) == 5
+        assert smtp.connections == 1
+        assert len(smtp.messages) == 5
+        assert b'Subject: Message 0' in smtp.messages[0][2]
+        assert queued(spool_dir) == [] and queued(spool_dir, 'sending') == []
+
+    def test_batch_size_limits_a_pass(self, smtp_app, smtp, spool, monkeypatch):
+        """Test that one pass sends at most MAIL_BATCH_SIZE messages."""
+        spool_dir, _ = spool
+        monkeypatch.setattr(mail_queue, 'MAIL_BATCH_SIZE', 2)
+        with smtp_app.test_request_context():
+            for _ in range(3):
+                mail_queue.enqueue(message())
+        assert mail_queue.send_pending(smtp_app, spool_dir) == 2
+        assert len(queued(spool_dir)) == 1
+
+    def test_rejected_recipient_fails_permanently(self, smtp_app, smtp, spool):
+        """Test that a 5xx rejection moves the message to failed/ and the batch goes on."""
+        spool_dir, _ = spool
+        with smtp_app.test_request_context():
+            mail_queue.enqueue(message('gone@example.com'))
+            mail_queue.enqueue(message('alice@example.com'))
+        assert mail_queue.send_pending(smtp_app, spool_dir) == 2
+        assert [m[1] for m in smtp.messages] == [['alice@example.com']]
+        assert len(queued(spool_dir, 'failed')) == 1
+
+    def test_transient_failure_backs_off(self, outbox_app, spool):
+        """Test that a failed send is retried later with a doubling delay."""
+        spool_dir, _ = spool
+        with outbox_app.test_request_context():
+            mail_queue.enqueue(message(), now=1000)
+        with patch('flask_mail.Connection.send', side_effect=ValueError('try again')):
+            assert mail_queue.send_pending(outbox_app, spool_dir, now=1000) == 1
+        (name,) = queued(spool_dir)
+        assert mail_queue._due_at(name) == 1000 + mail_queue.MAIL_RETRY_DELAY
+        assert mail_queue.due_messages(spool_dir, now=1001) == []
+        assert mail_queue.retry_delay(3) == 4 * mail_queue.MAIL_RETRY_DELAY
+        assert mail_queue.retry_delay(100) == mail_queue.MAIL_RETRY_MAX_DELAY
+
+        with outbox_app.app_context(), mail.record_messages() as outbox:
+            assert mail_queue.send_pending(outbox_app, spool_dir, now=1000 + mail_queue.MAIL_RETRY_DELAY) == 1
+        assert len(outbox) == 1
+
+    def test_unreachable_server_keeps_messages(self, smtp_app, spool):
+        """Test that a connection failure leaves the queue untouched."""
+        spool_dir, _ = spool
+        with smtp_app.test_request_context():
+            mail_queue.enqueue(message())
+        with patch('smtplib.SMTP.connect', side_effect=ConnectionRefusedError):
+            assert mail_queue.send_pending(smtp_app, spool_dir) is None
+        assert len(queued(spool_dir)) == 1
+
+    def test_expired_message_is_dropped(self, outbox_app, spool):
+        """Test that an expired 2FA message is not sent."""
+        spool_dir, _ = spool
+        with outbox_app.test_request_context():
+            mail_queue.enqueue(message(), expires_in=300, now=1000)
+        with outbox_app.app_context(), mail.record_messages() as outbox:
+            assert mail_queue.send_pending(outbox_app, spool_dir, now=1301) == 1
+        assert outbox == [] and queued(spool_dir) == []
+
+    def test_abandoned_claim_is_requeued(self, outbox_app, spool):
+        """Test that a message claimed by a dead worker is sent by another one."""
+        spool_dir, _ = spool
+        with outbox_app.test_request_context():
+            mail_queue.enqueue(message())
+        (name,) = queued(spool_dir)
+        assert mail_queue._claim(spool_dir, name) is not None
+        assert mail_queue._claim(spool_dir, name) is None
+
+        later = os.path.getmtime(os.path.join(spool_dir, 'sending', name)) + mail_queue.MAIL_CLAIM_TIMEOUT + 1
+        with outbox_app.app_context(), mail.record_messages() as outbox:
+            assert mail_queue.send_pending(outbox_app, spool_dir, now=later) == 1
+        assert len(outbox) == 1
+
+    def test_unreadable_message_is_failed_once(self, outbox_app, spool):
+        """Test that a spool file with invalid JSON is moved to failed/ and not retried."""
+        spool_dir, _ = spool
+        with outbox_app.test_request_context():
+            mail_queue.enqueue(message(subject='Broken'), now=1000)
+            mail_queue.enqueue(message(subject='Fine'), now=1001)
+        broken = queued(spool_dir)[0]
+        with open(os.path.join(spool_dir, 'queue', broken), 'w', encoding='utf-8') as f:
+            f.write('{"id": ')
+
+        with outbox_app.app_context(), mail.record_messages() as outbox:
+            assert mail_queue.send_pending(outbox_app, spool_dir, now=2000) == 1
+            assert mail_queue.send_pending(outbox_app, spool_dir, now=2000) == 0
+        assert [m.subject for m in outbox] == ['Fine']
+        assert queued(spool_dir, 'failed') == [broken]
@@ -0,0 +1,204 @@
+"""
+Tests for the maintenance scheduler and chunked purges.
+"""
+from datetime import date
+from unittest.mock import MagicMock, patch
+import pytest
+from app import maintenance
+from app.maintenance import (
+    delete_in_batches,
+    purge_expired_sessions,
+    plan_session_partitions,
+    maintain_session_partitions,
+    to_days,
+    run_job,
+    main
+)
+
+TODAY = date(2026, 10, 19)
+
+
+@pytest.fixture
+def db(mock_db_connection):
+    """Route maintenance connections to the mock."""
+    mock_conn, mock_cursor = mock_db_connection
+    with patch('app.maintenance.get_db_connection', return_value=mock_conn):
+        yield mock_conn, mock_cursor
+
+
+def rowcounts(cursor, counts):
+    """Make successive execute() calls report the given rowcounts."""
+    values = iter(counts)
+
+    def execute(*args):
+        cursor.rowcount = next(values)
+    cursor.execute.side_effect = execute
+
+
+class TestDeleteInBatches:
+    """Test bounded, committed batches."""
+
+    def test_runs_until_short_batch(self, db):
+        """Test that full batches repeat with a sleep and a commit each."""
+        mock_conn, mock_cursor = db
+        rowcounts(mock_cursor, [100, 100, 30])
+
+        with patch('app.maintenance.time.sleep') as mock_sleep:
+            report = purge_expired_sessions(batch_size=100, sleep=0.5)
+
+        assert report['rows'] == 230
+        assert report['batches'] == 3
+        assert report['rows_per_second'] > 0
+        assert mock_conn.commit.call_count == 3
+        assert mock_sleep.call_count == 2
+        sql, params = mock_cursor.execute.call_args[0]
+        assert sql == "DELETE FROM sessions WHERE expires_at < NOW() LIMIT %s"
+        assert params == (100,)
+
+    def test_stops_after_max_seconds(self, db):
+        """Test that a long purge yields after its time budget."""
+        _, mock_cursor = db
+        rowcounts(mock_cursor, [100] * 10)
+        report = delete_in_batches("DELETE FROM t LIMIT %s", batch_size=100, sleep=0, max_seconds=0)
+        assert report['batches'] == 1
+
+    def test_unreachable_database(self):
+        """Test that no report is produced without a connection."""
+        with patch('app.maintenance.get_db_connection', return_value=None):
+            assert purge_expired_sessions() is None
+
+
+class TestSessionPartitions:
+    """Test daily partition maintenance of the sessions table."""
+
+    def test_to_days_matches_mysql(self):
+        """Test that to_days agrees with MySQL's TO_DAYS()."""
+        assert to_days(date(2000, 1, 1)) == 730485
+
+    def test_first_run_splits_from_catch_all(self):
+        """Test that daily partitions start at today after the migration."""
+        add, drop = plan_session_partitions([('p_future', None, 500)], TODAY, days_ahead=2)
+        assert add == [date(2026, 10, 19), date(2026, 10, 20), date(2026, 10, 21)]
+        assert drop == []
+
+    def test_drops_past_days_and_extends(self):
+        """Test that partitions are dropped once their day is over."""
+        partitions = [
+            ('p20261017', to_days(date(2026, 10, 18)), 30),
+            ('p20261018', to_days(date(2026, 10, 19)), 40),
+            ('p20261019', to_days(date(2026, 10, 20)), 50),
+            ('p_future', None, 0),
+        ]
+        add, drop = plan_session_partitions(partitions, TODAY, days_ahead=1)
+        assert add == [date(2026, 10, 20)]
+        assert drop == ['p20261017', 'p20261018']
+
+    def test_maintain_issues_ddl(self, db):
+        """Test that new days are split off p_future and old days dropped."""
+        _, mock_cursor = db
+        mock_cursor.fetchall.return_value = [
+            ('p20261018', str(to_days(date(2026, 10, 19))), 40),
+            ('p20261019', str(to_days(date(2026, 10, 20))), 50),
+            ('p_future', 'MAXVALUE', 0),
+        ]
+        report = maintain_session_partitions(today=TODAY, days_ahead=1)
+
+        assert report == {'rows': 40, 'added': 1, 'dropped': 1}
+        statements = [call[0][0] for call in mock_cursor.execute.call_args_list[1:]]
+        assert statements == [
+            "ALTER TABLE sessions REORGANIZE PARTITION p_future INTO "
+            f"(PARTITION p20261020 VALUES LESS THAN ({to_days(date(2026, 10, 21))}), "
+            "PARTITION p_future VALUES LESS THAN MAXVALUE)",
+            "ALTER TABLE sessions DROP PARTITION p20261018",
+        ]
+
+    def test_unpartitioned_table_is_left_alone(self, db):
+        """Test that nothing is altered before migration 0005."""
+        _, mock_cursor = db
+        mock_cursor.fetchall.return_value = []
+        report = maintain_session_partitions(today=TODAY)
+        assert report['partitioned'] is False
+        assert mock_cursor.execute.call_count == 1
+
+    def test_row_purge_skipped_when_partitioned(self):
+        """Test that the row-by-row purge job defers to partition drops."""
+        with patch.object(maintenance, 'sessions_partitioned', return_value=True), \
+             patch.object(maintenance, 'purge_expired_sessions') as mock_purge:
+            assert maintenance._jobs['purge_sessions'].func()['skipped'] == 'partitioned'
+        mock_purge.assert_not_called()
+
+
+class TestRunJob:
+    """Test advisory locking around jobs."""
+
+    def test_runs_under_lock(self, db):
+        """Test that the job runs between GET_LOCK and RELEASE_LOCK."""
+        _, mock_cursor = db
+        mock_cursor.fetchone.return_value = (1,)
+        job = MagicMock(return_value={'rows': 3})
+        with patch.dict(maintenance._jobs, {'demo': maintenance.Job('demo', job, 0)}):
+            assert run_job('demo', batch_size=10) == {'rows': 3}
+
+        job.assert_called_once_with(batch_size=10)
+        statements = [call[0][0] for call in mock_cursor.execute.call_args_list]
+        assert statements[0] == "SELECT GET_LOCK(%s, 0)"
+        assert statements[1].startswith("INSERT INTO maintenance_run")
+        assert statements[2] == "SELECT RELEASE_LOCK(%s)"
+        assert mock_cursor.execute.call_args[0][1] == ('feedfinder:demo',)
+
+    def test_skipped_when_locked_elsewhere(self, db):
+        """Test that a job held by another worker is not run twice."""
+        _, mock_cursor = db
+        mock_cursor.fetchone.return_value = (0,)
+        job = MagicMock()
+        with patch.dict(maintenance._jobs, {'demo': maintenance.Job('demo', job, 0)}):
+            assert run_job('demo') is None
+        job.assert_not_called()
+        assert len(mock_cursor.execute.call_args_list) == 1
+
+    def test_scheduled_run_skipped_when_recent(self, db):
+        """Test that a worker does not repeat a job another worker ran this interval."""
+        mock_conn, mock_cursor = db
+        mock_cursor.fetchone.side_effect = [(1,), (1,), (1,)]
+        job = MagicMock()
+        with patch.dict(maintenance._jobs, {'demo': maintenance.Job('demo', job, 300)}):
+            assert run_job('demo', scheduled=True) is None
+        job.assert_not_called()
+        sql, params = mock_cursor.execute.call_args_list[1][0]
+        assert 'FROM maintenance_run' in sql
+        assert params == (300 - maintenance.MAINTENANCE_TICK, 'demo')
+        assert not any('INSERT' in call[0][0] for call in mock_cursor.execute.call_args_list)
+
+    def test_scheduled_run_when_due(self, db):
+        """Test that a job last run an interval ago, or never, runs and records its start."""
+        mock_conn, mock_cursor = db
+        mock_cursor.fetchone.side_effect = [(1,), None, (1,)]
+        job = MagicMock(return_value={'rows': 0})
+        with patch.dict(maintenance._jobs, {'demo': maintenance.Job('demo', job, 300)}):
+            assert run_job('demo', scheduled=True) == {'rows': 0}
+        job.assert_called_once_with()
+        statements = [call[0][0] for call in mock_cursor.execute.call_args_list]
+        assert statements[2].startswith("INSERT INTO maintenance_run")
+        mock_conn.commit.assert_called_once()
+
+
+class TestCommandLine:
+    """Test the maintenance CLI."""
+
+    def test_list(self, capsys):
+        """Test that the default jobs are listed."""
+        assert main(['--list']) == 0
+        out = capsys.readouterr().out
+        for name in ('purge_sessions', 'session_partitions', 'purge_revocations', 'sweep_subscriptions'):
+            assert name in out
+
+    def test_run_named_job(self, capsys):
+        """Test that a named job is run with the given options."""
+        with patch.object(maintenance, 'run_job', return_value={'rows': 5}) as mock_run:
+            assert main(['purge_sessions', '--batch-size', '50']) == 0
+        mock_run.assert_called_once_with('purge_sessions', batch_size=50)
+        assert "purge_sessions: {'rows': 5}" in capsys.readouterr().out
+
+    def test_unknown_job(self):
+        """Test that unknown job names are rejected."""
+        assert main(['nope']) == 2
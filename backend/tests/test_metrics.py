@@ -0,0 +1,174 @@
+"""
+Tests for the Prometheus metrics module and /api/metrics.
+"""
+import json
+import os
+import pytest
+from unittest.mock import patch
+from app import metrics
+from app.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    mark_process_dead,
+    merge,
+    render,
+    metrics_text,
+    write_snapshot,
+    _registry,
+    HTTP_REQUESTS
+)
+
+
+@pytest.fixture
+def scratch_metrics():
+    """Metrics registered for one test and removed afterwards."""
+    created = []
+
+    def make(cls, name, *args, **kwargs):
+        metric = cls(name, f"{name} help", *args, **kwargs)
+        created.append(name)
+        return metric
+
+    yield make
+    for name in created:
+        _registry.pop(name, None)
+
+
+class TestRendering:
+    """Test the text exposition format."""
+
+    def test_counter_with_labels(self, scratch_metrics):
+        """Test that counters render one line per label set."""
+        counter = scratch_metrics(Counter, 'test_hits_total', ('route',))
+        counter.inc('/a')
+        counter.inc('/a', amount=2)
+        counter.inc('/b"x')
+
+        text = render(merge([({'test_hits_total': counter.snapshot()}, True)]))
+
+        assert '# TYPE test_hits_total counter' in text
+        assert 'test_hits_total{route="/a"} 3' in text
+        assert 'test_hits_total{route="/b\\"x"} 1' in text
+
+    def test_histogram_buckets_are_cumulative(self, scratch_metrics):
+        """Test bucket boundaries, +Inf, sum and count."""
+        histogram = scratch_metrics(Histogram, 'test_latency_seconds', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+
+        text = render(merge([({'test_latency_seconds': histogram.snapshot()}, True)]))
+
+        assert 'test_latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'test_latency_seconds_bucket{le="1.0"} 3' in text
+        assert 'test_latency_seconds_bucket{le="+Inf"} 4' in text
+        assert 'test_latency_seconds_sum 3.65' in text
+        assert 'test_latency_seconds_count 4' in text
+
+
+class TestMultiprocess:
+    """Test merging snapshots from several workers."""
+
+    def test_counters_sum_and_dead_gauges_dropped(self, scratch_metrics):
+        """Test that counters add up and gauges only count live workers."""
+        counter = scratch_metrics(Counter, 'test_requests_total')
+        gauge = scratch_metrics(Gauge, 'test_in_flight')
+        counter.inc(amount=2)
+        gauge.set(1)
+        snapshot = {'test_requests_total': counter.snapshot(), 'test_in_flight': gauge.snapshot()}
+
+        merged = merge([(snapshot, True), (snapshot, False)])
+
+        assert merged['test_requests_total']['values'] == [((), 4)]
+        assert merged['test_in_flight']['values'] == [((), 1)]
+
+    def test_scrape_reads_other_workers(self, tmp_path, scratch_metrics):
+        """Test that a scrape includes snapshot files written by other processes."""
+        counter = scratch_metrics(Counter, 'test_worker_total')
+        counter.inc(amount=5)
+        other = {'test_worker_total': {
+            'type': 'counter', 'help': 'test_worker_total help',
+            'labelnames': [], 'values': [[[], 7]]
+        }}
+        (tmp_path / 'metrics_999999.json').write_text(json.dumps(other))
+
+        text = metrics_text(str(tmp_path))
+
+        assert 'test_worker_total 12' in text
+        assert os.path.exists(tmp_path / f'metrics_{os.getpid()}.json')
+
+    def test_snapshot_written_atomically(self, tmp_path, scratch_metrics):
+        """Test that no temporary file is left behind."""
+        scratch_metrics(Counter, 'test_atomic_total').inc()
+        write_snapshot(str(tmp_path))
+        assert os.listdir(tmp_path) == [f'metrics_{os.getpid()}.json']
+
+    def test_exited_worker_folded(self, tmp_path, scratch_metrics):
+        """Test that an exited worker's file is deleted but its counters still count."""
+        counter = scratch_metrics(Counter, 'test_exited_total')
+        gauge = scratch_metrics(Gauge, 'test_exited_in_flight')
+        snapshot = {'test_exited_total': counter.snapshot(), 'test_exited_in_flight': gauge.snapshot()}
+        snapshot['test_exited_total']['values'] = [[[], 3]]
+        snapshot['test_exited_in_flight']['values'] = [[[], 2]]
+        for pid in (999998, 999999):
+            (tmp_path / f'metrics_{pid}.json').write_text(json.dumps(snapshot))
+
+        mark_process_dead(999998, str(tmp_path))
+        mark_process_dead(999999, str(tmp_path))
+
+        assert not os.path.exists(tmp_path / 'metrics_999998.json')
+        assert not os.path.exists(tmp_path / 'metrics_999999.json')
+        text = metrics_text(str(tmp_path))
+        assert 'test_exited_total 6' in text
+        assert 'test_exited_in_flight 2' not in text
+
+    def test_reused_pid_folded_before_first_write(self, tmp_path, scratch_metrics, monkeypatch):
+        """Test that a stale file under our pid is kept rather than overwritten."""
+        counter = scratch_metrics(Counter, 'test_reused_total')
+        stale = {'test_reused_total': counter.snapshot()}
+        stale['test_reused_total']['values'] = [[[], 4]]
+        (tmp_path / f'metrics_{os.getpid()}.json').write_text(json.dumps(stale))
+        monkeypatch.setattr(metrics, '_snapshot_pid', None)
+        counter.inc()
+
+        assert 'test_reused_total 5' in metrics_text(str(tmp_path))
+
+
+class TestMetricsEndpoint:
+    """Test /api/metrics access and request recording."""
+
+    def test_requires_authentication(self, client):
+        """Test that anonymous scrapes are rejected."""
+        response = client.get('/api/metrics')
+        assert response.status_code == 401
+
+    @patch('app.auth_middleware.verify_session_token')
+    @patch('app.auth_middleware.get_user_role_from_db')
+    def test_requires_admin(self, mock_get_role, mock_verify, client, auth_headers):
+        """Test that non-admin users are rejected."""
+        mock_verify.return_value = (True, {'user_id': 2, 'username': 'u'}, None)
+        mock_get_role.return_value = 'normie'
+        response = client.get('/api/metrics', headers=auth_headers)
+        assert response.status_code == 403
+
+    @patch('app.auth_middleware.verify_session_token')
+    @patch('app.auth_middleware.get_user_role_from_db')
+    def test_admin_scrape(self, mock_get_role, mock_verify, client, auth_headers):
+        """Test that admins get request metrics in text format."""
+        mock_verify.return_value = (True, {'user_id': 1, 'username': 'admin'}, None)
+        mock_get_role.return_value = 'admin'
+        client.get('/api/health')
+
+        response = client.get('/api/metrics', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        text = response.get_data(as_text=True)
+        assert 'feedfinder_http_requests_total{method="GET",route="/api/health",status="200"}' in text
+        assert 'feedfinder_http_request_duration_seconds_bucket{method="GET",route="/api/health",le="+Inf"}' in text
+
+    def test_unmatched_routes_share_a_label(self, client):
+        """Test that 404s do not create one series per URL."""
+        before = HTTP_REQUESTS._values.get(('GET', '<unmatched>', '404'), 0)
+        client.get('/no/such/path/12345')
+        assert HTTP_REQUESTS._values[('GET', '<unmatched>', '404')] == before + 1
@@ -0,0 +1,239 @@
+"""
+Tests for the schema migration runner.
+"""
+import pytest
+from unittest.mock import MagicMock
+from app.migrations import (
+    Migration,
+    MigrationError,
+    load_migrations,
+    get_pending_migrations,
+    plan_statement,
+    migrate,
+    ONLINE_DDL_CLAUSE
+)
+
+
+@pytest.fixture
+def migrations_dir(tmp_path):
+    """A directory with two migrations and a stray file."""
+    (tmp_path / '0002_add_index.sql').write_text(
+        "-- add an index\nCREATE INDEX idx_post_user ON post (user_id);\n"
+    )
+    (tmp_path / '0001_create_table.sql').write_text(
+        "CREATE TABLE IF NOT EXISTS t (id INT PRIMARY KEY);\nINSERT INTO t VALUES (1);\n"
+    )
+    (tmp_path / 'README.txt').write_text("not a migration")
+    return tmp_path
+
+
+def fake_connection(applied=None, existing_indexes=(), tables=('schema_version', 'schema_version_progress'),
+                    progress=None):
+    """Build a mock connection whose cursor answers the runner's queries."""
+    connection = MagicMock()
+    cursor = MagicMock()
+    connection.cursor.return_value = cursor
+    state = {'last': None}
+
+    def execute(sql, params=None):
+        state['last'] = (sql, params)
+
+    def fetchall():
+        return sorted((applied or {}).items())
+
+    def fetchone():
+        sql, params = state['last']
+        if 'information_schema.statistics' in sql:
+            return (1,) if params[1] in existing_indexes else None
+        if 'information_schema.tables' in sql:
+            return (1,) if params[0] in tables else None
+        if 'FROM schema_version_progress' in sql:
+            return (progress or {}).get(params[0])
+        return None
+
+    cursor.execute.side_effect = execute
+    cursor.fetchall.side_effect = fetchall
+    cursor.fetchone.side_effect = fetchone
+    return connection, cursor
+
+
+def executed_sql(cursor):
+    return [call[0][0] for call in cursor.execute.call_args_list]
+
+
+class TestLoadMigrations:
+    """Test migration discovery and parsing."""
+
+    def test_load_orders_by_version(self, migrations_dir):
+        """Test that migrations are ordered by version and stray files ignored."""
+        migrations = load_migrations(str(migrations_dir))
+        assert [m.version for m in migrations] == [1, 2]
+        assert migrations[0].name == 'create_table'
+
+    def test_duplicate_versions_rejected(self, migrations_dir):
+        """Test that two files with the same version are an error."""
+        (migrations_dir / '0002_other.sql').write_text("SELECT 1;")
+        with pytest.raises(MigrationError):
+            load_migrations(str(migrations_dir))
+
+    def test_statements_skip_comments(self, migrations_dir):
+        """Test that comment lines are dropped and statements split."""
+        migrations = load_migrations(str(migrations_dir))
+        assert migrations[0].statements == [
+            "CREATE TABLE IF NOT EXISTS t (id INT PRIMARY KEY)",
+            "INSERT INTO t VALUES (1)"
+        ]
+        assert migrations[1].statements == ["CREATE INDEX idx_post_user ON post (user_id)"]
+
+    def test_repository_migrations_load(self):
+        """Test that the shipped migrations are well formed."""
+        migrations = load_migrations()
+        versions = [m.version for m in migrations]
+        assert versions == sorted(versions)
+        assert versions[0] == 1
+        assert all(m.statements for m in migrations)
+
+    def test_partition_migration_is_offline(self):
+        """Test that the sessions rebuild is marked offline and looks its foreign key up."""
+        offline = [m for m in load_migrations() if m.offline]
+        assert [m.name for m in offline] == ['partition_sessions']
+        assert 'sessions_ibfk_1' not in offline[0].sql
+
+
+class TestPlanStatement:
+    """Test online index handling."""
+
+    def test_create_index_runs_online(self):
+        """Test that index creation gets the online DDL clause."""
+        _, cursor = fake_connection()
+        sql, note = plan_statement(cursor, "CREATE INDEX idx_a ON post (user_id)")
+        assert sql.endswith(ONLINE_DDL_CLAUSE)
+        assert note == 'online'
+
+    def test_existing_index_is_skipped(self):
+        """Test that an index created by hand is adopted rather than recreated."""
+        _, cursor = fake_connection(existing_indexes=('idx_a',))
+        sql, note = plan_statement(cursor, "CREATE INDEX idx_a ON post (user_id)")
+        assert sql is None
+        assert 'already exists' in note
+
+    def test_other_statements_unchanged(self):
+        """Test that non-index statements are run verbatim."""
+        _, cursor = fake_connection()
+        assert plan_statement(cursor, "DROP TABLE t") == ("DROP TABLE t", None)
+
+
+class TestMigrate:
+    """Test applying migrations."""
+
+    def test_checksum_mismatch_is_rejected(self, migrations_dir):
+        """Test that editing an applied migration is detected."""
+        migrations = load_migrations(str(migrations_dir))
+        with pytest.raises(MigrationError):
+            get_pending_migrations(migrations, {1: 'not-the-checksum'})
+
+    def test_unknown_applied_version_is_rejected(self, migrations_dir):
+        """Test that a database ahead of the code is detected."""
+        migrations = load_migrations(str(migrations_dir))
+        with pytest.raises(MigrationError):
+            get_pending_migrations(migrations, {7: 'abc'})
+
+    def test_migrate_applies_pending_in_order(self, migrations_dir):
+        """Test that only pending migrations run and are recorded."""
+        first = load_migrations(str(migrations_dir))[0]
+        connection, cursor = fake_connection(applied={1: first.checksum})
+
+        applied = migrate(connection, directory=str(migrations_dir), out=lambda line: None)
+
+        assert [m.version for m in applied] == [2]
+        sql = executed_sql(cursor)
+        assert any(s.startswith("CREATE INDEX idx_post_user") and s.endswith(ONLINE_DDL_CLAUSE) for s in sql)
+        assert not any(s.startswith("INSERT INTO t") for s in sql)
+        assert any(s.startswith("INSERT INTO schema_version") for s in sql)
+        connection.commit.assert_called()
+
+    def test_dry_run_changes_nothing(self, migrations_dir):
+        """Test that dry-run prints a plan without executing migrations."""
+        connection, cursor = fake_connection()
+        lines = []
+
+        planned = migrate(connection, directory=str(migrations_dir), dry_run=True, out=lines.append)
+
+        assert [m.version for m in planned] == [1, 2]
+        sql = executed_sql(cursor)
+        assert not any(s.startswith(("CREATE INDEX", "INSERT INTO", "CREATE TABLE IF NOT EXISTS t")) for s in sql)
+        assert any('Would apply 0001_create_table' in line for line in lines)
+        assert any(ONLINE_DDL_CLAUSE in line for line in lines)
+
+    def test_dry_run_on_fresh_database_only_reads(self, migrations_dir):
+        """Test that a dry run does not create schema_version."""
+        connection, cursor = fake_connection(tables=())
+
+        planned = migrate(connection, directory=str(migrations_dir), dry_run=True, out=lambda line: None)
+
+        assert [m.version for m in planned] == [1, 2]
+        sql = executed_sql(cursor)
+        assert not any(s.lstrip().startswith(("CREATE", "INSERT", "DELETE")) for s in sql)
+        assert not any("FROM schema_version " in s for s in sql)
+        connection.commit.assert_not_called()
+
+    def test_progress_is_recorded_per_statement(self, migrations_dir):
+        """Test that each statement commits its progress and the row goes once applied."""
+        connection, cursor = fake_connection()
+        migrate(connection, directory=str(migrations_dir), out=lambda line: None)
+
+        progress = [call[0][1] for call in cursor.execute.call_args_list
+                    if call[0][0].startswith("INSERT INTO schema_version_progress")]
+        assert [(version, done) for version, _, done in progress] == [(1, 1), (1, 2), (2, 1)]
+        assert "DELETE FROM schema_version_progress WHERE version = %s" in executed_sql(cursor)
+
+    def test_interrupted_migration_resumes(self, migrations_dir):
+        """Test that statements applied by a failed run are not run again."""
+        first = load_migrations(str(migrations_dir))[0]
+        connection, cursor = fake_connection(progress={1: (first.checksum, 1)})
+
+        migrate(connection, directory=str(migrations_dir), out=lambda line: None)
+
+        sql = executed_sql(cursor)
+        assert not any(s.startswith("CREATE TABLE IF NOT EXISTS t") for s in sql)
+        assert "INSERT INTO t VALUES (1)" in sql
+
+    def test_interrupted_migration_edited_since(self, migrations_dir):
+        """Test that a partly applied file that changed since is left for a human."""
+        connection, _ = fake_connection(progress={1: ('other-checksum', 1)})
+        with pytest.raises(MigrationError):
+            migrate(connection, directory=str(migrations_dir), out=lambda line: None)
+
+    def test_offline_migration_needs_flag(self, migrations_dir):
+        """Test that a run stops before an offline migration unless asked to apply it."""
+        (migrations_dir / '0003_rebuild.sql').write_text("-- offline: rebuilds t\nALTER TABLE t ENGINE=InnoDB;\n")
+        (migrations_dir / '0004_later.sql').write_text("SELECT 1;\n")
+        connection, cursor = fake_connection()
+
+        with pytest.raises(MigrationError, match='--offline'):
+            migrate(connection, directory=str(migrations_dir), out=lambda line: None)
+        sql = executed_sql(cursor)
+        assert "INSERT INTO t VALUES (1)" in sql
+        assert "ALTER TABLE t ENGINE=InnoDB" not in sql and "SELECT 1" not in sql
+
+        connection, cursor = fake_connection()
+        applied = migrate(connection, directory=str(migrations_dir), offline=True, out=lambda line: None)
+        assert [m.version for m in applied] == [1, 2, 3, 4]
+
+    def test_session_state_is_not_a_resume_point(self, tmp_path):
+        """Test that progress is not recorded between SET @var, PREPARE and EXECUTE."""
+        (tmp_path / '0001_dynamic.sql').write_text(
+            "SET @q = 'DO 0';\nPREPARE q FROM @q;\nEXECUTE q;\nDEALLOCATE PREPARE q;\n"
+        )
+        connection, cursor = fake_connection()
+        migrate(connection, directory=str(tmp_path), out=lambda line: None)
+
+        progress = [call[0][1][2] for call in cursor.execute.call_args_list
+                    if call[0][0].startswith("INSERT INTO schema_version_progress")]
+        assert progress == [4]
+
+    def test_up_to_date(self, migrations_dir):
+        """Test that nothing runs when every migration is applied."""
+        migrations = load_migrations(str(migrations_dir))
+        connection, _ = fake_connection(applied={m.version: m.checksum for m in migrations})
+        assert migrate(connection, directory=str(migrations_dir), out=lambda line: None) == []
@@ -0,0 +1,124 @@
+"""
+Tests for on-demand request profiling.
+"""
+import json
+import jwt
+import pytest
+from unittest.mock import patch
+from app import profiler as profiler_module
+from app.profiler import RequestProfiler, categorize, to_speedscope, PROFILE_HEADER
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    """Store profiles in a temporary directory."""
+    monkeypatch.setattr(profiler_module, 'PROFILE_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def as_admin():
+    """Authenticate every request as an admin."""
+    with patch('app.auth_middleware.verify_session_token') as mock_verify, \
+         patch('app.auth_middleware.get_user_role_from_db') as mock_get_role:
+        mock_verify.return_value = (True, {'user_id': 1, 'username': 'admin'}, None)
+        mock_get_role.return_value = 'admin'
+        yield mock_get_role
+
+
+class TestRequestProfiler:
+    """Test stack collection and categories."""
+
+    def test_categorize_uses_innermost_known_frame(self):
+        """Test that a stack is charged to its innermost known module."""
+        assert categorize(('app.routes:login', 'app.hash:verify_password', 'argon2._password_hasher:verify')) == 'argon2'
+        assert categorize(('app.routes:feed', 'mysql.connector.cursor:execute')) == 'db'
+        assert categorize(('app.routes:feed', 'json.encoder:encode', 'builtins:isinstance')) == 'json'
+        assert categorize(('app.routes:feed', 'builtins:len')) == 'other'
+        assert categorize(('jsonschema:validate',)) == 'other'
+
+    def test_profile_splits_time(self):
+        """Test that JWT and JSON work show up in their categories."""
+        def handler():
+            token = jwt.encode({'user_id': 1}, 'secret', algorithm='HS256')
+            return json.dumps({'token': token, 'items': list(range(100))})
+
+        profiler = RequestProfiler()
+        profiler.start()
+        try:
+            handler()
+        finally:
+            profiler.stop()
+
+        categories = profiler.categories()
+        assert categories['jwt'] > 0
+        assert categories['json'] > 0
+        lines = profiler.collapsed()
+        assert any('handler' in line and 'jwt.api_jwt:encode' in line for line in lines)
+        assert all(int(line.rsplit(' ', 1)[1]) >= 1 for line in lines)
+
+    def test_speedscope_conversion(self):
+        """Test that collapsed stacks convert to speedscope frames and weights."""
+        profile = {'id': 'x', 'method': 'GET', 'path': '/p', 'collapsed': ['a;b 30', 'a 10']}
+        data = to_speedscope(profile)
+        assert [f['name'] for f in data['shared']['frames']] == ['a', 'b']
+        assert data['profiles'][0]['samples'] == [[0, 1], [0]]
+        assert data['profiles'][0]['weights'] == [30, 10]
+        assert data['profiles'][0]['endValue'] == 40
+
+
+class TestProfilingRequests:
+    """Test the header-triggered profiling flow."""
+
+    def test_no_header_no_profile(self, client, profile_dir):
+        """Test that ordinary requests are not profiled or authenticated."""
+        with patch('app.profiler._admin_allowed') as mock_allowed:
+            response = client.get('/api/health')
+        mock_allowed.assert_not_called()
+        assert 'X-Profile-Id' not in response.headers
+        assert list(profile_dir.iterdir()) == []
+
+    def test_non_admin_header_ignored(self, client, profile_dir, auth_headers):
+        """Test that the header does nothing without an admin session."""
+        with patch('app.auth_middleware.verify_session_token') as mock_verify, \
+             patch('app.auth_middleware.get_user_role_from_db') as mock_get_role:
+            mock_verify.return_value = (True, {'user_id': 2, 'username': 'u'}, None)
+            mock_get_role.return_value = 'normie'
+            response = client.get('/api/health', headers={**auth_headers, PROFILE_HEADER: '1'})
+
+        assert response.status_code == 200
+        assert 'X-Profile-Id' not in response.headers
+
+    def test_admin_profile_stored_and_downloadable(self, client, profile_dir, auth_headers, as_admin):
+        """Test that an admin gets a profile id and can download the stacks."""
+        response = client.get('/api/health', headers={**auth_headers, PROFILE_HEADER: '1'})
+
+        assert response.status_code == 200
+        profile_id = response.headers['X-Profile-Id']
+        assert 'prof-db;dur=' in response.headers['Server-Timing']
+        assert (profile_dir / f'{profile_id}.json').exists()
+
+        collapsed = client.get(f'/api/admin/profiles/{profile_id}', headers=auth_headers)
+        assert collapsed.status_code == 200
+        assert 'app.routes:api_health' in collapsed.get_data(as_text=True)
+
+        speedscope = client.get(f'/api/admin/profiles/{profile_id}?format=speedscope', headers=auth_headers)
+        assert speedscope.get_json()['profiles'][0]['unit'] == 'microseconds'
+
+        summary = client.get(f'/api/admin/profiles/{profile_id}?format=summary', headers=auth_headers)
+        assert set(summary.get_json()['profile']['categories_ms']) == {'db', 'jwt', 'argon2', 'json', 'other'}
+
+        listing = client.get('/api/admin/profiles', headers=auth_headers).get_json()
+        assert [p['id'] for p in listing['profiles']] == [profile_id]
+
+    def test_unknown_profile(self, client, profile_dir, auth_headers, as_admin):
+        """Test that malformed or missing ids return 404."""
+        assert client.get('/api/admin/profiles/../../etc', headers=auth_headers).status_code == 404
+        assert client.get('/api/admin/profiles/' + 'a' * 32, headers=auth_headers).status_code == 404
+
+    def test_old_profiles_pruned(self, profile_dir, monkeypatch):
+        """Test that only PROFILE_MAX_FILES profiles are kept."""
+        monkeypatch.setattr(profiler_module, 'PROFILE_MAX_FILES', 2)
+        for n in range(3):
+            profiler_module.save_profile({'id': f'{n:032d}', 'created_at': n, 'collapsed': []})
+        assert len(list(profile_dir.iterdir())) == 2
@@ -0,0 +1,233 @@
+"""
+Query plan regression tests.
+
+Runs EXPLAIN on every production query that reads or changes rows by a
+condition (routes, session store, revocation poll, maintenance jobs) against
+a seeded scratch schema and fails when a plan regresses to a full table scan
+or a filesort. Plain INSERTs and the one-row schema bookkeeping of
+app.migrations are left out.
+
+The scratch schema is the base tables from sql_stuff/latestsqlvol.sql plus
+every migration in backend/migrations/, applied through app.migrations.
+
+These tests need a real MySQL server. They are skipped unless
+QUERY_PLAN_TEST_DB names a scratch database that may be dropped and
+recreated; credentials come from the usual DB_HOST/DB_PORT/DB_USER/DB_PASSWORD.
+"""
+import os
+import re
+import random
+from datetime import datetime, timedelta
+import pytest
+from app import maintenance, queries, revocation, session_store, subscriptions, user_directory
+
+pytestmark = pytest.mark.integration
+
+PLAN_TEST_DB = os.getenv('QUERY_PLAN_TEST_DB')
+SQL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'sql_stuff'))
+
+SEED_USERS = 2000
+SEED_POSTS = 20000
+SEED_LIKES = 40000
+
+NOW = datetime(2025, 1, 1, 12, 0, 0)
+
+# (name, statement, params, tables allowed to be fully scanned)
+# Statements are the constants the app executes, so a changed query is
+# checked as it ships.
+PRODUCTION_QUERIES = [
+    ("login_by_username", queries.USER_BY_NAME, ("user_10",), ()),
+    ("register_exists_check", queries.USER_BY_NAME_OR_EMAIL, ("user_10", "user_10@example.com"), ()),
+    ("user_by_id", queries.USER_BY_ID, (10,), ()),
+    ("user_role_by_id", queries.USER_ROLE_BY_ID, (10,), ()),
+    ("set_user_role", queries.SET_USER_ROLE, ('admin', 10), ()),
+    ("user_directory_by_id", user_directory.USER_ROW_SQL, (10,), ()),
+    ("user_directory_version", user_directory.VERSION_SQL, (), ()),
+    ("user_directory_bump", user_directory.BUMP_VERSION_SQL, (), ()),
+    ("profile_by_id", queries.PROFILE_BY_ID, (10,), ()),
+    ("profile_by_email", queries.PROFILE_BY_EMAIL, ("user_10@example.com",), ()),
+    ("profile_email_taken", queries.PROFILE_EMAIL_TAKEN, ("user_10@example.com", 11), ()),
+    ("profile_privacy_for_update", queries.PROFILE_PRIVACY_FOR_UPDATE, (10,), ()),
+    ("stats_post_count", queries.STATS_POST_COUNT, (10,), ()),
+    ("stats_total_likes", queries.STATS_TOTAL_LIKES, (10,), ()),
+    ("stats_total_comments", queries.STATS_TOTAL_COMMENTS, (10,), ()),
+    ("stats_ratings", queries.STATS_RATINGS, (10,), ()),
+    ("stats_followers", queries.STATS_FOLLOWERS, (10,), ()),
+    ("stats_following", queries.STATS_FOLLOWING, (10,), ()),
+    ("creator_posts_own", queries.CREATOR_POSTS_OWN, (10,), ()),
+    ("creator_posts_viewer", queries.CREATOR_POSTS_VIEWER, (10, 11, 10, 10, 11, True), ()),
+    ("creator_posts_public", queries.CREATOR_POSTS_PUBLIC, (10,), ()),
+    ("user_posts", queries.USER_POSTS, (10,), ()),
+    ("public_feed", queries.PUBLIC_FEED, (20,), ()),
+    ("search_posts", queries.SEARCH_POSTS, ("%hello%", 50), ()),
+    ("admin_all_posts", queries.ADMIN_ALL_POSTS, (50,), ()),
+    ("admin_post_exists", queries.POST_OWNER, (10,), ()),
+    ("rating_target_by_email", queries.USER_ID_BY_EMAIL, ("user_10@example.com",), ()),
+    ("rating_by_email", queries.RATING_BY_EMAIL, ("user_10@example.com",), ()),
+    ("session_is_valid", session_store.IS_VALID_SQL, ("session-10", 10), ()),
+    ("session_rotate_refresh", session_store.ROTATE_REFRESH_SQL, ("session-10", 10, 0), ()),
+    ("session_rotated_recently", session_store.ROTATED_RECENTLY_SQL, (0, 5, "session-10", 10), ()),
+    ("session_touch", session_store.touch_sql(3), ("session-1", "session-2", "session-3"), ()),
+    ("session_touch_extend", session_store.touch_sql(3, extend=True),
+     (1800, 86400, "session-1", "session-2", "session-3"), ()),
+    ("session_user_sessions", session_store.USER_SESSIONS_SQL, (10,), ()),
+    ("session_end_user_sessions", session_store.END_USER_SESSIONS_SQL, (10,), ()),
+    ("session_to_end", session_store.SESSION_SQL, ("session-10",), ()),
+    ("session_end", session_store.END_SESSION_SQL, ("session-10",), ()),
+    ("revocation_load", revocation.LOAD_SQL, (), ()),
+    ("revocation_poll", revocation.POLL_SQL, (100, 1000), ()),
+    ("purge_sessions", maintenance.PURGE_SESSIONS_SQL, (1000,), ()),
+    ("purge_revocations", maintenance.PURGE_REVOCATIONS_SQL, (1000,), ()),
+    ("maintenance_ran_recently", maintenance.RAN_RECENTLY_SQL, (299, 'purge_sessions'), ()),
+    ("active_subscription", subscriptions.ACTIVE_SUBSCRIPTION_SQL, (11, 10), ()),
+    ("sweep_subscriptions", subscriptions.DEACTIVATE_EXPIRED_SQL.format(table='subscription'), (500,), ()),
+    ("sweep_memberships", subscriptions.DEACTIVATE_EXPIRED_SQL.format(table='membership'), (500,), ()),
+]
+
+
+def _feedfinder_ddl():
+    """
+    Extract the feedfinder CREATE TABLE statements from the schema dump.
+    """
+    with open(os.path.join(SQL_DIR, 'latestsqlvol.sql'), encoding='utf-8') as f:
+        dump = f.read()
+    section = dump.split('USE `feedfinder`;', 1)[1]
+    statements = re.findall(r'CREATE TABLE `\w+` \(.*?\) ENGINE=[^;]*;', section, re.S)
+    return [re.sub(r' AUTO_INCREMENT=\d+', '', stmt) for stmt in statements]
+
+
+def _seed(cursor):
+    """
+    Insert enough skewed rows that the optimizer makes production-like choices.
+    """
+    rng = random.Random(42)
+
+    cursor.executemany(
+        "INSERT INTO user (user_id, user_name, user_email, password_hash, user_role) VALUES (%s,%s,%s,%s,%s)",
+        [(i, f"user_{i}", f"user_{i}@example.com", "x", 'normie') for i in range(1, SEED_USERS + 1)]
+    )
+
+    posts = []
+    for post_id in range(1, SEED_POSTS + 1):
+        author = min(int(rng.paretovariate(1.2)), SEED_USERS)
+        privacy = rng.choice(('public', 'public', 'friends', 'exclusive'))
+        created = NOW - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        posts.append((post_id, author, f"hello post {post_id}", None, privacy, 'image', created))
+    cursor.executemany(
+        "INSERT INTO post (post_id, user_id, content_text, media_url, privacy, media_type, created_at) "
+        "VALUES (%s,%s,%s,%s,%s,%s,%s)",
+        posts
+    )
+
+    likes = {(rng.randint(1, SEED_USERS), min(int(rng.paretovariate(1.1)), SEED_POSTS)) for _ in range(SEED_LIKES)}
+    cursor.executemany("INSERT INTO post_like (user_id, post_id) VALUES (%s,%s)", sorted(likes))
+
+    cursor.executemany(
+        "INSERT INTO comment (post_id, user_id, comment_text) VALUES (%s,%s,%s)",
+        [(rng.randint(1, SEED_POSTS), rng.randint(1, SEED_USERS), "nice") for _ in range(5000)]
+    )
+
+    friends = {(a, b) for a, b in ((rng.randint(1, SEED_USERS), rng.randint(1, SEED_USERS)) for _ in range(10000)) if a != b}
+    cursor.executemany("INSERT INTO friends (user_id, friend_user_id) VALUES (%s,%s)", sorted(friends))
+
+    cursor.executemany(
+        "INSERT INTO rating (user_id, rated_user_id, rating_value) VALUES (%s,%s,%s)",
+        [(rng.randint(1, SEED_USERS), rng.randint(1, SEED_USERS), rng.randint(1, 10)) for _ in range(5000)]
+    )
+
+    subscriptions = set()
+    for _ in range(5000):
+        subscriptions.add((rng.randint(1, SEED_USERS), rng.randint(1, SEED_USERS), NOW - timedelta(days=rng.randint(0, 90))))
+    cursor.executemany(
+        "INSERT INTO subscription (subscriber_id, creator_id, start_date, end_date, is_active) VALUES (%s,%s,%s,%s,1)",
+        [(s, c, start, start + timedelta(days=30)) for s, c, start in sorted(subscriptions)]
+    )
+    cursor.executemany(
+        "INSERT INTO membership (user_id, membership_type, start_date, end_date, is_active) VALUES (%s,'premium',%s,%s,1)",
+        [(rng.randint(1, SEED_USERS), NOW, NOW + timedelta(days=30)) for _ in range(2000)]
+    )
+
+    cursor.executemany(
+        "INSERT INTO sessions (session_id, user_id, username, ip_address, user_agent, fingerprint, created_at, expires_at, is_active) "
+        "VALUES (%s,%s,%s,'127.0.0.1','pytest','fp',%s,%s,1)",
+        [(f"session-{i}", (i % SEED_USERS) + 1, f"user_{(i % SEED_USERS) + 1}", NOW, NOW + timedelta(days=1))
+         for i in range(10000)]
+    )
+
+    # Revocation queries compare against the real clock
+    utcnow = datetime.utcnow()
+    cursor.executemany(
+        "INSERT INTO session_revocation (session_id, expires_at) VALUES (%s,%s)",
+        [(f"session-{i}", utcnow + timedelta(hours=rng.randint(-24 * 30, 48))) for i in range(5000)]
+    )
+    cursor.executemany(
+        "INSERT INTO maintenance_run (job_name, last_run_at) VALUES (%s,%s)",
+        [(name, utcnow) for name in maintenance._jobs]
+    )
+
+
+@pytest.fixture(scope='module')
+def plan_cursor():
+    """Create, migrate and seed the scratch schema, then yield a cursor on it."""
+    if not PLAN_TEST_DB:
+        pytest.skip("QUERY_PLAN_TEST_DB not set; query plan checks need a scratch MySQL database")
+
+    import mysql.connector
+    from app.migrations import migrate
+
+    connection = mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT") or 3306),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD")
+    )
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute(f"DROP DATABASE IF EXISTS `{PLAN_TEST_DB}`")
+    cursor.execute(f"CREATE DATABASE `{PLAN_TEST_DB}`")
+    connection.database = PLAN_TEST_DB
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+
+    for statement in _feedfinder_ddl():
+        cursor.execute(statement)
+    # The dump predates post.media_type, which every feed query selects
+    cursor.execute("ALTER TABLE post ADD COLUMN media_type VARCHAR(20) DEFAULT 'image'")
+
+    migrate(connection, offline=True, out=lambda line: None)
+
+    _seed(cursor)
+    connection.commit()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    for table in ('user', 'post', 'post_like', 'comment', 'friends', 'rating', 'subscription', 'membership', 'sessions',
+                  'session_revocation', 'maintenance_run'):
+        cursor.execute(f"ANALYZE TABLE `{table}`")
+        cursor.fetchall()
+
+    yield cursor
+
+    cursor.execute(f"DROP DATABASE IF EXISTS `{PLAN_TEST_DB}`")
+    cursor.close()
+    connection.close()
+
+
+class TestQueryPlans:
+    """EXPLAIN every production query and reject full scans and filesorts."""
+
+    @pytest.mark.parametrize(
+        "name,statement,params,allowed_scans",
+        PRODUCTION_QUERIES,
+        ids=[q[0] for q in PRODUCTION_QUERIES]
+    )
+    def test_query_plan(self, plan_cursor, name, statement, params, allowed_scans):
+        """Test that the query plan uses indexes and avoids sorting."""
+        plan_cursor.execute("EXPLAIN " + statement, params)
+        plan = plan_cursor.fetchall()
+        assert plan, f"{name}: EXPLAIN returned no rows"
+
+        for row in plan:
+            table = row.get('table')
+            access = row.get('type')
+            extra = row.get('Extra') or ''
+            assert access != 'ALL' or table in allowed_scans, \
+                f"{name}: full scan of {table} ({extra})"
+            assert 'Using filesort' not in extra, \
+                f"{name}: filesort on {table} ({extra})"
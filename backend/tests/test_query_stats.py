@@ -0,0 +1,125 @@
+"""
+Tests for per-request query statistics and N+1 detection.
+"""
+import pytest
+from unittest.mock import MagicMock
+from app.query_stats import (
+    statement_shape,
+    instrument_connection,
+    track,
+    QueryStats
+)
+
+
+class TestStatementShape:
+    """Test statement normalisation."""
+
+    def test_literals_and_placeholders_collapse(self):
+        """Test that values do not make two statements look different."""
+        first = statement_shape("SELECT * FROM post WHERE user_id = %s AND privacy = 'public'")
+        second = statement_shape("SELECT *  FROM post\n WHERE user_id = 42 AND privacy = 'friends'")
+        assert first == second == "SELECT * FROM post WHERE user_id = ? AND privacy = ?"
+
+    def test_in_lists_collapse(self):
+        """Test that IN lists of any length share a shape."""
+        assert statement_shape("DELETE FROM t WHERE id IN (%s, %s, %s)") == "DELETE FROM t WHERE id IN (?)"
+
+
+class TestInstrumentedConnection:
+    """Test the connection and cursor wrappers."""
+
+    def test_counts_queries_rows_and_connections(self, mock_db_connection):
+        """Test that statements, fetched rows and connections are counted."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchall.return_value = [{'id': 1}, {'id': 2}]
+        mock_cursor.fetchone.return_value = {'id': 3}
+
+        with track() as stats:
+            connection = instrument_connection(mock_conn)
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT id FROM t WHERE a = %s", (1,))
+            cursor.fetchall()
+            cursor.execute("SELECT id FROM t WHERE a = %s", (2,))
+            cursor.fetchone()
+            cursor.close()
+            connection.close()
+
+        assert stats.connections == 1
+        assert stats.queries == 2
+        assert stats.rows == 3
+        assert stats.shapes["SELECT id FROM t WHERE a = ?"] == 2
+        mock_conn.cursor.assert_called_once_with(dictionary=True)
+        mock_cursor.close.assert_called_once()
+        mock_conn.close.assert_called_once()
+
+    def test_failed_query_is_still_counted(self, mock_db_connection):
+        """Test that a statement that raises is recorded."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.execute.side_effect = RuntimeError("boom")
+
+        with track() as stats:
+            cursor = instrument_connection(mock_conn).cursor()
+            with pytest.raises(RuntimeError):
+                cursor.execute("SELECT 1")
+
+        assert stats.queries == 1
+
+    def test_repeated_shapes(self):
+        """Test that only shapes above the threshold are reported."""
+        stats = QueryStats()
+        stats.shapes.update({'SELECT a': 7, 'SELECT b': 2})
+        assert stats.repeated_shapes(5) == [('SELECT a', 7)]
+
+
+class TestRequestReporting:
+    """Test response headers and query budgets."""
+
+    def test_headers_report_db_work(self, client, max_queries):
+        """Test that Server-Timing and X-DB-Queries describe the request."""
+        with max_queries(1):
+            response = client.get('/api/posts/public')
+
+        assert response.status_code == 200
+        assert response.headers['X-DB-Queries'] == '1'
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+        assert '1 queries' in response.headers['Server-Timing']
+
+    def test_headers_disabled(self, app, client, max_queries):
+        """Test that the headers can be switched off, as in production."""
+        app.config['QUERY_STATS_HEADERS'] = False
+        try:
+            with max_queries(1):
+                response = client.get('/api/posts/public')
+        finally:
+            app.config.pop('QUERY_STATS_HEADERS')
+
+        assert 'X-DB-Queries' not in response.headers
+        assert 'Server-Timing' not in response.headers
+
+    def test_profile_stats_query_budget(self, client, max_queries):
+        """Test that the profile stats endpoint stays within its query budget."""
+        with max_queries(6) as (cursor, stats):
+            cursor.fetchone.return_value = {'count': 0, 'average': None}
+            response = client.get('/api/profile/1/stats')
+
+        assert response.status_code == 200
+        assert stats.connections == 1
+
+    def test_budget_exceeded_fails(self, client, max_queries):
+        """Test that going over the budget fails the test."""
+        with pytest.raises(AssertionError, match='budget is 0'):
+            with max_queries(0):
+                client.get('/api/posts/public')
+
+    def test_repeated_statement_logs_warning(self, app, caplog):
+        """Test that an N+1 loop inside a request is reported."""
+        mock_conn = MagicMock()
+
+        with app.test_request_context('/api/example'):
+            cursor = instrument_connection(mock_conn).cursor()
+            for post_id in range(8):
+                cursor.execute("SELECT * FROM comment WHERE post_id = %s", (post_id,))
+            app.process_response(app.response_class())
+
+        assert any('Possible N+1' in record.getMessage() and '8 times' in record.getMessage()
+                   for record in caplog.records)
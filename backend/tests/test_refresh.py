@@ -0,0 +1,161 @@
+"""
+Tests for token refresh: refresh generations and rotation with reuse
+detection.
+"""
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import pytest
+from app import revocation, session_manager, session_store
+from app.resp import RespClient
+from app.session_manager import create_session, generate_refresh_token, refresh_access_token, decode_token
+from app.session_store import MySQLSessionStore, RespSessionStore, ROTATED, GRACE, REUSED, ENDED
+from tests.resp_server import StandInRespServer
+
+ALICE = {'user_id': 1, 'user_name': 'alice', 'user_role': 'normie', 'is_active': 1, 'is_private': 0}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """A RESP session store on a stand-in server, installed as the process store."""
+    with StandInRespServer() as server:
+        client = RespClient.from_url(server.url)
+        resp_store = RespSessionStore(client, prefix='test:')
+        monkeypatch.setattr(session_store, '_store', resp_store)
+        yield resp_store
+        client.close()
+
+
+@pytest.fixture
+def directory():
+    """Serve alice from the directory loader without a database."""
+    with patch('app.user_directory.load_user', return_value=dict(ALICE)) as mock_load, \
+         patch('app.user_directory.load_version', return_value=None):
+        yield mock_load
+
+
+class TestRefreshWithoutDatabase:
+    """Test that a refresh can be served from caches and the session store alone."""
+
+    def test_stateless_refresh(self, app, store, directory):
+        """Test that refresh uses the session store and the directory, not MySQL."""
+        with patch.object(revocation, 'STATELESS_ACCESS_TOKENS', True), \
+             patch.object(revocation, 'is_revoked', return_value=False), \
+             patch('app.session_store.get_db_connection') as mock_db, \
+             app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            _, refresh_token, session_id = create_session(1, 'alice', 'normie', '127.0.0.1', '')
+            for _ in range(3):
+                access_token, new_refresh_token, error = refresh_access_token(refresh_token)
+                assert error is None and new_refresh_token is None
+        mock_db.assert_not_called()
+        assert directory.call_count == 1
+        assert decode_token(access_token)['session_id'] == session_id
+
+    def test_ended_session(self, app, store, directory):
+        """Test that an ended session cannot refresh even after the revocation set forgot it."""
+        with app.test_request_context():
+            _, refresh_token, session_id = create_session(1, 'alice', 'normie', '127.0.0.1', '')
+        store.invalidate(session_id)
+        with patch.object(revocation, 'STATELESS_ACCESS_TOKENS', True), \
+             patch.object(revocation, 'is_revoked', return_value=False), \
+             app.test_request_context():
+            assert refresh_access_token(refresh_token)[2] == "Session not found or invalid"
+            assert session_manager.verify_refresh_token(refresh_token)[0] is False
+
+
+class TestRotation:
+    """Test refresh token rotation with reuse detection."""
+
+    @pytest.fixture(autouse=True)
+    def rotation(self, monkeypatch):
+        monkeypatch.setattr(session_manager, 'REFRESH_TOKEN_ROTATION', True)
+
+    def test_rotation_and_reuse(self, app, store, directory, monkeypatch):
+        """Test that each refresh token works once and a replay ends the session."""
+        monkeypatch.setattr(session_manager, 'REFRESH_REUSE_GRACE', 0)
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            _, first, session_id = create_session(1, 'alice', 'normie', '127.0.0.1', '')
+
+            access_token, second, error = refresh_access_token(first)
+            assert error is None and access_token
+            assert decode_token(second)['gen'] == 1
+            assert decode_token(second)['exp'] == decode_token(first)['exp']
+
+            assert refresh_access_token(second)[1] is not None
+
+            # Replaying the first token ends the session for everyone
+            assert refresh_access_token(first)[2] == "Refresh token reuse detected"
+            assert not store.is_valid(session_id, 1)
+
+    def test_concurrent_refreshes(self, app, store, directory):
+        """Test that two refreshes racing with one token both succeed without ending the session."""
+        with app.test_request_context():
+            _, refresh_token, session_id = create_session(1, 'alice', 'normie', '127.0.0.1', '')
+
+        barrier = threading.Barrier(2)
+        results = []
+
+        def refresh():
+            with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+                barrier.wait()
+                results.append(refresh_access_token(refresh_token))
+
+        threads = [threading.Thread(target=refresh) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [error for _, _, error in results] == [None, None]
+        assert [decode_token(new)['gen'] for _, new, _ in results] == [1, 1]
+        assert store.is_valid(session_id, 1)
+        with app.test_request_context():
+            assert refresh_access_token(results[1][1])[2] is None
+
+    def test_grace_window(self, store):
+        """Test that only the previous generation, and only briefly, gets the grace outcome."""
+        created = datetime.utcnow()
+        store.create('s1', 1, 'alice', '127.0.0.1', '', 'fp', created, created + timedelta(hours=1))
+        assert store.rotate_refresh('s1', 1, 0, grace=5) == ROTATED
+        assert store.rotate_refresh('s1', 1, 0, grace=5) == GRACE
+        assert store.rotate_refresh('s1', 1, 0, grace=0) == REUSED
+        assert store.rotate_refresh('s1', 1, 1, grace=5) == ROTATED
+        assert store.rotate_refresh('s1', 1, 0, grace=5) == REUSED
+
+    def test_ended_session(self, app, store, directory):
+        """Test that a logged-out session cannot rotate."""
+        with app.test_request_context():
+            _, refresh_token, session_id = create_session(1, 'alice', 'normie', '127.0.0.1', '')
+            session_manager.invalidate_session(session_id)
+            assert refresh_access_token(refresh_token)[2] == "Session not found or invalid"
+
+    def test_mysql_compare_and_set(self, mock_db_connection):
+        """Test that MySQL rotation is one conditional UPDATE."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.rowcount = 1
+        with patch('app.session_store.get_db_connection', return_value=mock_conn):
+            assert MySQLSessionStore().rotate_refresh('s1', 1, 3) == ROTATED
+        sql, params = mock_cursor.execute.call_args[0]
+        assert 'SET refresh_gen = refresh_gen + 1' in sql and 'refresh_gen = %s' in sql
+        assert params == ('s1', 1, 3)
+        mock_conn.commit.assert_called_once()
+
+    @pytest.mark.parametrize("recent,outcome", [((1,), GRACE), ((0,), REUSED), ((None,), REUSED), (None, ENDED)])
+    def test_mysql_failed_swap(self, mock_db_connection, recent, outcome):
+        """Test that a failed swap tells a concurrent refresh from a replay and an ended session."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.rowcount = 0
+        mock_cursor.fetchone.return_value = recent
+        with patch('app.session_store.get_db_connection', return_value=mock_conn):
+            assert MySQLSessionStore().rotate_refresh('s1', 1, 3, grace=5) == outcome
+        assert mock_cursor.execute.call_args[0][1] == (3, 5, 's1', 1)
+
+    def test_refresh_route_sets_new_refresh_cookie(self, client):
+        """Test that /api/refresh replaces the refresh cookie when rotating."""
+        client.set_cookie('refresh_token', 'old')
+        with patch('app.routes.refresh_access_token', return_value=('access', 'rotated', None)):
+            response = client.post('/api/refresh')
+        assert response.status_code == 200
+        cookies = response.headers.getlist('Set-Cookie')
+        assert any(cookie.startswith('refresh_token=rotated') for cookie in cookies)
+        assert any(cookie.startswith('access_token=access') for cookie in cookies)
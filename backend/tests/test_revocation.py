@@ -0,0 +1,143 @@
+"""
+Tests for stateless access-token validation with a revocation set.
+"""
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import pytest
+from app import revocation, session_manager
+from app.revocation import RevocationSet
+from app.session_manager import generate_session_token, verify_session_token, invalidate_session
+
+
+@pytest.fixture
+def stateless(monkeypatch):
+    """Enable stateless mode with a fresh, already-synced set and no poller."""
+    revoked = RevocationSet()
+    revoked.synced_at = time.monotonic()
+    monkeypatch.setattr(revocation, 'STATELESS_ACCESS_TOKENS', True)
+    monkeypatch.setattr(revocation, 'revoked_sessions', revoked)
+    monkeypatch.setattr(revocation, '_ensure_poller', lambda: None)
+    return revoked
+
+
+@pytest.fixture
+def token(app):
+    """An access token bound to the test client's fingerprint."""
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+        token, session_id = generate_session_token(1, 'alice', 'normie', '127.0.0.1', '')
+    return token, session_id
+
+
+def verify(app, token):
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+        return verify_session_token(token)
+
+
+class TestRevocationSet:
+    """Test the in-memory set and its sync queries."""
+
+    def test_apply_and_prune(self):
+        """Test that rows advance the watermark and expired entries are dropped."""
+        revoked = RevocationSet()
+        now = time.time()
+        revoked.apply([(3, 'a', now + 60), (7, 'b', now - 1)])
+        assert revoked.watermark == 7
+        assert 'a' in revoked and 'b' in revoked
+        assert revoked.prune(now) == 1
+        assert 'b' not in revoked and len(revoked) == 1
+
+    def test_sync_loads_then_polls_from_watermark(self, mock_db_connection):
+        """Test the initial load and the overlapping watermark poll."""
+        mock_conn, mock_cursor = mock_db_connection
+        future = time.time() + 3600
+        revoked = RevocationSet()
+
+        with patch('app.revocation.get_db_connection', return_value=mock_conn):
+            mock_cursor.fetchall.return_value = [(150, 'a', future)]
+            assert revoked.sync() == 1
+            sql = mock_cursor.execute.call_args[0][0]
+            assert 'WHERE expires_at > UTC_TIMESTAMP()' in sql
+            assert 'UNIX_TIMESTAMP' not in sql
+
+            mock_cursor.fetchall.return_value = [(151, 'b', future)]
+            assert revoked.sync() == 1
+
+        sql, params = mock_cursor.execute.call_args[0]
+        assert 'revocation_id > %s' in sql
+        assert params[0] == 150 - revocation.REVOCATION_POLL_OVERLAP
+        assert revoked.watermark == 151
+        assert revoked.is_fresh()
+
+    def test_unreachable_database_goes_stale(self):
+        """Test that a set that never synced is not trusted."""
+        revoked = RevocationSet()
+        with patch('app.revocation.get_db_connection', return_value=None):
+            assert revoked.sync() is None
+        assert not revoked.is_fresh()
+
+
+class TestStatelessVerification:
+    """Test verify_session_token in stateless mode."""
+
+    def test_valid_token_skips_database(self, app, token, stateless):
+        """Test that an unrevoked token is accepted without a sessions read."""
+        with patch.object(session_manager, 'is_session_valid') as mock_valid:
+            is_valid, payload, error = verify(app, token[0])
+        assert is_valid, error
+        assert payload['session_id'] == token[1]
+        mock_valid.assert_not_called()
+
+    def test_revoked_token_rejected(self, app, token, stateless):
+        """Test that a revoked session is rejected from memory."""
+        stateless.add(token[1], time.time() + 60)
+        with patch.object(session_manager, 'is_session_valid') as mock_valid:
+            is_valid, _, error = verify(app, token[0])
+        assert not is_valid
+        assert error == "Session not found or invalid"
+        mock_valid.assert_not_called()
+
+    def test_stale_set_falls_back_to_database(self, app, token, stateless):
+        """Test that the sessions table is used while the set is stale."""
+        stateless.synced_at = None
+        with patch.object(session_manager, 'is_session_valid', return_value=True) as mock_valid:
+            is_valid, _, _ = verify(app, token[0])
+        assert is_valid
+        mock_valid.assert_called_once_with(token[1], 1)
+
+    def test_default_mode_checks_database(self, app, token):
+        """Test that the sessions table is still read when the mode is off."""
+        with patch.object(session_manager, 'is_session_valid', return_value=False):
+            is_valid, _, _ = verify(app, token[0])
+        assert not is_valid
+
+
+class TestInvalidateSession:
+    """Test that invalidation publishes revocations."""
+
+    def test_logout_records_and_applies_revocations(self, mock_db_connection, stateless):
+        """Test that revoked sessions are inserted and added to the local set."""
+        mock_conn, mock_cursor = mock_db_connection
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        mock_cursor.fetchall.return_value = [('s1', expires_at), ('s2', expires_at)]
+
+        with patch('app.session_store.get_db_connection', return_value=mock_conn):
+            assert invalidate_session('s1', 1)
+
+        mock_cursor.executemany.assert_called_once()
+        sql, rows = mock_cursor.executemany.call_args[0]
+        assert sql.startswith('INSERT INTO session_revocation')
+        retained = expires_at + session_manager.SESSION_TOKEN_EXPIRY
+        assert rows == [('s1', retained), ('s2', retained)]
+        mock_conn.commit.assert_called_once()
+        assert 's1' in stateless and 's2' in stateless
+
+    def test_revocation_outlives_session(self, app, stateless):
+        """Test that a token issued just before the session expired stays revoked after it."""
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            token, session_id = generate_session_token(1, 'alice', 'normie', '127.0.0.1', '')
+        expired = datetime.utcnow() - timedelta(minutes=1)
+        revocation.note_revoked([(session_id, expired)])
+        stateless.prune()
+        assert session_id in stateless
+        assert not verify(app, token)[0]
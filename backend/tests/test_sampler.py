@@ -0,0 +1,110 @@
+"""
+Tests for the background stack sampler.
+"""
+import threading
+import pytest
+from unittest.mock import patch
+from app import sampler as sampler_module
+from app.sampler import StackSampler, recent_stacks, collapsed_text, TRUNCATED_STACK
+
+
+@pytest.fixture
+def busy_request_thread():
+    """A thread registered as serving a request, parked in a known function."""
+    release = threading.Event()
+    ready = threading.Event()
+
+    def slow_handler():
+        ready.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=slow_handler)
+    thread.start()
+    ready.wait(5)
+    sampler_module._request_threads.add(thread.ident)
+    yield thread
+    sampler_module._request_threads.discard(thread.ident)
+    release.set()
+    thread.join()
+
+
+class TestStackSampler:
+    """Test sampling, bounding and rotation."""
+
+    def test_samples_only_request_threads(self, tmp_path, busy_request_thread):
+        """Test that registered request threads are sampled with full stacks."""
+        sampler = StackSampler(hz=100, directory=str(tmp_path))
+        for _ in range(3):
+            sampler.sample()
+
+        assert sum(sampler.table.values()) == 3
+        (stack, count), = sampler.table.items()
+        assert count == 3
+        assert any(label.endswith(':slow_handler') for label in stack)
+        assert stack[0].startswith('threading:')
+
+    def test_no_requests_no_samples(self, tmp_path):
+        """Test that an idle worker records nothing."""
+        sampler = StackSampler(hz=100, directory=str(tmp_path))
+        sampler.sample()
+        assert sampler.table == {}
+
+    def test_table_is_bounded(self, tmp_path):
+        """Test that new stacks beyond the limit are counted as truncated."""
+        sampler = StackSampler(hz=100, directory=str(tmp_path), max_stacks=2)
+        sampler.table = {('a',): 1, ('b',): 1}
+        with patch.object(sampler_module, '_request_threads', {threading.get_ident()}):
+            sampler.sample()
+        assert len(sampler.table) == 3
+        assert sampler.table[TRUNCATED_STACK] == 1
+
+    def test_rotate_writes_and_expires(self, tmp_path):
+        """Test that rotation writes a per-minute file and deletes old ones."""
+        sampler = StackSampler(hz=100, directory=str(tmp_path))
+        now = 1_700_000_000
+        stale = tmp_path / f"123-{now // 60 - sampler_module.SAMPLER_RETENTION_MINUTES - 1}.collapsed"
+        stale.write_text("old;stack 1\n")
+        sampler.table = {('app.routes:feed', 'mysql.connector:execute'): 7}
+
+        sampler.rotate(now=now)
+
+        assert not stale.exists()
+        written = tmp_path / f"{sampler_module.os.getpid()}-{now // 60}.collapsed"
+        assert written.read_text() == "app.routes:feed;mysql.connector:execute 7\n"
+        assert sampler.table == {}
+
+
+class TestRecentStacks:
+    """Test merging rotated files for download."""
+
+    def test_merges_workers_within_window(self, tmp_path):
+        """Test that files from all workers in the window are summed."""
+        now = 1_700_000_000
+        minute = now // 60
+        (tmp_path / f"100-{minute}.collapsed").write_text("a;b 2\na 1\n")
+        (tmp_path / f"200-{minute - 1}.collapsed").write_text("a;b 3\n")
+        (tmp_path / f"300-{minute - 30}.collapsed").write_text("a;b 100\n")
+
+        stacks = recent_stacks(5, directory=str(tmp_path), now=now)
+
+        assert stacks == {('a', 'b'): 5, ('a',): 1}
+        assert collapsed_text(stacks) == "a 1\na;b 5\n"
+
+    def test_flamegraph_route(self, client, auth_headers, tmp_path, monkeypatch):
+        """Test that admins can download recent stacks."""
+        monkeypatch.setattr(sampler_module, 'SAMPLER_DIR', str(tmp_path))
+        now = sampler_module.time.time()
+        (tmp_path / f"100-{int(now // 60)}.collapsed").write_text("app.routes:feed 4\n")
+
+        with patch('app.auth_middleware.verify_session_token') as mock_verify, \
+             patch('app.auth_middleware.get_user_role_from_db') as mock_get_role:
+            mock_verify.return_value = (True, {'user_id': 1, 'username': 'admin'}, None)
+            mock_get_role.return_value = 'admin'
+            response = client.get('/api/admin/flamegraph?minutes=5', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.get_data(as_text=True) == "app.routes:feed 4\n"
+
+    def test_flamegraph_requires_admin(self, client):
+        """Test that anonymous downloads are rejected."""
+        assert client.get('/api/admin/flamegraph').status_code == 401
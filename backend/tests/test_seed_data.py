@@ -0,0 +1,89 @@
+"""
+Tests for the synthetic data generator.
+"""
+import pytest
+from collections import Counter
+from datetime import datetime
+from benchmarks.seed import (
+    GENERATORS,
+    COLUMNS,
+    TABLES,
+    scaled_counts,
+    multi_row_insert,
+    tsv_value,
+    DEFAULT_NOW
+)
+
+
+@pytest.fixture
+def small_counts():
+    """Row counts small enough for unit tests."""
+    return scaled_counts(0.001)
+
+
+class TestGenerators:
+    """Test generated rows."""
+
+    def test_same_seed_same_rows(self, small_counts):
+        """Test that generation is deterministic by seed."""
+        for table in TABLES:
+            first = list(GENERATORS[table](small_counts, 7, DEFAULT_NOW))
+            second = list(GENERATORS[table](small_counts, 7, DEFAULT_NOW))
+            assert first == second, table
+
+    def test_different_seed_different_rows(self, small_counts):
+        """Test that the seed changes the data."""
+        first = list(GENERATORS['post'](small_counts, 1, DEFAULT_NOW))
+        second = list(GENERATORS['post'](small_counts, 2, DEFAULT_NOW))
+        assert first != second
+
+    def test_rows_match_columns(self, small_counts):
+        """Test that every generator yields rows shaped like its column list."""
+        for table in TABLES:
+            row = next(iter(GENERATORS[table](small_counts, 42, DEFAULT_NOW)))
+            assert len(row) == len(COLUMNS[table]), table
+
+    def test_no_self_friendship(self, small_counts):
+        """Test that generated friendships respect the no_self_friend constraint."""
+        assert all(a != b for a, b, _ in GENERATORS['friends'](small_counts, 42, DEFAULT_NOW))
+
+    def test_followers_follow_power_law(self, small_counts):
+        """Test that a few accounts attract most followers."""
+        followed = Counter(row[1] for row in GENERATORS['friends'](small_counts, 42, DEFAULT_NOW))
+        top = sum(count for _, count in followed.most_common(max(1, small_counts['user'] // 100)))
+        assert top / sum(followed.values()) > 0.2
+
+    def test_likes_concentrate_on_viral_posts(self, small_counts):
+        """Test that a small share of posts collects most likes."""
+        liked = Counter(row[1] for row in GENERATORS['post_like'](small_counts, 42, DEFAULT_NOW))
+        top = sum(count for _, count in liked.most_common(max(1, small_counts['post'] // 100)))
+        assert top / sum(liked.values()) > 0.4
+
+    def test_ids_stay_in_range(self, small_counts):
+        """Test that foreign keys point at generated rows."""
+        for user_id, post_id, _ in GENERATORS['post_like'](small_counts, 42, DEFAULT_NOW):
+            assert 1 <= user_id <= small_counts['user']
+            assert 1 <= post_id <= small_counts['post']
+
+
+class TestBulkLoadFormatting:
+    """Test bulk-load statement and file formatting."""
+
+    def test_scaled_counts_with_override(self):
+        """Test that scale applies to defaults and overrides win."""
+        counts = scaled_counts(0.5, {'user': 10, 'post': None})
+        assert counts['user'] == 10
+        assert counts['post'] == 2_500_000
+
+    def test_multi_row_insert(self):
+        """Test that a batch becomes one multi-row statement."""
+        sql, params = multi_row_insert('friends', ('user_id', 'friend_user_id'), [(1, 2), (3, 4)])
+        assert sql == "INSERT IGNORE INTO `friends` (user_id, friend_user_id) VALUES (%s, %s), (%s, %s)"
+        assert params == [1, 2, 3, 4]
+
+    def test_tsv_value_escaping(self):
+        """Test LOAD DATA escaping of NULLs, tabs, newlines and datetimes."""
+        assert tsv_value(None) == '\\N'
+        assert tsv_value('a\tb\nc\\') == 'a\\tb\\nc\\\\'
+        assert tsv_value(datetime(2025, 1, 2, 3, 4, 5)) == '2025-01-02 03:04:05'
+        assert tsv_value(7) == '7'
@@ -0,0 +1,83 @@
+"""
+Tests for the production server entry point.
+"""
+import json
+from unittest.mock import patch
+from app import serve
+from app.serve import default_workers, default_threads, build_options, parse_args, main
+
+
+def parse(*argv):
+    return build_options(parse_args(list(argv)))
+
+
+class TestSizing:
+    """Test worker and thread derivation."""
+
+    def test_workers_follow_cpu_count(self):
+        """Test one worker per core plus one."""
+        assert default_workers(4) == 5
+        assert default_workers(1) == 2
+
+    def test_threads_respect_connection_budget(self):
+        """Test that threads leave room for two connections each within the budget."""
+        assert default_threads(5, threads=8, max_connections=0) == 8
+        assert default_threads(5, threads=8, max_connections=40) == 4
+        assert default_threads(50, threads=8, max_connections=20) == 1
+
+
+class TestOptions:
+    """Test the generated Gunicorn settings."""
+
+    def test_defaults(self, monkeypatch):
+        """Test the derived settings."""
+        monkeypatch.setattr(serve.os, 'cpu_count', lambda: 3)
+        monkeypatch.setattr(serve, 'DEFAULT_THREADS', 6)
+        options = parse('--max-requests', '1000')
+        assert options['workers'] == 4
+        assert options['threads'] == 6
+        assert options['worker_class'] == 'gthread'
+        assert options['preload_app'] is True
+        assert options['max_requests_jitter'] == 100
+        assert options['post_worker_init'] is serve._post_worker_init
+        assert options['child_exit'] is serve._child_exit
+
+    def test_overrides(self):
+        """Test that explicit flags win."""
+        options = parse('--workers', '2', '--threads', '3', '--no-preload', '--keepalive', '10')
+        assert (options['workers'], options['threads']) == (2, 3)
+        assert options['preload_app'] is False
+        assert options['keepalive'] == 10
+
+    def test_print_config(self, capsys):
+        """Test that --print-config shows settings without starting a server."""
+        with patch.object(serve, 'run') as mock_run:
+            assert main(['--print-config', '--workers', '2']) == 0
+        mock_run.assert_not_called()
+        printed = json.loads(capsys.readouterr().out)
+        assert printed['workers'] == 2
+        assert 'post_worker_init' not in printed
+
+
+class TestWarmup:
+    """Test per-worker warmup."""
+
+    def test_warmup_restarts_threads_and_checks_db(self, app, mock_db_connection):
+        """Test that warmup restarts background threads and opens a connection."""
+        # `app` builds the default app first, so only warmup's own calls are counted
+        mock_conn, mock_cursor = mock_db_connection
+        with patch('app.logging_setup.configure_logging') as mock_logging, \
+             patch('app.metrics._ensure_flusher') as mock_flusher, \
+             patch('app.sampler.start_sampler') as mock_sampler, \
+             patch('app.maintenance.start_scheduler') as mock_scheduler, \
+             patch('app.mail_queue.start_sender') as mock_sender, \
+             patch('app.db.get_db_connection', return_value=mock_conn):
+            serve.warmup()
+
+        mock_logging.assert_called_once()
+        mock_flusher.assert_called_once()
+        mock_sampler.assert_called_once()
+        mock_scheduler.assert_called_once()
+        mock_sender.assert_called_once()
+        mock_cursor.execute.assert_called_once_with("SELECT 1")
+        mock_conn.close.assert_called_once()
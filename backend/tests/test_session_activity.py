@@ -0,0 +1,86 @@
+"""
+Tests for write-behind session activity tracking.
+"""
+from unittest.mock import patch
+import pytest
+from app import session_activity, session_manager
+from app.session_activity import touch, flush
+from app.session_manager import generate_session_token, verify_session_token
+
+
+@pytest.fixture
+def pending(monkeypatch):
+    """Start with nothing pending and no background flusher."""
+    monkeypatch.setattr(session_activity, '_pending', set())
+    monkeypatch.setattr(session_activity, '_ensure_flusher', lambda: None)
+    return session_activity
+
+
+class TestFlush:
+    """Test batching of last_accessed updates."""
+
+    def test_repeated_touches_coalesce(self, pending, mock_db_connection):
+        """Test that many touches become one UPDATE ... IN (...)."""
+        mock_conn, mock_cursor = mock_db_connection
+        for _ in range(100):
+            touch('s1')
+            touch('s2')
+
+        with patch('app.session_store.get_db_connection', return_value=mock_conn):
+            assert flush() == 2
+
+        mock_cursor.execute.assert_called_once()
+        sql, params = mock_cursor.execute.call_args[0]
+        assert sql == ("UPDATE sessions SET last_accessed = NOW() "
+                       "WHERE session_id IN (%s, %s) AND is_active = 1 AND expires_at > NOW()")
+        assert params == ('s1', 's2')
+        mock_conn.commit.assert_called_once()
+        assert flush() == 0
+
+    def test_large_batches_are_chunked(self, pending, mock_db_connection, monkeypatch):
+        """Test that the IN list is split by SESSION_ACTIVITY_BATCH_SIZE."""
+        mock_conn, mock_cursor = mock_db_connection
+        monkeypatch.setattr(session_activity, 'SESSION_ACTIVITY_BATCH_SIZE', 2)
+        for i in range(5):
+            touch(f's{i}')
+        with patch('app.session_store.get_db_connection', return_value=mock_conn):
+            assert flush() == 5
+        assert mock_cursor.execute.call_count == 3
+
+    def test_sliding_expiry(self, pending, mock_db_connection, monkeypatch):
+        """Test that sliding expiry extends expires_at in the same statement."""
+        mock_conn, mock_cursor = mock_db_connection
+        monkeypatch.setattr(session_activity, 'SESSION_SLIDING_EXPIRY', True)
+        monkeypatch.setattr(session_activity, 'SESSION_IDLE_TIMEOUT', 3600)
+        touch('s1')
+        with patch('app.session_store.get_db_connection', return_value=mock_conn):
+            flush()
+        sql, params = mock_cursor.execute.call_args[0]
+        assert 'expires_at = GREATEST(expires_at, LEAST(NOW() + INTERVAL %s SECOND' in sql
+        assert params == (3600, session_activity.SESSION_MAX_LIFETIME, 's1')
+
+    def test_failed_flush_keeps_ids(self, pending):
+        """Test that activity survives an unreachable database."""
+        touch('s1')
+        with patch('app.session_store.get_db_connection', return_value=None):
+            assert flush() is None
+        assert pending._pending == {'s1'}
+
+    def test_disabled(self, pending, monkeypatch):
+        """Test that an interval of 0 turns tracking off."""
+        monkeypatch.setattr(session_activity, 'SESSION_ACTIVITY_FLUSH_INTERVAL', 0)
+        touch('s1')
+        assert pending._pending == set()
+
+
+class TestVerifyTouches:
+    """Test that authenticated requests record activity."""
+
+    def test_verify_records_session(self, app, pending):
+        """Test that each successful verification touches the session."""
+        token, session_id = generate_session_token(1, 'alice', 'normie', '127.0.0.1', '')
+        with patch.object(session_manager, 'is_session_valid', return_value=True), \
+             app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            assert verify_session_token(token)[0]
+            assert verify_session_token(token)[0]
+        assert pending._pending == {session_id}
@@ -0,0 +1,170 @@
+"""
+Tests for the session stores and the RESP client.
+"""
+import io
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import pytest
+from app import revocation, session_manager, session_store
+from app.resp import RespClient, RespError, encode_command, read_reply
+from app.session_store import MySQLSessionStore, RespSessionStore, create_store
+from app.session_manager import create_session, invalidate_session, verify_session_token
+from tests.resp_server import StandInRespServer
+
+
+@pytest.fixture
+def server():
+    """A stand-in Redis-protocol server."""
+    with StandInRespServer() as stand_in:
+        yield stand_in
+
+
+@pytest.fixture
+def store(server, monkeypatch):
+    """A RESP session store installed as the process store."""
+    client = RespClient.from_url(server.url)
+    resp_store = RespSessionStore(client, prefix='test:')
+    monkeypatch.setattr(session_store, '_store', resp_store)
+    yield resp_store
+    client.close()
+
+
+def add_session(store, session_id='s1', user_id=1, expires_in=3600):
+    now = datetime.utcnow().replace(microsecond=0)
+    store.create(session_id, user_id, 'alice', '127.0.0.1', 'pytest', 'fp', now, now + timedelta(seconds=expires_in))
+
+
+class TestRespProtocol:
+    """Test RESP encoding and reply parsing."""
+
+    def test_encode_command(self):
+        """Test that commands are arrays of bulk strings."""
+        assert encode_command(('HGET', 'k', 7)) == b'*3\r\n$4\r\nHGET\r\n$1\r\nk\r\n$1\r\n7\r\n'
+
+    def test_read_replies(self):
+        """Test each reply type."""
+        reader = io.BytesIO(b'+OK\r\n:5\r\n$3\r\nabc\r\n$-1\r\n*2\r\n:1\r\n$1\r\nx\r\n-ERR nope\r\n')
+        assert read_reply(reader) == 'OK'
+        assert read_reply(reader) == 5
+        assert read_reply(reader) == 'abc'
+        assert read_reply(reader) is None
+        assert read_reply(reader) == [1, 'x']
+        error = read_reply(reader)
+        assert isinstance(error, RespError) and str(error) == 'ERR nope'
+
+    def test_from_url(self):
+        """Test that host, port, db and password come from the URL."""
+        client = RespClient.from_url('redis://:s%40cret@cache.internal:6380/2')
+        assert (client.host, client.port, client.db, client.password) == ('cache.internal', 6380, 2, 's@cret')
+
+    def test_error_reply_raises(self, server):
+        """Test that execute raises on an error reply."""
+        client = RespClient.from_url(server.url)
+        with pytest.raises(RespError):
+            client.execute('NOSUCHCOMMAND')
+        assert client.execute('PING') == 'PONG'
+
+
+class TestRespSessionStore:
+    """Test sessions as expiring hashes."""
+
+    def test_create_and_validate(self, store, server):
+        """Test that a session is valid for its own user only, with a TTL."""
+        add_session(store)
+        assert store.is_valid('s1', 1)
+        assert not store.is_valid('s1', 2)
+        assert not store.is_valid('missing', 1)
+        ttl = store.client.execute('TTL', 'test:session:s1')
+        assert 3590 <= ttl <= 3600
+        assert store.client.execute('SMEMBERS', 'test:user_sessions:1') == ['s1']
+
+    def test_expired_session_is_invalid(self, store):
+        """Test that the server-side TTL ends the session."""
+        add_session(store, expires_in=-1)
+        assert not store.is_valid('s1', 1)
+
+    def test_invalidate_one(self, store):
+        """Test that one session ends and is reported for revocation."""
+        add_session(store, 's1')
+        add_session(store, 's2')
+        revoked = store.invalidate('s1')
+        assert [sid for sid, _ in revoked] == ['s1']
+        assert isinstance(revoked[0][1], datetime)
+        assert not store.is_valid('s1', 1)
+        assert store.is_valid('s2', 1)
+        assert store.client.execute('SMEMBERS', 'test:user_sessions:1') == ['s2']
+        assert store.invalidate('s1') == []
+
+    def test_logout_everywhere(self, store):
+        """Test that every session of the user ends in one transaction."""
+        add_session(store, 's1')
+        add_session(store, 's2')
+        add_session(store, 'other', user_id=2)
+        revoked = store.invalidate('s1', user_id=1)
+        assert sorted(sid for sid, _ in revoked) == ['s1', 's2']
+        assert not store.is_valid('s2', 1)
+        assert store.is_valid('other', 2)
+        assert store.client.execute('SMEMBERS', 'test:user_sessions:1') == []
+
+    def test_touch_slides_expiry(self, store):
+        """Test that activity extends expires_at within the lifetime cap."""
+        add_session(store, expires_in=60)
+        assert store.touch(['s1'], extend=(3600, 1800)) == 1
+        expires_at = int(store.client.execute('HGET', 'test:session:s1', 'expires_at'))
+        assert abs(expires_at - (time.time() + 1800)) < 5
+        assert 1790 <= store.client.execute('TTL', 'test:session:s1') <= 1800
+
+    def test_touch_skips_ended_sessions(self, store):
+        """Test that touching an ended session does not recreate it."""
+        store.touch(['gone'])
+        assert store.client.execute('TTL', 'test:session:gone') == -2
+
+    def test_stateless_revocations_are_published(self, store, monkeypatch):
+        """Test that revocations still reach session_revocation in stateless mode."""
+        monkeypatch.setattr(revocation, 'STATELESS_ACCESS_TOKENS', True)
+        add_session(store)
+        with patch.object(revocation, 'publish_revocations') as mock_publish:
+            store.invalidate('s1')
+        assert mock_publish.call_args[0][0][0][0] == 's1'
+
+
+class TestSessionManagerWithStore:
+    """Test that session_manager works against a non-MySQL store."""
+
+    def test_login_verify_logout(self, app, store):
+        """Test a session's life cycle without touching MySQL."""
+        with patch('app.session_store.get_db_connection') as mock_db, \
+             app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            access_token, refresh_token, session_id = create_session(1, 'alice', 'normie', '127.0.0.1', '')
+            assert access_token and refresh_token
+            assert verify_session_token(access_token)[0]
+
+            assert invalidate_session(session_id)
+            assert not verify_session_token(access_token)[0]
+        mock_db.assert_not_called()
+
+    def test_unreachable_store(self, monkeypatch):
+        """Test that a store error fails the check instead of raising."""
+        client = RespClient(port=1, timeout=0.1)
+        monkeypatch.setattr(session_store, '_store', RespSessionStore(client))
+        assert session_manager.is_session_valid('s1', 1) is False
+
+
+class TestCreateStore:
+    """Test backend selection."""
+
+    def test_default_is_mysql(self):
+        """Test that MySQL stays the default."""
+        assert isinstance(create_store('mysql'), MySQLSessionStore)
+
+    def test_redis(self):
+        """Test that the redis backend reads SESSION_STORE_URL."""
+        store = create_store('redis', 'redis://cache:6390/1')
+        assert isinstance(store, RespSessionStore)
+        assert (store.client.host, store.client.port, store.client.db) == ('cache', 6390, 1)
+
+    def test_unknown(self):
+        """Test that a typo in SESSION_STORE fails loudly."""
+        with pytest.raises(ValueError):
+            create_store('memcached')
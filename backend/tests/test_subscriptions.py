@@ -0,0 +1,120 @@
+"""
+Tests for the active-subscription cache and expiry sweeper.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from app import subscriptions
+from app.subscriptions import (
+    has_active_subscription,
+    invalidate_subscription_cache,
+    sweep_expired_subscriptions
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty subscription cache."""
+    invalidate_subscription_cache()
+    yield
+    invalidate_subscription_cache()
+
+
+class TestHasActiveSubscription:
+    """Test the cached subscription lookup."""
+
+    @patch('app.subscriptions.get_db_connection')
+    def test_active_subscription_is_cached(self, mock_db, mock_db_connection):
+        """Test that a second check is served from the cache."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = {'remaining': 3600}
+        mock_db.return_value = mock_conn
+
+        assert has_active_subscription(2, 1) is True
+        assert has_active_subscription(2, 1) is True
+        assert mock_cursor.execute.call_count == 1
+
+    @patch('app.subscriptions.get_db_connection')
+    def test_new_subscription_is_seen_at_once(self, mock_db, mock_db_connection):
+        """Test that "not subscribed" is not cached, so a new subscriber gets access right away."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = None
+        mock_db.return_value = mock_conn
+
+        assert has_active_subscription(2, 1) is False
+        mock_cursor.fetchone.return_value = {'remaining': 3600}
+        assert has_active_subscription(2, 1) is True
+        assert mock_cursor.execute.call_count == 2
+
+    @patch('app.subscriptions.time.monotonic')
+    @patch('app.subscriptions.get_db_connection')
+    def test_cache_entry_does_not_outlive_end_date(self, mock_db, mock_monotonic, mock_db_connection):
+        """Test that an entry expires when the subscription ends, not after the full TTL."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = {'remaining': 10}
+        mock_db.return_value = mock_conn
+
+        mock_monotonic.return_value = 1000.0
+        assert has_active_subscription(2, 1) is True
+
+        mock_cursor.fetchone.return_value = None
+        mock_monotonic.return_value = 1011.0
+        assert has_active_subscription(2, 1) is False
+        assert mock_cursor.execute.call_count == 2
+
+    @patch('app.subscriptions.get_db_connection')
+    def test_db_failure_is_not_cached(self, mock_db):
+        """Test that a failed lookup denies access without caching the result."""
+        mock_db.return_value = None
+
+        assert has_active_subscription(2, 1) is False
+        assert (2, 1) not in subscriptions._subscription_cache
+
+    def test_missing_ids_skip_lookup(self):
+        """Test that anonymous viewers never hit the database."""
+        with patch('app.subscriptions.get_db_connection') as mock_db:
+            assert has_active_subscription(0, 1) is False
+            mock_db.assert_not_called()
+
+    @patch('app.subscriptions.get_db_connection')
+    def test_invalidate_single_pair(self, mock_db, mock_db_connection):
+        """Test that invalidation forces a fresh lookup."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = {'remaining': 3600}
+        mock_db.return_value = mock_conn
+
+        assert has_active_subscription(2, 1) is True
+        invalidate_subscription_cache(2, 1)
+        mock_cursor.fetchone.return_value = None
+        assert has_active_subscription(2, 1) is False
+
+
+class TestSweepExpiredSubscriptions:
+    """Test the batched expiry sweeper."""
+
+    @patch('app.subscriptions.get_db_connection')
+    def test_sweep_runs_batches_until_exhausted(self, mock_db):
+        """Test that the sweeper keeps updating until a short batch is returned."""
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+
+        rowcounts = iter([2, 2, 1, 0])
+
+        def execute(query, params):
+            mock_cursor.rowcount = next(rowcounts)
+
+        mock_cursor.execute.side_effect = execute
+
+        result = sweep_expired_subscriptions(batch_size=2)
+
+        assert result == {'subscription': 5, 'membership': 0}
+        assert mock_cursor.execute.call_count == 4
+        for call in mock_cursor.execute.call_args_list:
+            assert 'LIMIT %s' in call[0][0]
+
+    @patch('app.subscriptions.get_db_connection')
+    def test_sweep_without_connection(self, mock_db):
+        """Test that the sweeper is a no-op when the database is unavailable."""
+        mock_db.return_value = None
+        assert sweep_expired_subscriptions() == {'subscription': 0, 'membership': 0}
@@ -0,0 +1,82 @@
+"""
+Tests for the verified-token cache.
+"""
+import time
+from unittest.mock import patch
+from app import session_manager
+from app.token_cache import TokenCache, cache_key, verified_tokens
+from app.session_manager import generate_session_token, verify_session_token, invalidate_session
+
+
+def verify(app, token, user_agent=''):
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}, headers={'User-Agent': user_agent}):
+        return verify_session_token(token)
+
+
+class TestTokenCache:
+    """Test the LRU itself."""
+
+    def test_expiry_and_bound(self):
+        """Test that entries expire at exp and the oldest are evicted."""
+        cache = TokenCache(max_entries=2)
+        now = time.time()
+        cache.put(b'a', {'session_id': 's1', 'exp': now + 60})
+        cache.put(b'b', {'session_id': 's2', 'exp': now - 1})
+        assert cache.get(b'a', now)['session_id'] == 's1'
+        assert cache.get(b'b', now) is None
+
+        cache.put(b'c', {'session_id': 's3', 'exp': now + 60})
+        cache.put(b'd', {'session_id': 's3', 'exp': now + 60})
+        assert len(cache) == 2
+        assert cache.get(b'a', now) is None
+
+    def test_evict_session(self):
+        """Test that all entries of a session are dropped."""
+        cache = TokenCache(max_entries=10)
+        exp = time.time() + 60
+        cache.put(b'a', {'session_id': 's1', 'exp': exp})
+        cache.put(b'b', {'session_id': 's1', 'exp': exp})
+        cache.put(b'c', {'session_id': 's2', 'exp': exp})
+        assert cache.evict_session('s1') == 2
+        assert len(cache) == 1
+
+    def test_key_binds_client(self):
+        """Test that the key changes with the token, IP and User-Agent."""
+        keys = {cache_key('t', '1.1.1.1', 'ua'), cache_key('t', '1.1.1.2', 'ua'),
+                cache_key('t', '1.1.1.1', 'ub'), cache_key('u', '1.1.1.1', 'ua')}
+        assert len(keys) == 4
+
+
+class TestVerifyWithCache:
+    """Test verify_session_token through the cache."""
+
+    def test_repeat_requests_skip_decode(self, app):
+        """Test that the second verification does not decode the JWT again."""
+        token, _ = generate_session_token(1, 'alice', 'normie', '127.0.0.1', '')
+        with patch.object(session_manager, 'is_session_valid', return_value=True) as mock_valid, \
+             patch.object(session_manager, 'decode_token', wraps=session_manager.decode_token) as mock_decode:
+            assert verify(app, token)[0]
+            assert verify(app, token)[0]
+        assert mock_decode.call_count == 1
+        assert mock_valid.call_count == 2
+
+    def test_other_client_is_checked_again(self, app):
+        """Test that a different User-Agent misses the cache and fails the fingerprint."""
+        token, _ = generate_session_token(1, 'alice', 'normie', '127.0.0.1', '')
+        with patch.object(session_manager, 'is_session_valid', return_value=True):
+            assert verify(app, token)[0]
+            is_valid, _, error = verify(app, token, user_agent='curl/8')
+        assert not is_valid
+        assert error == "Session security check failed"
+
+    def test_logout_evicts(self, app, mock_db_connection):
+        """Test that invalidating a session drops its cached payloads."""
+        mock_conn, mock_cursor = mock_db_connection
+        token, session_id = generate_session_token(1, 'alice', 'normie', '127.0.0.1', '')
+        with patch.object(session_manager, 'is_session_valid', return_value=True):
+            assert verify(app, token)[0]
+        assert len(verified_tokens) == 1
+
+        with patch('app.session_store.get_db_connection', return_value=mock_conn):
+            assert invalidate_session(session_id)
+        assert len(verified_tokens) == 0
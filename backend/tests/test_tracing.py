@@ -0,0 +1,160 @@
+"""
+Tests for request span tracing and export.
+"""
+import json
+import pytest
+from unittest.mock import patch
+from app import tracing
+from app.tracing import Trace, span, should_keep, KIND_CLIENT, TRACE_ID_HEADER
+from app.query_stats import instrument_connection
+
+
+@pytest.fixture
+def trace_dir(tmp_path, monkeypatch):
+    """Export traces to a temporary directory and keep every trace."""
+    monkeypatch.setattr(tracing, 'TRACE_DIR', str(tmp_path))
+    monkeypatch.setattr(tracing, '_export_pid', None)
+    monkeypatch.setattr(tracing, 'TRACE_SLOW_MS', 0)
+    yield tmp_path
+    for handler in list(tracing._export_logger.handlers):
+        tracing._export_logger.removeHandler(handler)
+        handler.close()
+    tracing._export_pid = None
+
+
+def exported(trace_dir):
+    lines = []
+    for path in trace_dir.glob('traces-*.jsonl'):
+        lines.extend(json.loads(line) for line in path.read_text().splitlines())
+    return lines
+
+
+def spans_of(export):
+    return export['resourceSpans'][0]['scopeSpans'][0]['spans']
+
+
+def attributes_of(span_json):
+    return {a['key']: list(a['value'].values())[0] for a in span_json['attributes']}
+
+
+class TestSpans:
+    """Test span bookkeeping."""
+
+    def test_nesting_and_otlp_shape(self):
+        """Test parent links and the OTLP JSON fields."""
+        trace = Trace()
+        root = trace.start('GET /x', tracing.KIND_SERVER)
+        child = trace.start('db.query', KIND_CLIENT, {'db.rows': 3})
+        child.end()
+        root.end()
+
+        first, second = [s.to_otlp() for s in trace.spans]
+        assert first['name'] == 'db.query'
+        assert first['parentSpanId'] == second['spanId']
+        assert 'parentSpanId' not in second
+        assert first['traceId'] == second['traceId'] == trace.trace_id
+        assert len(trace.trace_id) == 32 and len(first['spanId']) == 16
+        assert {'key': 'db.rows', 'value': {'intValue': '3'}} in first['attributes']
+        assert int(first['endTimeUnixNano']) >= int(first['startTimeUnixNano'])
+
+    def test_span_outside_request_is_noop(self):
+        """Test that background code pays nothing when not tracing."""
+        with span('jwt.decode') as current:
+            assert current is None
+
+    def test_span_count_is_bounded(self, monkeypatch):
+        """Test that huge traces keep only the first spans."""
+        monkeypatch.setattr(tracing, 'TRACE_MAX_SPANS', 2)
+        trace = Trace()
+        for _ in range(5):
+            trace.start('db.query').end()
+        assert len(trace.spans) == 2
+        assert trace.dropped == 3
+
+    def test_tail_sampling(self, monkeypatch):
+        """Test that slow or failed requests are kept and fast ones sampled."""
+        monkeypatch.setattr(tracing, 'TRACE_SLOW_MS', 500)
+        monkeypatch.setattr(tracing, 'TRACE_SAMPLE_RATE', 0.0)
+        trace = Trace()
+        root = trace.start('GET /x')
+        root.end()
+        assert not should_keep(trace, root)
+
+        root.end_ns = root.start_ns + 600_000_000
+        assert should_keep(trace, root)
+
+        failed = Trace()
+        root = failed.start('GET /x')
+        db = failed.start('db.connect', KIND_CLIENT)
+        db.fail(RuntimeError('down'))
+        db.end()
+        root.end()
+        assert should_keep(failed, root)
+
+
+class TestRequestTracing:
+    """Test traces recorded for requests."""
+
+    def test_request_exported_with_query_spans(self, app, client, trace_dir, mock_db_connection):
+        """Test that a kept request exports its request and query spans."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchall.return_value = [{'post_id': 1}, {'post_id': 2}]
+
+        with patch('app.routes.get_db_connection', return_value=instrument_connection(mock_conn)):
+            response = client.get('/api/posts/public?limit=5')
+
+        assert response.status_code == 200
+        trace_id = response.headers[TRACE_ID_HEADER]
+        (export,) = exported(trace_dir)
+        spans = spans_of(export)
+        assert {s['traceId'] for s in spans} == {trace_id}
+
+        root = next(s for s in spans if s['kind'] == tracing.KIND_SERVER)
+        assert root['name'] == 'GET /api/posts/public'
+        assert attributes_of(root)['http.status_code'] == '200'
+        # The query string stays out of exported spans
+        assert attributes_of(root)['http.target'] == '/api/posts/public'
+        assert attributes_of(root)['request.id'] == response.headers['X-Request-ID']
+
+        query = next(s for s in spans if s['name'] == 'db.query')
+        assert query['parentSpanId'] == root['spanId']
+        attrs = attributes_of(query)
+        assert attrs['db.statement'].startswith('SELECT p.post_id')
+        assert 'LIMIT ?' in attrs['db.statement']
+        assert attrs['db.rows'] == '2'
+
+    def test_traceparent_is_honoured(self, client, trace_dir):
+        """Test that an incoming W3C trace id is reused."""
+        trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+        response = client.get('/api/health', headers={
+            'traceparent': f'00-{trace_id}-00f067aa0ba902b7-01'
+        })
+        assert response.headers[TRACE_ID_HEADER] == trace_id
+        root = spans_of(exported(trace_dir)[0])[0]
+        assert root['parentSpanId'] == '00f067aa0ba902b7'
+
+    def test_fast_requests_not_exported(self, client, trace_dir, monkeypatch):
+        """Test that unsampled fast requests leave no trace behind."""
+        monkeypatch.setattr(tracing, 'TRACE_SLOW_MS', 10_000)
+        monkeypatch.setattr(tracing, 'TRACE_SAMPLE_RATE', 0.0)
+        response = client.get('/api/health')
+        assert TRACE_ID_HEADER not in response.headers
+        assert exported(trace_dir) == []
+
+    def test_jwt_and_mail_spans(self, app, trace_dir, tmp_path, monkeypatch):
+        """Test that token and mail operations are traced inside a request."""
+        from app.session_manager import encode_token, decode_token
+        from app.two_factor import send_2fa_email
+
+        monkeypatch.setitem(app.config, 'MAIL_USERNAME', 'noreply@example.com')
+        monkeypatch.setattr('app.mail_queue.MAIL_SPOOL_DIR', str(tmp_path))
+        with app.test_request_context('/api/login'):
+            tracing._start_request()
+            token = encode_token({'type': 'access_token', 'user_id': 1})
+            decode_token(token)
+            with patch('app.mail_queue.start_sender'):
+                send_2fa_email('user@example.com', '123456')
+            trace = tracing.current_trace()
+            names = [s.name for s in trace.spans]
+
+        assert names == ['jwt.encode', 'jwt.decode', 'mail.enqueue']
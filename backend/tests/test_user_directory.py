@@ -0,0 +1,179 @@
+"""
+Tests for the per-worker user directory and role changes.
+"""
+from unittest.mock import MagicMock, patch
+import pytest
+from app import user_directory
+from app.auth_middleware import get_user_role_from_db
+from app.user_directory import UserDirectory, record_change
+
+ALICE = {'user_id': 1, 'user_name': 'alice', 'user_role': 'admin', 'is_active': 1, 'is_private': 0}
+
+
+@pytest.fixture
+def directory():
+    """Serve alice from the directory loader, at a fixed shared version."""
+    with patch('app.user_directory.load_user', return_value=dict(ALICE)) as mock_load, \
+         patch('app.user_directory.load_version', return_value=7):
+        yield mock_load
+
+
+class TestUserDirectory:
+    """Test the per-worker user cache."""
+
+    def test_rows_are_cached(self, directory):
+        """Test that repeat lookups skip the database."""
+        users = UserDirectory(ttl=60)
+        assert users.get(1, now=0)['user_role'] == 'admin'
+        assert users.get(1, now=30)['user_name'] == 'alice'
+        assert directory.call_count == 1
+
+    def test_entries_expire(self, directory):
+        """Test that rows are reloaded after the TTL."""
+        users = UserDirectory(ttl=60)
+        users.get(1, now=0)
+        users.get(1, now=61)
+        assert directory.call_count == 2
+
+    def test_invalidate(self, directory):
+        """Test that an invalidated row is reloaded."""
+        users = UserDirectory(ttl=60)
+        users.get(1, now=0)
+        users.invalidate(1)
+        users.get(1, now=1)
+        assert directory.call_count == 2
+
+    def test_missing_users_are_not_cached(self):
+        """Test that a miss for an unknown user is not remembered."""
+        users = UserDirectory(ttl=60)
+        with patch('app.user_directory.load_version', return_value=None), \
+             patch('app.user_directory.load_user', side_effect=[None, dict(ALICE)]):
+            assert users.get(1) is None
+            assert users.get(1) == ALICE
+
+    def test_bounded(self, directory):
+        """Test that the least recently used row is evicted."""
+        users = UserDirectory(ttl=60, max_entries=2)
+        for user_id in (1, 2, 3):
+            users.get(user_id, now=0)
+        assert len(users) == 2
+
+
+class TestVersion:
+    """Test cross-worker invalidation through the shared version."""
+
+    def test_version_change_drops_cache(self):
+        """Test that another worker's change is seen within the check interval."""
+        users = UserDirectory(ttl=60, version_interval=2)
+        demoted = dict(ALICE, user_role='normie')
+        with patch('app.user_directory.load_user', side_effect=[dict(ALICE), demoted]) as mock_load, \
+             patch('app.user_directory.load_version', side_effect=[1, 1, 2]) as mock_version:
+            assert users.get(1, now=0)['user_role'] == 'admin'
+            assert users.get(1, now=1)['user_role'] == 'admin'  # not checked yet
+            assert users.get(1, now=2)['user_role'] == 'admin'  # unchanged
+            assert users.get(1, now=4)['user_role'] == 'normie'
+        assert mock_version.call_count == 3
+        assert mock_load.call_count == 2
+
+    def test_unreadable_version_keeps_ttl(self):
+        """Test that the cache still works, bounded by the TTL, without the table."""
+        users = UserDirectory(ttl=60, version_interval=0)
+        with patch('app.user_directory.load_user', return_value=dict(ALICE)) as mock_load, \
+             patch('app.user_directory.load_version', side_effect=Exception("no table")):
+            users.get(1, now=0)
+            users.get(1, now=1)
+        assert mock_load.call_count == 1
+
+    def test_record_change(self):
+        """Test that a change bumps the shared counter on the caller's cursor."""
+        cursor = MagicMock()
+        record_change(cursor)
+        assert cursor.execute.call_args[0][0] == "UPDATE user_directory_version SET version = version + 1 WHERE id = 1"
+
+
+class TestRoleLookups:
+    """Test that per-request role checks use the directory."""
+
+    def test_role_lookup_is_cached(self, directory):
+        """Test that repeated role checks cost one query."""
+        assert get_user_role_from_db(1) == 'admin'
+        assert get_user_role_from_db(1) == 'admin'
+        assert directory.call_count == 1
+
+
+class TestAdminSetRole:
+    """Test the admin role change route."""
+
+    def request(self, client, auth_headers, user_id, body, mock_conn=None):
+        with patch('app.routes.get_db_connection', return_value=mock_conn), \
+             patch('app.auth_middleware.verify_session_token') as mock_verify, \
+             patch('app.auth_middleware.get_user_role_from_db', return_value='admin'):
+            mock_verify.return_value = (True, {'user_id': 1, 'username': 'admin'}, None)
+            return client.put(f'/api/admin/users/{user_id}/role', json=body, headers=auth_headers)
+
+    def test_demotion(self, client, auth_headers, mock_db_connection):
+        """Test that a demotion updates the row, bumps the version and drops the entry."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = ('admin',)
+        with patch.object(user_directory, 'invalidate') as mock_invalidate:
+            response = self.request(client, auth_headers, 5, {'role': 'normie'}, mock_conn)
+
+        assert response.status_code == 200
+        statements = [call[0][0] for call in mock_cursor.execute.call_args_list]
+        assert "UPDATE user SET user_role = %s WHERE user_id = %s" in statements
+        assert "UPDATE user_directory_version SET version = version + 1 WHERE id = 1" in statements
+        mock_conn.commit.assert_called_once()
+        mock_invalidate.assert_called_once_with(5)
+
+    def test_invalid_role(self, client, auth_headers):
+        """Test that unknown roles are rejected."""
+        assert self.request(client, auth_headers, 5, {'role': 'root'}).status_code == 400
+
+    def test_self_demotion(self, client, auth_headers):
+        """Test that an admin cannot lock themselves out."""
+        assert self.request(client, auth_headers, 1, {'role': 'normie'}).status_code == 400
+
+    def test_unknown_user(self, client, auth_headers, mock_db_connection):
+        """Test that a missing user is a 404."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = None
+        assert self.request(client, auth_headers, 99, {'role': 'admin'}, mock_conn).status_code == 404
+
+
+class TestProfilePrivacy:
+    """Test that changing is_private bumps the directory version only when it changes."""
+
+    def request(self, client, auth_headers, body, mock_conn):
+        with patch('app.routes.get_db_connection', return_value=mock_conn), \
+             patch('app.auth_middleware.verify_session_token') as mock_verify, \
+             patch('app.auth_middleware.get_user_role_from_db', return_value='normie'), \
+             patch.object(user_directory, 'record_change') as mock_record, \
+             patch.object(user_directory, 'invalidate'):
+            mock_verify.return_value = (True, {'user_id': 5, 'username': 'alice'}, None)
+            response = client.put('/api/profile/update', json=body, headers=auth_headers)
+        return response, mock_record
+
+    def test_change(self, client, auth_headers, mock_db_connection):
+        """Test that a real change bumps the version."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.side_effect = [{'is_private': 0}, {'user_id': 5, 'is_private': 1}]
+        mock_cursor.rowcount = 1
+        response, mock_record = self.request(client, auth_headers, {'is_private': True}, mock_conn)
+        assert response.status_code == 200
+        mock_record.assert_called_once_with(mock_cursor)
+
+    def test_unchanged(self, client, auth_headers, mock_db_connection):
+        """Test that saving the same value leaves the version alone."""
+        mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.side_effect = [{'is_private': 1}, {'user_id': 5, 'is_private': 1}]
+        mock_cursor.rowcount = 1
+        response, mock_record = self.request(client, auth_headers, {'is_private': 1, 'bio': 'hi'}, mock_conn)
+        assert response.status_code == 200
+        mock_record.assert_not_called()
+
+    def test_unknown_user(self, client, auth_headers, mock_db_connection):
+        """Test that a missing user is a 404 and bumps nothing."""
+        mock_conn, _ = mock_db_connection
+        response, mock_record = self.request(client, auth_headers, {'is_private': 1}, mock_conn)
+        assert response.status_code == 404
+        mock_record.assert_not_called()